@@ -0,0 +1,60 @@
+"""partition log tables by created time
+
+Revision ID: 3c5a1f0d7b42
+Revises: eb989e9c9291
+Create Date: 2026-10-18 21:14:05
+
+"""
+from datetime import date
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '3c5a1f0d7b42'
+down_revision = 'eb989e9c9291'
+branch_labels = None
+depends_on = None
+
+TABLES = ('sys_opera_log', 'sys_login_log')
+
+# Partitions of the next months, later ones are created by the log retention task
+PREMAKE_MONTHS = 3
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def upgrade():
+    conn = op.get_bind()
+    today = date.today()
+    for table in TABLES:
+        partitioned = conn.execute(
+            sa.text(
+                'SELECT 1 FROM information_schema.PARTITIONS '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL LIMIT 1'
+            ),
+            {'table': table},
+        ).scalar()
+        if partitioned:
+            continue
+        # Every unique key of a partitioned table must include the partitioning column
+        if 'created_time' not in sa.inspect(conn).get_pk_constraint(table)['constrained_columns']:
+            op.execute(f'ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id, created_time)')
+        first_time = conn.execute(sa.text(f'SELECT MIN(created_time) FROM {table}')).scalar()
+        month = (first_time.date() if first_time else today).replace(day=1)
+        partitions = []
+        while month <= _add_months(today, PREMAKE_MONTHS):
+            partitions.append(f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_add_months(month, 1):%Y-%m-%d}')")
+            month = _add_months(month, 1)
+        partitions.append('PARTITION pmax VALUES LESS THAN (MAXVALUE)')
+        op.execute(f'ALTER TABLE {table} PARTITION BY RANGE COLUMNS(created_time) ({", ".join(partitions)})')
+
+
+def downgrade():
+    for table in TABLES:
+        op.execute(f'ALTER TABLE {table} REMOVE PARTITIONING')
+        op.execute(f'ALTER TABLE {table} DROP PRIMARY KEY, ADD PRIMARY KEY (id)')
@@ -0,0 +1,36 @@
+"""add keyset pagination indexes
+
+Revision ID: 7d2e4b9a61c3
+Revises:
+Create Date: 2026-10-18 22:05:31
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '7d2e4b9a61c3'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Cursor pagination orders by (column, id), InnoDB secondary indexes carry the primary key
+INDEXES = (
+    ('sys_opera_log', 'created_time'),
+    ('sys_login_log', 'created_time'),
+    ('sys_user', 'join_time'),
+)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table, column in INDEXES:
+        # The tables created by create_table() at startup already have the index
+        if op.f(f'ix_{table}_{column}') not in {index['name'] for index in inspector.get_indexes(table)}:
+            op.create_index(op.f(f'ix_{table}_{column}'), table, [column])
+
+
+def downgrade():
+    for table, column in INDEXES:
+        op.drop_index(op.f(f'ix_{table}_{column}'), table_name=table)
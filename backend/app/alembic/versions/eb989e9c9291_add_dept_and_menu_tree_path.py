@@ -0,0 +1,41 @@
+"""add dept and menu tree path
+
+Revision ID: eb989e9c9291
+Revises: 7d2e4b9a61c3
+Create Date: 2026-10-18 18:02:49
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+from backend.app.crud.base import TREE_PATH_BACKFILL_SQL
+
+# revision identifiers, used by Alembic.
+revision = 'eb989e9c9291'
+down_revision = '7d2e4b9a61c3'
+branch_labels = None
+depends_on = None
+
+TABLES = ('sys_dept', 'sys_menu')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        # The tables created by create_table() at startup already have the column
+        if 'tree_path' not in {column['name'] for column in inspector.get_columns(table)}:
+            op.add_column(
+                table,
+                sa.Column(
+                    'tree_path', sa.String(500), nullable=True, comment='Hierarchy path of the ids, e.g. /1/5/12/'
+                ),
+            )
+            op.create_index(op.f(f'ix_{table}_tree_path'), table, ['tree_path'])
+        op.execute(TREE_PATH_BACKFILL_SQL.format(table=table))
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index(op.f(f'ix_{table}_tree_path'), table_name=table)
+        op.drop_column(table, 'tree_path')
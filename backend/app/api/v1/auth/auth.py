@@ -64,6 +64,12 @@ async def create_new_token(request: Request, refresh_token: Annotated[str, Query
     return await response_base.success(data=data)
 
 
+@router.get('/sessions', summary='Get login sessions', dependencies=[DependsJwtAuth])
+async def get_login_sessions(request: Request) -> ResponseModel:
+    data = await auth_service.get_sessions(request=request)
+    return await response_base.success(data=data)
+
+
 @router.post('/logout', summary='User logout', dependencies=[DependsJwtAuth])
 async def user_logout(request: Request) -> ResponseModel:
     await auth_service.logout(request=request)
@@ -30,7 +30,7 @@ async def get_all_depts_tree(
     status: Annotated[int | None, Query()] = None,
 ) -> ResponseModel:
     dept = await dept_service.get_dept_tree(name=name, leader=leader, phone=phone, status=status)
-    return await response_base.success(data=dept)
+    return await response_base.fast_success(data=dept)
 
 
 @router.post(
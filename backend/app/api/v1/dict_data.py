@@ -10,7 +10,12 @@ from backend.app.common.permission import RequestPermission
 from backend.app.common.rbac import DependsRBAC
 from backend.app.common.response.response_schema import ResponseModel, response_base
 from backend.app.database.db_mysql import CurrentSession
-from backend.app.schemas.dict_data import CreateDictDataParam, GetDictDataListDetails, UpdateDictDataParam
+from backend.app.schemas.dict_data import (
+    BulkUpdateDictDataParam,
+    CreateDictDataParam,
+    GetDictDataListDetails,
+    UpdateDictDataParam,
+)
 from backend.app.services.dict_data_service import dict_data_service
 from backend.app.utils.serializers import select_as_dict
 
@@ -56,6 +61,51 @@ async def create_dict_data(obj: CreateDictDataParam) -> ResponseModel:
     return await response_base.success()
 
 
+@router.post(
+    '/bulk',
+    summary='Batch create dictionary',
+    dependencies=[
+        Depends(RequestPermission('sys:dict:data:add')),
+        DependsRBAC,
+    ],
+)
+async def bulk_create_dict_data(obj: list[CreateDictDataParam]) -> ResponseModel:
+    count = await dict_data_service.bulk_create(obj=obj)
+    if count > 0:
+        return await response_base.success()
+    return await response_base.fail()
+
+
+@router.put(
+    '/bulk',
+    summary='Batch update dictionary',
+    dependencies=[
+        Depends(RequestPermission('sys:dict:data:edit')),
+        DependsRBAC,
+    ],
+)
+async def bulk_update_dict_data(obj: list[BulkUpdateDictDataParam]) -> ResponseModel:
+    count = await dict_data_service.bulk_update(obj=obj)
+    if count > 0:
+        return await response_base.success()
+    return await response_base.fail()
+
+
+@router.post(
+    '/import',
+    summary='Import dictionary, the existing labels or values are updated',
+    dependencies=[
+        Depends(RequestPermission('sys:dict:data:add')),
+        DependsRBAC,
+    ],
+)
+async def import_dict_data(obj: list[CreateDictDataParam]) -> ResponseModel:
+    count = await dict_data_service.bulk_import(obj=obj)
+    if count > 0:
+        return await response_base.success()
+    return await response_base.fail()
+
+
 @router.put(
     '/{pk}',
     summary='Update dictionary',
@@ -1,17 +1,23 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+from datetime import datetime
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, Query
 
 from backend.app.common.jwt import DependsJwtAuth
-from backend.app.common.pagination import DependsPagination, paging_data
+from backend.app.common.pagination import (
+    DependsCursorPagination,
+    DependsPagination,
+    cursor_paging_data,
+    fast_paging_data,
+)
 from backend.app.common.permission import RequestPermission
 from backend.app.common.rbac import DependsRBAC
 from backend.app.common.response.response_schema import ResponseModel, response_base
 from backend.app.database.db_mysql import CurrentSession
 from backend.app.schemas.opera_log import GetOperaLogListDetails
-from backend.app.services.opera_log_service import opera_log_service
+from backend.app.services.opera_log_service import opera_log_buffer, opera_log_service
 
 router = APIRouter()
 
@@ -29,12 +35,44 @@ async def get_pagination_opera_logs(
     username: Annotated[str | None, Query()] = None,
     status: Annotated[int | None, Query()] = None,
     ip: Annotated[str | None, Query()] = None,
+    start_time: Annotated[datetime | None, Query()] = None,
+    end_time: Annotated[datetime | None, Query()] = None,
 ) -> ResponseModel:
-    log_select = await opera_log_service.get_select(username=username, status=status, ip=ip)
-    page_data = await paging_data(db, log_select, GetOperaLogListDetails)
+    log_select = await opera_log_service.get_select(
+        username=username, status=status, ip=ip, start_time=start_time, end_time=end_time
+    )
+    page_data = await fast_paging_data(db, log_select, GetOperaLogListDetails)
+    return await response_base.fast_success(data=page_data)
+
+
+@router.get(
+    '/cursor',
+    summary='(Fuzzy condition) Cursor pagination get operation log',
+    dependencies=[
+        DependsJwtAuth,
+        DependsCursorPagination,
+    ],
+)
+async def get_cursor_opera_logs(
+    db: CurrentSession,
+    username: Annotated[str | None, Query()] = None,
+    status: Annotated[int | None, Query()] = None,
+    ip: Annotated[str | None, Query()] = None,
+    start_time: Annotated[datetime | None, Query()] = None,
+    end_time: Annotated[datetime | None, Query()] = None,
+) -> ResponseModel:
+    log_select = await opera_log_service.get_select(
+        username=username, status=status, ip=ip, start_time=start_time, end_time=end_time
+    )
+    page_data = await cursor_paging_data(db, log_select, GetOperaLogListDetails)
     return await response_base.success(data=page_data)
 
 
+@router.get('/buffer', summary='Operation log write buffer stats', dependencies=[DependsJwtAuth])
+async def get_opera_log_buffer_stats() -> ResponseModel:
+    return await response_base.success(data=opera_log_buffer.stats())
+
+
 @router.delete(
     '',
     summary='(batch) Delete',
@@ -18,7 +18,7 @@ router = APIRouter()
 @router.get('/sidebar', summary='Obtain user menu display tree', dependencies=[DependsJwtAuth])
 async def get_user_menus(request: Request) -> ResponseModel:
     menu = await menu_service.get_user_menu_tree(request=request)
-    return await response_base.success(data=menu)
+    return await response_base.fast_success(data=menu)
 
 
 @router.get('/{pk}', summary='Get menu details', dependencies=[DependsJwtAuth])
@@ -33,7 +33,7 @@ async def get_all_menus(
     title: Annotated[str | None, Query()] = None, status: Annotated[int | None, Query()] = None
 ) -> ResponseModel:
     menu = await menu_service.get_menu_tree(title=title, status=status)
-    return await response_base.success(data=menu)
+    return await response_base.fast_success(data=menu)
 
 
 @router.post(
@@ -6,6 +6,9 @@ from starlette.concurrency import run_in_threadpool
 from backend.app.common.jwt import DependsJwtAuth
 from backend.app.common.permission import RequestPermission
 from backend.app.common.response.response_schema import ResponseModel, response_base
+from backend.app.crud.base import get_stmt_cache_stats
+from backend.app.database.db_mysql import get_compiled_cache_stats, get_request_session_stats
+from backend.app.database.pool_health import pool_health_checker
 from backend.app.utils.server_info import server_info
 
 router = APIRouter()
@@ -27,5 +30,8 @@ async def get_server_info() -> ResponseModel:
         'sys': await run_in_threadpool(server_info.get_sys_info),
         'disk': await run_in_threadpool(server_info.get_disk_info),
         'service': await run_in_threadpool(server_info.get_service_info),
+        'db_pool': pool_health_checker.stats(),
+        'db_request': get_request_session_stats(),
+        'db_statement': {'compiled': get_compiled_cache_stats(), 'template': get_stmt_cache_stats()},
     }
     return await response_base.success(data=data)
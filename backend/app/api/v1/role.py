@@ -35,7 +35,7 @@ async def get_user_all_roles(pk: Annotated[int, Path(...)]) -> ResponseModel:
 @router.get('/{pk}/menus', summary='Get all menus for a character.', dependencies=[DependsJwtAuth])
 async def get_role_all_menus(pk: Annotated[int, Path(...)]) -> ResponseModel:
     menu = await menu_service.get_role_menu_tree(pk=pk)
-    return await response_base.success(data=menu)
+    return await response_base.fast_success(data=menu)
 
 
 @router.get('/{pk}', summary='Get character details', dependencies=[DependsJwtAuth])
@@ -5,7 +5,12 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, Path, Query, Request
 
 from backend.app.common.jwt import DependsJwtAuth
-from backend.app.common.pagination import DependsPagination, paging_data
+from backend.app.common.pagination import (
+    DependsCursorPagination,
+    DependsPagination,
+    cursor_paging_data,
+    paging_data,
+)
 from backend.app.common.permission import RequestPermission
 from backend.app.common.rbac import DependsRBAC
 from backend.app.common.response.response_schema import ResponseModel, response_base
@@ -40,6 +45,14 @@ async def add_user(request: Request, obj: AddUserParam) -> ResponseModel:
     return await response_base.success(data=data)
 
 
+@router.post('/bulk', summary='Batch add users', dependencies=[DependsRBAC])
+async def bulk_add_user(request: Request, obj: list[AddUserParam]) -> ResponseModel:
+    count = await user_service.bulk_add(request=request, obj=obj)
+    if count > 0:
+        return await response_base.success()
+    return await response_base.fail()
+
+
 @router.post('/password/reset', summary='Reset password', dependencies=[DependsJwtAuth])
 async def password_reset(request: Request, obj: ResetPasswordParam) -> ResponseModel:
     count = await user_service.pwd_reset(request=request, obj=obj)
@@ -50,10 +63,33 @@ async def password_reset(request: Request, obj: ResetPasswordParam) -> ResponseM
 
 @router.get('/me', summary='Get current user information.', dependencies=[DependsJwtAuth], response_model_exclude={'password'})
 async def get_current_userinfo(request: Request) -> ResponseModel:
-    data = GetCurrentUserInfoDetail(**await select_as_dict(request.user))
+    data = GetCurrentUserInfoDetail(**request.user.to_dict())
     return await response_base.success(data=data)
 
 
+@router.get(
+    '/cursor',
+    summary='(Fuzzy condition) Cursor pagination to retrieve all users',
+    dependencies=[
+        DependsJwtAuth,
+        DependsCursorPagination,
+    ],
+)
+async def get_cursor_users(
+    db: CurrentSession,
+    dept: Annotated[int | None, Query()] = None,
+    username: Annotated[str | None, Query()] = None,
+    phone: Annotated[str | None, Query()] = None,
+    status: Annotated[int | None, Query()] = None,
+    dept_subtree: Annotated[bool, Query(description='Include the users of the sub departments')] = False,
+) -> ResponseModel:
+    user_select = await user_service.get_select(
+        dept=dept, username=username, phone=phone, status=status, dept_subtree=dept_subtree
+    )
+    page_data = await cursor_paging_data(db, user_select, GetUserInfoListDetails, sort_key='join_time')
+    return await response_base.success(data=page_data)
+
+
 @router.get('/{username}', summary='View user information', dependencies=[DependsJwtAuth])
 async def get_user(username: Annotated[str, Path(...)]) -> ResponseModel:
     current_user = await user_service.get_userinfo(username=username)
@@ -106,8 +142,11 @@ async def get_pagination_users(
     username: Annotated[str | None, Query()] = None,
     phone: Annotated[str | None, Query()] = None,
     status: Annotated[int | None, Query()] = None,
+    dept_subtree: Annotated[bool, Query(description='Include the users of the sub departments')] = False,
 ):
-    user_select = await user_service.get_select(dept=dept, username=username, phone=phone, status=status)
+    user_select = await user_service.get_select(
+        dept=dept, username=username, phone=phone, status=status, dept_subtree=dept_subtree
+    )
     page_data = await paging_data(db, user_select, GetUserInfoListDetails)
     return await response_base.success(data=page_data)
 
@@ -81,3 +81,12 @@ class StatusType(IntEnum):
 
     disable = 0
     enable = 1
+
+
+class PageCountType(StrEnum):
+    """Pagination total count type"""
+
+    exact = 'exact'
+    cached = 'cached'
+    estimate = 'estimate'
+    none = 'none'
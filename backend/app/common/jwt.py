@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import hashlib
+import time
+
+from collections import OrderedDict
 from datetime import datetime, timedelta
 
 from asgiref.sync import sync_to_async
@@ -8,13 +12,12 @@ from fastapi.security import HTTPBearer, OAuth2PasswordBearer
 from fastapi.security.utils import get_authorization_scheme_param
 from jose import jwt
 from passlib.context import CryptContext
-from sqlalchemy.ext.asyncio import AsyncSession
+from redis.asyncio.client import Pipeline
 
 from backend.app.common.exception.errors import AuthorizationError, TokenError
-from backend.app.common.redis import redis_client
+from backend.app.common.principal import UserPrincipal, user_principal_cache
+from backend.app.common.redis import redis_client, redis_subscriber
 from backend.app.core.conf import settings
-from backend.app.crud.crud_user import user_dao
-from backend.app.models import User
 from backend.app.utils.timezone import timezone
 
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
@@ -26,6 +29,87 @@ oauth2_schema = OAuth2PasswordBearer(tokenUrl=settings.TOKEN_URL_SWAGGER)
 DependsJwtAuth = Depends(HTTPBearer())
 
 
+class TokenVerifyCache:
+    """
+    Tokens validated by the current worker, so that they are not decoded and checked in redis on every request
+
+    Revoked tokens are dropped by the redis pub/sub revocation messages, entries expire after at most
+    TOKEN_LOCAL_EXPIRE_SECONDS, which bounds the delay when the messages are missed
+    """
+
+    def __init__(self):
+        self._local: OrderedDict[str, tuple[float, int]] = OrderedDict()
+        self._channel = f'{settings.TOKEN_REDIS_PREFIX}:revoke_channel'
+        redis_subscriber.register(self._channel, self._on_revoke)
+
+    @staticmethod
+    def _hash(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> int | None:
+        """
+        Get the user id of the validated token
+
+        :param token:
+        :return:
+        """
+        token_hash = self._hash(token)
+        item = self._local.get(token_hash)
+        if item is None:
+            return None
+        expire_time, user_id = item
+        if expire_time < time.time():
+            del self._local[token_hash]
+            return None
+        self._local.move_to_end(token_hash)
+        return user_id
+
+    def set(self, token: str, user_id: int, token_expire_time: float) -> None:
+        """
+        Cache the validated token
+
+        :param token:
+        :param user_id:
+        :param token_expire_time: Token expiration timestamp
+        :return:
+        """
+        token_hash = self._hash(token)
+        self._local[token_hash] = (min(time.time() + settings.TOKEN_LOCAL_EXPIRE_SECONDS, token_expire_time), user_id)
+        self._local.move_to_end(token_hash)
+        while len(self._local) > settings.TOKEN_LOCAL_MAXSIZE:
+            self._local.popitem(last=False)
+
+    def _drop(self, user_id: int, token_hash: str | None = None) -> None:
+        if token_hash is not None:
+            self._local.pop(token_hash, None)
+        else:
+            for key in [key for key, (_, uid) in self._local.items() if uid == user_id]:
+                del self._local[key]
+
+    async def revoke(self, user_id: int, token: str | None = None) -> None:
+        """
+        Revoke the token in all workers, must be called after the token is deleted from redis
+
+        :param user_id:
+        :param token: Revoke all tokens of the user if not specified
+        :return:
+        """
+        token_hash = self._hash(token) if token else None
+        self._drop(user_id, token_hash)
+        await redis_client.publish(self._channel, f'{user_id}:{token_hash}' if token_hash else f'{user_id}')
+
+    async def _on_revoke(self, data: str | None) -> None:
+        """Apply the revocation of other workers"""
+        if data is None:
+            self._local.clear()
+            return
+        user_id, _, token_hash = data.partition(':')
+        self._drop(int(user_id), token_hash or None)
+
+
+token_verify_cache = TokenVerifyCache()
+
+
 @sync_to_async
 def get_hash_password(password: str) -> str:
     """
@@ -49,6 +133,141 @@ def password_verify(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def _expire_index(pipe: Pipeline, index_key: str, expire_seconds: int) -> None:
+    # The index must outlive its longest token, NX sets the expiration of a new index, GT only extends it
+    expire_seconds = max(expire_seconds, settings.TOKEN_EXPIRE_SECONDS, settings.TOKEN_REFRESH_EXPIRE_SECONDS)
+    pipe.expire(index_key, expire_seconds, nx=True)
+    pipe.expire(index_key, expire_seconds, gt=True)
+
+
+async def store_token(prefix: str, sub: str | int, token: str, expire_seconds: int) -> None:
+    """
+    Store the token, and add it to the token index of the user, which is a sorted set scored by expiration time
+
+    :param prefix: Token redis prefix
+    :param sub: The subject/userid of the JWT
+    :param token:
+    :param expire_seconds:
+    :return:
+    """
+    index_key = f'{prefix}_index:{sub}'
+    now = time.time()
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.setex(f'{prefix}:{sub}:{token}', expire_seconds, token)
+        pipe.zadd(index_key, {token: now + expire_seconds})
+        pipe.zremrangebyscore(index_key, '-inf', now)
+        _expire_index(pipe, index_key, expire_seconds)
+        await pipe.execute()
+
+
+async def delete_token(prefix: str, sub: str | int, token: str) -> None:
+    """
+    Delete the token
+
+    :param prefix: Token redis prefix
+    :param sub: The subject/userid of the JWT
+    :param token:
+    :return:
+    """
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.unlink(f'{prefix}:{sub}:{token}')
+        pipe.zrem(f'{prefix}_index:{sub}', token)
+        await pipe.execute()
+
+
+async def get_user_tokens(prefix: str, sub: str | int) -> list[tuple[str, float]]:
+    """
+    Get the unexpired tokens of the user and their expiration timestamps, e.g. the login sessions
+
+    :param prefix: Token redis prefix
+    :param sub: The subject/userid of the JWT
+    :return:
+    """
+    index_key = f'{prefix}_index:{sub}'
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zremrangebyscore(index_key, '-inf', time.time())
+        pipe.zrange(index_key, 0, -1, withscores=True)
+        _, tokens = await pipe.execute()
+    return tokens
+
+
+async def revoke_user_tokens(prefix: str, sub: str | int, exclude: str | None = None) -> int:
+    """
+    Delete all tokens of the user through the token index
+
+    :param prefix: Token redis prefix
+    :param sub: The subject/userid of the JWT
+    :param exclude: The token to keep
+    :return: Deleted count
+    """
+    index_key = f'{prefix}_index:{sub}'
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zrange(index_key, 0, -1)
+        pipe.exists(f'{prefix}_index_backfilled')
+        tokens, backfilled = await pipe.execute()
+    tokens = [token for token in tokens if token != exclude]
+    if not backfilled:
+        # The tokens stored before the index was introduced are not indexed until backfill_token_index has run
+        count = await redis_client.delete_prefix(
+            f'{prefix}:{sub}:', exclude=f'{prefix}:{sub}:{exclude}' if exclude else None
+        )
+        if tokens:
+            await redis_client.zrem(index_key, *tokens)
+        return count
+    if not tokens:
+        return 0
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.unlink(*[f'{prefix}:{sub}:{token}' for token in tokens])
+        pipe.zrem(index_key, *tokens)
+        count, _ = await pipe.execute()
+    return count
+
+
+async def backfill_token_index(prefix: str, *, batch: int = 1000) -> int:
+    """
+    Add the tokens stored before the token index was introduced to the index, only runs once, in one worker
+
+    :param prefix: Token redis prefix
+    :param batch: SCAN count
+    :return: Indexed count
+    """
+    done_key = f'{prefix}_index_backfilled'
+    lock_key = f'{prefix}_index_backfill_lock'
+    if await redis_client.exists(done_key):
+        return 0
+    if not await redis_client.set(lock_key, 1, nx=True, ex=60 * 5):
+        # Run by another worker, the revocations fall back to the prefix delete until it is done
+        return 0
+    count = 0
+    cursor = 0
+    try:
+        while True:
+            cursor, keys = await redis_client.scan(cursor, match=f'{prefix}:*', count=batch)
+            keys = [key for key in keys if key.count(':', len(prefix) + 1) == 1]
+            if keys:
+                now = time.time()
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for key in keys:
+                        pipe.ttl(key)
+                    ttls = await pipe.execute()
+                async with redis_client.pipeline(transaction=False) as pipe:
+                    for key, ttl in zip(keys, ttls):
+                        if ttl <= 0:
+                            continue
+                        sub, _, token = key[len(prefix) + 1 :].partition(':')
+                        index_key = f'{prefix}_index:{sub}'
+                        pipe.zadd(index_key, {token: now + ttl})
+                        _expire_index(pipe, index_key, ttl)
+                        count += 1
+                    await pipe.execute()
+            if cursor == 0:
+                break
+        await redis_client.set(done_key, 1)
+    finally:
+        await redis_client.delete(lock_key)
+    return count
+
+
 async def create_access_token(sub: str, expires_delta: timedelta | None = None, **kwargs) -> tuple[str, datetime]:
     """
     Generate encryption token
@@ -67,10 +286,9 @@ async def create_access_token(sub: str, expires_delta: timedelta | None = None,
     to_encode = {'exp': expire, 'sub': sub, **kwargs}
     token = jwt.encode(to_encode, settings.TOKEN_SECRET_KEY, settings.TOKEN_ALGORITHM)
     if multi_login is False:
-        prefix = f'{settings.TOKEN_REDIS_PREFIX}:{sub}:'
-        await redis_client.delete_prefix(prefix)
-    key = f'{settings.TOKEN_REDIS_PREFIX}:{sub}:{token}'
-    await redis_client.setex(key, expire_seconds, token)
+        await revoke_user_tokens(settings.TOKEN_REDIS_PREFIX, sub)
+        await token_verify_cache.revoke(int(sub))
+    await store_token(settings.TOKEN_REDIS_PREFIX, sub, token, expire_seconds)
     return token, expire
 
 
@@ -96,10 +314,8 @@ async def create_refresh_token(sub: str, expire_time: datetime | None = None, **
     to_encode = {'exp': expire, 'sub': sub, **kwargs}
     refresh_token = jwt.encode(to_encode, settings.TOKEN_SECRET_KEY, settings.TOKEN_ALGORITHM)
     if multi_login is False:
-        prefix = f'{settings.TOKEN_REFRESH_REDIS_PREFIX}:{sub}:'
-        await redis_client.delete_prefix(prefix)
-    key = f'{settings.TOKEN_REFRESH_REDIS_PREFIX}:{sub}:{refresh_token}'
-    await redis_client.setex(key, expire_seconds, refresh_token)
+        await revoke_user_tokens(settings.TOKEN_REFRESH_REDIS_PREFIX, sub)
+    await store_token(settings.TOKEN_REFRESH_REDIS_PREFIX, sub, refresh_token, expire_seconds)
     return refresh_token, expire
 
 
@@ -117,10 +333,10 @@ async def create_new_token(sub: str, token: str, refresh_token: str, **kwargs) -
         raise TokenError(msg='Refresh Token Expired')
     new_access_token, new_access_token_expire_time = await create_access_token(sub, **kwargs)
     new_refresh_token, new_refresh_token_expire_time = await create_refresh_token(sub, **kwargs)
-    token_key = f'{settings.TOKEN_REDIS_PREFIX}:{sub}:{token}'
     refresh_token_key = f'{settings.TOKEN_REDIS_PREFIX}:{sub}:{refresh_token}'
-    await redis_client.delete(token_key)
+    await delete_token(settings.TOKEN_REDIS_PREFIX, sub, token)
     await redis_client.delete(refresh_token_key)
+    await token_verify_cache.revoke(int(sub), token)
     return new_access_token, new_refresh_token, new_access_token_expire_time, new_refresh_token_expire_time
 
 
@@ -165,24 +381,27 @@ async def jwt_authentication(token: str) -> dict[str, int]:
     :param token:
     :return:
     """
+    user_id = token_verify_cache.get(token)
+    if user_id is not None:
+        return {'sub': user_id}
     user_id = await jwt_decode(token)
     key = f'{settings.TOKEN_REDIS_PREFIX}:{user_id}:{token}'
     token_verify = await redis_client.get(key)
     if not token_verify:
         raise TokenError(msg='Token Expired')
+    token_verify_cache.set(token, user_id, jwt.get_unverified_claims(token)['exp'])
     return {'sub': user_id}
 
 
-async def get_current_user(db: AsyncSession, data: dict) -> User:
+async def get_current_user(data: dict) -> UserPrincipal:
     """
     Get the current user through token
 
-    :param db:
     :param data:
     :return:
     """
     user_id = data.get('sub')
-    user = await user_dao.get_with_relation(db, user_id=user_id)
+    user = await user_principal_cache.get(user_id)
     if not user:
         raise TokenError(msg='Token Invalid')
     if not user.status:
@@ -2,16 +2,32 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
+import asyncio
+import base64
+import hashlib
 import math
+import time
 
-from typing import TYPE_CHECKING, Dict, Generic, Sequence, TypeVar
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, Generic, Sequence, TypeVar
+
+import msgspec
 
 from fastapi import Depends, Query
-from fastapi_pagination import pagination_ctx
-from fastapi_pagination.bases import AbstractPage, AbstractParams, RawParams
-from fastapi_pagination.ext.sqlalchemy import paginate
+from fastapi_pagination import pagination_ctx, resolve_params
+from fastapi_pagination.bases import AbstractPage, AbstractParams, CursorRawParams, RawParams
+from fastapi_pagination.ext.sqlalchemy import count_query, paginate
 from fastapi_pagination.links.bases import create_links
 from pydantic import BaseModel
+from sqlalchemy import and_, column, event, func, or_, select, table
+from sqlalchemy.orm import ORMExecuteState, Session
+
+from backend.app.common.enums import PageCountType
+from backend.app.common.exception import errors
+from backend.app.common.log import log
+from backend.app.common.redis import redis_client
+from backend.app.core.conf import settings
+from backend.app.utils.serializers import select_list_as_structs
 
 if TYPE_CHECKING:
     from sqlalchemy import Select
@@ -25,20 +41,25 @@ SchemaT = TypeVar('SchemaT')
 class _Params(BaseModel, AbstractParams):
     page: int = Query(1, ge=1, description='Page number')
     size: int = Query(20, gt=0, le=100, description='Page size')  # Default 20 item
+    count: PageCountType = Query(
+        PageCountType.exact,
+        description='Total count: exact, cached (invalidated by writes, or expired), estimate (table statistics) or none',
+    )
 
     def to_raw_params(self) -> RawParams:
         return RawParams(
             limit=self.size,
             offset=self.size * (self.page - 1),
+            include_total=self.count == PageCountType.exact,
         )
 
 
 class _Page(AbstractPage[T], Generic[T]):
     items: Sequence[T]  # Data
-    total: int  # OverallDataNumber
+    total: int | None  # OverallDataNumber
     page: int  # Firstnpage
     size: int  # eachpageNumber
-    total_pages: int  # OverallpageNumber
+    total_pages: int | None  # OverallpageNumber
     links: Dict[str, str | None]  # Jump link
 
     __params_type__ = _Params  # use customParams
@@ -47,17 +68,23 @@ class _Page(AbstractPage[T], Generic[T]):
     def create(
         cls,
         items: Sequence[T],
-        total: int,
+        total: int | None,
         params: _Params,
     ) -> _Page[T]:
         page = params.page
         size = params.size
-        total_pages = math.ceil(total / params.size)
+        if total is None:
+            # Count is skipped, there may be a next page when this page is full
+            total_pages = None
+            has_next = len(items) >= size
+        else:
+            total_pages = math.ceil(total / params.size)
+            has_next = (page + 1) <= total_pages
         links = create_links(
             **{
                 'first': {'page': 1, 'size': f'{size}'},
-                'last': {'page': f'{math.ceil(total / params.size)}', 'size': f'{size}'} if total > 0 else None,
-                'next': {'page': f'{page + 1}', 'size': f'{size}'} if (page + 1) <= total_pages else None,
+                'last': {'page': f'{total_pages}', 'size': f'{size}'} if total else None,
+                'next': {'page': f'{page + 1}', 'size': f'{size}'} if has_next else None,
                 'prev': {'page': f'{page - 1}', 'size': f'{size}'} if (page - 1) >= 1 else None,
             }
         ).model_dump()
@@ -65,23 +92,254 @@ class _Page(AbstractPage[T], Generic[T]):
         return cls(items=items, total=total, page=params.page, size=params.size, total_pages=total_pages, links=links)
 
 
+class _CursorParams(BaseModel, AbstractParams):
+    cursor: str | None = Query(None, description='Page cursor, next_cursor or prev_cursor of the previous page')
+    size: int = Query(20, gt=0, le=100, description='Page size')
+    total: bool = Query(False, description='Include the approximate total from table statistics')
+
+    def to_raw_params(self) -> CursorRawParams:
+        return CursorRawParams(
+            cursor=self.cursor,
+            size=self.size,
+            include_total=self.total,
+        )
+
+
+class _CursorPage(AbstractPage[T], Generic[T]):
+    items: Sequence[T]  # Data
+    total: int | None  # Approximate overall data number, unfiltered
+    size: int  # eachpageNumber
+    next_cursor: str | None  # Cursor of the next page
+    prev_cursor: str | None  # Cursor of the previous page
+
+    __params_type__ = _CursorParams  # use customParams
+
+    @classmethod
+    def create(
+        cls,
+        items: Sequence[T],
+        params: _CursorParams,
+        *,
+        total: int | None = None,
+        next_cursor: str | None = None,
+        prev_cursor: str | None = None,
+        **kwargs: Any,
+    ) -> _CursorPage[T]:
+        return cls(items=items, total=total, size=params.size, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
 class _PageData(BaseModel, Generic[DataT]):
     page_data: DataT | None = None
 
 
+class PageCountCache:
+    """
+    Total count cache of paginated selects
+
+    The counts are stored in a redis hash per table, keyed by the hash of the compiled count select and its
+    parameters, the hash of a table is deleted when a session that wrote to the table is committed, except for the
+    PAGINATION_COUNT_EXPIRE_ONLY_TABLES, e.g. the log tables, whose counts are only refreshed when expired
+    """
+
+    _info_key = 'page_count_tables'
+
+    def __init__(self):
+        event.listen(Session, 'after_flush', self._after_flush)
+        event.listen(Session, 'do_orm_execute', self._do_orm_execute)
+        event.listen(Session, 'after_commit', self._after_commit)
+        event.listen(Session, 'after_rollback', self._after_rollback)
+
+    @staticmethod
+    def _key(table_name: str) -> str:
+        return f'{settings.PAGINATION_COUNT_REDIS_PREFIX}:{table_name}'
+
+    async def get(self, db: AsyncSession, select: Select, table_name: str) -> int:
+        """
+        Get the total count of the select, counted and cached on miss
+
+        :param db:
+        :param select:
+        :param table_name: Table of the select entity
+        :return:
+        """
+        stmt = count_query(select)
+        compiled = stmt.compile(dialect=db.bind.dialect)
+        field = hashlib.sha256(f'{compiled}|{sorted(compiled.params.items())}'.encode()).hexdigest()
+        key = self._key(table_name)
+        cached = await redis_client.hget(key, field)
+        if cached:
+            count, expire_time = cached.split(':')
+            if float(expire_time) > time.time():
+                return int(count)
+        count = await db.scalar(stmt)
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.hset(key, field, f'{count}:{time.time() + settings.PAGINATION_COUNT_EXPIRE_SECONDS}')
+            pipe.expire(key, settings.PAGINATION_COUNT_EXPIRE_SECONDS)
+            await pipe.execute()
+        return count
+
+    async def invalidate(self, *table_names: str) -> None:
+        """
+        Invalidate the cached counts of the tables
+
+        :param table_names:
+        :return:
+        """
+        if table_names:
+            await redis_client.delete(*[self._key(table_name) for table_name in table_names])
+
+    def _after_flush(self, session: Session, flush_context) -> None:
+        tables = session.info.setdefault(self._info_key, set())
+        for obj in (*session.new, *session.dirty, *session.deleted):
+            tables.add(obj.__table__.name)
+
+    def _do_orm_execute(self, orm_execute_state: ORMExecuteState) -> None:
+        if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+            table = orm_execute_state.statement.table
+            orm_execute_state.session.info.setdefault(self._info_key, set()).add(table.name)
+
+    def _after_commit(self, session: Session) -> None:
+        tables = session.info.pop(self._info_key, set()).difference(settings.PAGINATION_COUNT_EXPIRE_ONLY_TABLES)
+        if not tables:
+            return
+        try:
+            # Sync session event, runs in the event loop of the async session
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Sync session outside of the event loop, the counts expire by themselves
+            return
+        task = loop.create_task(self.invalidate(*tables))
+        task.add_done_callback(self._on_invalidated)
+
+    def _after_rollback(self, session: Session) -> None:
+        session.info.pop(self._info_key, None)
+
+    @staticmethod
+    def _on_invalidated(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception():
+            log.error('❌ Pagination count cache invalidation failed {}', task.exception())
+
+
+page_count_cache = PageCountCache()
+
+
+async def _estimate_total(db: AsyncSession, table_name: str) -> int | None:
+    # A select(), so that it is routed to the read replica like the page query
+    tables = table(
+        'TABLES', column('TABLE_SCHEMA'), column('TABLE_NAME'), column('TABLE_ROWS'), schema='information_schema'
+    )
+    stmt = select(tables.c.TABLE_ROWS).where(
+        tables.c.TABLE_SCHEMA == func.database(), tables.c.TABLE_NAME == table_name
+    )
+    return await db.scalar(stmt)
+
+
+async def _paginate_select(db: AsyncSession, select: Select) -> _Page:
+    params: _Params = resolve_params()
+    _paginate = await paginate(db, select)
+    if params.count in (PageCountType.cached, PageCountType.estimate):
+        table_name = select.column_descriptions[0]['entity'].__tablename__
+        if params.count == PageCountType.estimate and select.whereclause is None:
+            total = await _estimate_total(db, table_name)
+        else:
+            total = await page_count_cache.get(db, select, table_name)
+        _paginate = _Page.create(_paginate.items, total, params)
+    return _paginate
+
+
 async def paging_data(db: AsyncSession, select: Select, page_data_schema: SchemaT) -> dict:
     """
     Based on SQLAlchemy create separatepageData
 
+    The total count is given by the count query parameter, estimate only applies to unfiltered selects,
+    filtered selects fall back to cached
+
     :param db:
     :param select:
     :param page_data_schema:
     :return:
     """
-    _paginate = await paginate(db, select)
+    _paginate = await _paginate_select(db, select)
     page_data = _PageData[_Page[page_data_schema]](page_data=_paginate).model_dump()['page_data']
     return page_data
 
 
+async def fast_paging_data(db: AsyncSession, select: Select, page_data_schema: type[BaseModel]) -> dict:
+    """
+    Same as paging_data, but the items are converted to msgspec structs of the schema without pydantic validation,
+    must be returned by response_base.fast_success
+
+    :param db:
+    :param select:
+    :param page_data_schema:
+    :return:
+    """
+    _paginate = await _paginate_select(db, select)
+    page_data = {name: getattr(_paginate, name) for name in _Page.model_fields}
+    page_data['items'] = select_list_as_structs(_paginate.items, page_data_schema)
+    return page_data
+
+
+def _encode_cursor(key: datetime, pk: int, forward: bool) -> str:
+    return base64.urlsafe_b64encode(msgspec.json.encode((key, pk, forward))).decode()
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int, bool]:
+    try:
+        return msgspec.json.decode(base64.urlsafe_b64decode(cursor), type=tuple[datetime, int, bool])
+    except (ValueError, msgspec.DecodeError):
+        raise errors.RequestError(msg='Invalid page cursor')
+
+
+async def cursor_paging_data(
+    db: AsyncSession, select: Select, page_data_schema: SchemaT, sort_key: str = 'created_time'
+) -> dict:
+    """
+    Based on SQLAlchemy create keyset (cursor) page data, ordered by (sort_key, id) descending
+
+    Each page is a range scan of the (sort_key, id) index, so the cost does not depend on the page depth
+
+    :param db:
+    :param select:
+    :param page_data_schema:
+    :param sort_key: Datetime column of the model
+    :return:
+    """
+    params: _CursorParams = resolve_params()
+    raw_params = params.to_raw_params()
+    model = select.column_descriptions[0]['entity']
+    sort_column, id_column = getattr(model, sort_key), model.id
+    select = select.order_by(None)
+    forward = True
+    if raw_params.cursor:
+        key, pk, forward = _decode_cursor(raw_params.cursor)
+        if forward:
+            select = select.where(or_(sort_column < key, and_(sort_column == key, id_column < pk)))
+        else:
+            select = select.where(or_(sort_column > key, and_(sort_column == key, id_column > pk)))
+    if forward:
+        select = select.order_by(sort_column.desc(), id_column.desc())
+    else:
+        select = select.order_by(sort_column.asc(), id_column.asc())
+    items = list((await db.scalars(select.limit(raw_params.size + 1))).all())
+    has_more = len(items) > raw_params.size
+    items = items[: raw_params.size]
+    if not forward:
+        items.reverse()
+    next_cursor = prev_cursor = None
+    if items:
+        if has_more or not forward:
+            next_cursor = _encode_cursor(getattr(items[-1], sort_key), items[-1].id, True)
+        if (has_more and not forward) or (forward and raw_params.cursor):
+            prev_cursor = _encode_cursor(getattr(items[0], sort_key), items[0].id, False)
+    total = await _estimate_total(db, model.__tablename__) if raw_params.include_total else None
+    _paginate = _CursorPage.create(items, params, total=total, next_cursor=next_cursor, prev_cursor=prev_cursor)
+    page_data = _PageData[_CursorPage[page_data_schema]](page_data=_paginate).model_dump()['page_data']
+    return page_data
+
+
 # Separate/split/dividepageDependency injection
 DependsPagination = Depends(pagination_ctx(_Page))
+
+# Cursor page dependency injection
+DependsCursorPagination = Depends(pagination_ctx(_CursorPage))
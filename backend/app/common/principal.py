@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import time
+
+from collections import OrderedDict
+from datetime import datetime
+
+import msgspec
+
+from backend.app.common.redis import redis_client, redis_subscriber
+from backend.app.core.conf import settings
+from backend.app.models import User
+
+
+class MenuPrincipal(msgspec.Struct):
+    id: int
+    perms: str | None
+    status: int
+
+
+class RolePrincipal(msgspec.Struct):
+    id: int
+    name: str
+    status: int
+    data_scope: int | None
+    menus: list[MenuPrincipal]
+
+
+class DeptPrincipal(msgspec.Struct):
+    id: int
+    name: str
+    status: int
+    del_flag: bool
+
+
+class UserPrincipal(msgspec.Struct):
+    """Snapshot of the authenticated user, which is set to request.user"""
+
+    id: int
+    uuid: str
+    username: str
+    nickname: str
+    email: str
+    is_superuser: bool
+    is_staff: bool
+    status: int
+    is_multi_login: bool
+    avatar: str | None
+    phone: str | None
+    join_time: datetime
+    last_login_time: datetime | None
+    dept_id: int | None
+    dept: DeptPrincipal | None
+    roles: list[RolePrincipal]
+
+    @classmethod
+    def from_model(cls, user: User) -> 'UserPrincipal':
+        """
+        Create snapshot from the user with relation
+
+        :param user:
+        :return:
+        """
+        dept = user.dept
+        return cls(
+            id=user.id,
+            uuid=user.uuid,
+            username=user.username,
+            nickname=user.nickname,
+            email=user.email,
+            is_superuser=user.is_superuser,
+            is_staff=user.is_staff,
+            status=user.status,
+            is_multi_login=user.is_multi_login,
+            avatar=user.avatar,
+            phone=user.phone,
+            join_time=user.join_time,
+            last_login_time=user.last_login_time,
+            dept_id=user.dept_id,
+            dept=DeptPrincipal(id=dept.id, name=dept.name, status=dept.status, del_flag=dept.del_flag)
+            if dept
+            else None,
+            roles=[
+                RolePrincipal(
+                    id=role.id,
+                    name=role.name,
+                    status=role.status,
+                    data_scope=role.data_scope,
+                    menus=[MenuPrincipal(id=menu.id, perms=menu.perms, status=menu.status) for menu in role.menus],
+                )
+                for role in user.roles
+            ],
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Converting to dict, the department and roles are replaced by their names
+
+        :return:
+        """
+        data = msgspec.structs.asdict(self)
+        data['dept'] = self.dept.name if self.dept else None
+        data['roles'] = [role.name for role in self.roles]
+        return data
+
+
+class UserPrincipalCache:
+    """
+    User principal cache, a short-lived LRU of the current worker in front of redis
+
+    User writes invalidate the snapshot of the user, role, department and menu writes bump the version,
+    which invalidates the snapshots of all users, other workers are notified by redis pub/sub
+    """
+
+    def __init__(self):
+        self._encoder = msgspec.json.Encoder()
+        self._decoder = msgspec.json.Decoder(UserPrincipal)
+        self._local: OrderedDict[int, tuple[float, UserPrincipal]] = OrderedDict()
+        self._version: int | None = None
+        self._version_key = f'{settings.USER_PRINCIPAL_REDIS_PREFIX}:version'
+        self._channel = f'{settings.USER_PRINCIPAL_REDIS_PREFIX}:channel'
+        redis_subscriber.register(self._channel, self._on_invalidate)
+
+    async def _get_version(self) -> int:
+        if self._version is None:
+            self._version = int(await redis_client.get(self._version_key) or 0)
+        return self._version
+
+    def _local_get(self, user_id: int) -> UserPrincipal | None:
+        item = self._local.get(user_id)
+        if item is None:
+            return None
+        expire_time, principal = item
+        if expire_time < time.monotonic():
+            del self._local[user_id]
+            return None
+        self._local.move_to_end(user_id)
+        return principal
+
+    def _local_set(self, user_id: int, principal: UserPrincipal) -> None:
+        self._local[user_id] = (time.monotonic() + settings.USER_PRINCIPAL_LOCAL_EXPIRE_SECONDS, principal)
+        self._local.move_to_end(user_id)
+        while len(self._local) > settings.USER_PRINCIPAL_LOCAL_MAXSIZE:
+            self._local.popitem(last=False)
+
+    async def get(self, user_id: int) -> UserPrincipal | None:
+        """
+        Get user principal, local cache -> redis -> database
+
+        :param user_id:
+        :return:
+        """
+        principal = self._local_get(user_id)
+        if principal is not None:
+            return principal
+        version = await self._get_version()
+        key = f'{settings.USER_PRINCIPAL_REDIS_PREFIX}:{version}:{user_id}'
+        cached = await redis_client.get(key)
+        if cached:
+            principal = self._decoder.decode(cached)
+        else:
+            # Import here to avoid circular import, crud_user depends on jwt, which depends on this module
+            from backend.app.crud.crud_user import user_dao
+            from backend.app.database.db_mysql import request_db_session
+
+            async with request_db_session(primary=True) as db:
+                user = await user_dao.get_with_relation(db, user_id=user_id)
+            if not user:
+                return None
+            principal = UserPrincipal.from_model(user)
+            await redis_client.setex(key, settings.USER_PRINCIPAL_REDIS_EXPIRE_SECONDS, self._encoder.encode(principal))
+        # The version may have been bumped while loading
+        if version == self._version:
+            self._local_set(user_id, principal)
+        return principal
+
+    async def invalidate(self, user_id: int | None = None) -> None:
+        """
+        Invalidate user principal, must be called after the transaction is committed
+
+        :param user_id: Invalidate all users if not specified
+        :return:
+        """
+        if user_id is None:
+            self._version = await redis_client.incr(self._version_key)
+            self._local.clear()
+            await redis_client.publish(self._channel, f'version:{self._version}')
+        else:
+            version = await self._get_version()
+            self._local.pop(user_id, None)
+            await redis_client.delete(f'{settings.USER_PRINCIPAL_REDIS_PREFIX}:{version}:{user_id}')
+            await redis_client.publish(self._channel, f'user:{user_id}')
+
+    async def _on_invalidate(self, data: str | None) -> None:
+        """Apply the invalidation of other workers"""
+        if data is None:
+            self._version = None
+            self._local.clear()
+            return
+        kind, value = data.split(':')
+        if kind == 'version':
+            if self._version is None or int(value) > self._version:
+                self._version = int(value)
+                self._local.clear()
+        else:
+            self._local.pop(int(value), None)
+
+
+user_principal_cache = UserPrincipalCache()
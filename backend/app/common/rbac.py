@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
+
+from uuid import uuid4
+
 import casbin
 import casbin_async_sqlalchemy_adapter
 
@@ -8,42 +12,116 @@ from fastapi import Depends, Request
 from backend.app.common.enums import MethodType, StatusType
 from backend.app.common.exception.errors import AuthorizationError, TokenError
 from backend.app.common.jwt import DependsJwtAuth
-from backend.app.common.redis import redis_client
+from backend.app.common.redis import redis_client, redis_subscriber
 from backend.app.core.conf import settings
 from backend.app.database.db_mysql import async_engine
 from backend.app.models import CasbinRule
+from backend.app.utils.casbin_matcher import CasbinMatcher
+
+# As static data, the rules data are directly defined within the module.
+_CASBIN_RBAC_MODEL_CONF_TEXT = """
+[request_definition]
+r = sub, obj, act
+
+[policy_definition]
+p = sub, obj, act
+
+[role_definition]
+g = _, _
+
+[policy_effect]
+e = some(where (p.eft == allow))
+
+[matchers]
+m = g(r.sub, p.sub) && (keyMatch(r.obj, p.obj) || keyMatch3(r.obj, p.obj)) && (r.act == p.act || p.act == "*")
+"""
 
 
 class RBAC:
-    @staticmethod
-    async def enforcer() -> casbin.AsyncEnforcer:
+    def __init__(self):
+        # One long-lived enforcer per worker process, rebuilt when another worker changes the policies
+        self._enforcer: casbin.AsyncEnforcer | None = None
+        self._enforcer_lock = asyncio.Lock()
+        self._enforcer_stale = False
+        self._matcher: CasbinMatcher | None = None
+        self._policy_version = 0
+        self._worker_id = uuid4().hex
+        redis_subscriber.register(f'{settings.CASBIN_POLICY_REDIS_PREFIX}:channel', self._on_policy_version)
+
+    async def enforcer(self) -> casbin.AsyncEnforcer:
         """
         Get casbin Executor
 
         :return:
         """
-        # As static data, the rules data are directly defined within the method.
-        _CASBIN_RBAC_MODEL_CONF_TEXT = """
-        [request_definition]
-        r = sub, obj, act
+        if self._enforcer is not None and not self._enforcer_stale:
+            return self._enforcer
+        async with self._enforcer_lock:
+            if self._enforcer is None:
+                adapter = casbin_async_sqlalchemy_adapter.Adapter(async_engine, db_class=CasbinRule)
+                model = casbin.AsyncEnforcer.new_model(text=_CASBIN_RBAC_MODEL_CONF_TEXT)
+                enforcer = casbin.AsyncEnforcer(model, adapter)
+                await enforcer.load_policy()
+                self._enforcer = enforcer
+                self._enforcer_stale = False
+                self._matcher = None
+            elif self._enforcer_stale:
+                # Reset before loading, so that a change published during the load is not lost
+                self._enforcer_stale = False
+                try:
+                    await self._enforcer.load_policy()
+                except Exception:
+                    self._enforcer_stale = True
+                    raise
+                self._matcher = None
+        return self._enforcer
+
+    async def matcher(self) -> CasbinMatcher:
+        """
+        Get the compiled policies matcher of casbin Executor
+
+        :return:
+        """
+        enforcer = await self.enforcer()
+        if self._matcher is None:
+            self._matcher = CasbinMatcher(enforcer.get_policy(), enforcer.get_grouping_policy())
+        return self._matcher
 
-        [policy_definition]
-        p = sub, obj, act
+    async def remove_subject_policies(self, *subjects: str) -> None:
+        """
+        Remove the p and g rules of the subjects from the enforcer memory, used after deleting them directly from db
 
-        [role_definition]
-        g = _, _
+        :param subjects: Role / user uuid
+        :return:
+        """
+        enforcer = await self.enforcer()
+        for subject in subjects:
+            enforcer.get_model().remove_filtered_policy('p', 'p', 0, subject)
+            enforcer.get_model().remove_filtered_policy('g', 'g', 0, subject)
+        enforcer.build_role_links()
+        self._matcher = None
 
-        [policy_effect]
-        e = some(where (p.eft == allow))
+    async def notify_policy_changed(self) -> None:
+        """
+        Bump the policy version and notify other workers to reload their enforcer
 
-        [matchers]
-        m = g(r.sub, p.sub) && (keyMatch(r.obj, p.obj) || keyMatch3(r.obj, p.obj)) && (r.act == p.act || p.act == "*")
+        :return:
         """
-        adapter = casbin_async_sqlalchemy_adapter.Adapter(async_engine, db_class=CasbinRule)
-        model = casbin.AsyncEnforcer.new_model(text=_CASBIN_RBAC_MODEL_CONF_TEXT)
-        enforcer = casbin.AsyncEnforcer(model, adapter)
-        await enforcer.load_policy()
-        return enforcer
+        self._matcher = None
+        self._policy_version = await redis_client.incr(f'{settings.CASBIN_POLICY_REDIS_PREFIX}:version')
+        await redis_client.publish(
+            f'{settings.CASBIN_POLICY_REDIS_PREFIX}:channel', f'{self._worker_id}:{self._policy_version}'
+        )
+
+    async def _on_policy_version(self, data: str | None) -> None:
+        """Mark the enforcer stale when other workers change the policies"""
+        if data is None:
+            self._enforcer_stale = True
+            return
+        worker_id, version = data.split(':')
+        if worker_id != self._worker_id and int(version) != self._policy_version:
+            self._policy_version = int(version)
+            self._enforcer_stale = True
 
     async def rbac_verify(self, request: Request, _token: str = DependsJwtAuth) -> None:
         """
@@ -130,8 +208,8 @@ class RBAC:
                 raise AuthorizationError(msg='Menu disabled,Authorization failure')
             if (method, path) in settings.CASBIN_EXCLUDE:
                 return
-            enforcer = await self.enforcer()
-            if not enforcer.enforce(user_uuid, path, method):
+            matcher = await self.matcher()
+            if not matcher.enforce(user_uuid, path, method):
                 raise AuthorizationError
 
 
@@ -1,13 +1,36 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
 import sys
 
+from contextlib import suppress
+from typing import Awaitable, Callable
+
 from redis.asyncio.client import Redis
 from redis.exceptions import AuthenticationError, TimeoutError
 
 from backend.app.common.log import log
 from backend.app.core.conf import settings
 
+_DELETE_PREFIX_LUA = """
+local cursor = '0'
+local count = 0
+local exclude = {}
+for i = 3, #ARGV do
+    exclude[ARGV[i]] = true
+end
+repeat
+    local result = redis.call('SCAN', cursor, 'MATCH', ARGV[1], 'COUNT', ARGV[2])
+    cursor = result[1]
+    for _, key in ipairs(result[2]) do
+        if not exclude[key] then
+            count = count + redis.call('UNLINK', key)
+        end
+    end
+until cursor == '0'
+return count
+"""
+
 
 class RedisCli(Redis):
     def __init__(self):
@@ -19,6 +42,7 @@ class RedisCli(Redis):
             socket_timeout=settings.REDIS_TIMEOUT,
             decode_responses=True,  # Transcoding utf-8
         )
+        self._delete_prefix_script = self.register_script(_DELETE_PREFIX_LUA)
 
     async def open(self):
         """
@@ -38,27 +62,108 @@ class RedisCli(Redis):
             log.error('❌ Database redis Connection exception {}', e)
             sys.exit()
 
-    async def delete_prefix(self, prefix: str, exclude: str | list = None):
+    async def delete_prefix(
+        self, prefix: str, exclude: str | list = None, *, batch: int = 1000, lua: bool = False
+    ) -> int:
         """
         Delete all with specified prefixkey
 
+        Every SCAN page is deleted with one UNLINK, pipelined with the next SCAN, so that it takes one round-trip
+        per page and memory is bounded by the page size
+
         :param prefix:
         :param exclude:
+        :param batch: SCAN count
+        :param lua: Scan and delete in one server side script, only for small keyspaces, redis is blocked while running
+        :return: Deleted count
+        """
+        match = f'{prefix}*'
+        exclude = {exclude} if isinstance(exclude, str) else set(exclude or ())
+        if lua:
+            return await self._delete_prefix_script(args=[match, batch, *exclude])
+        count = 0
+        cursor, keys = await self.scan(0, match=match, count=batch)
+        while True:
+            keys = [key for key in keys if key not in exclude]
+            if cursor == 0:
+                if keys:
+                    count += await self.unlink(*keys)
+                return count
+            async with self.pipeline(transaction=False) as pipe:
+                if keys:
+                    pipe.unlink(*keys)
+                pipe.scan(cursor, match=match, count=batch)
+                result = await pipe.execute()
+            if keys:
+                count += result[0]
+            cursor, keys = result[-1]
+
+
+class RedisSubscriber:
+    """
+    One pub/sub subscription per worker process, dispatch the channel messages to the registered handlers
+
+    The handler is called with the message data, or with None when the subscription was interrupted and messages
+    may have been missed, the handler should then drop all of its local state
+    """
+
+    def __init__(self, client: Redis):
+        self._client = client
+        self._handlers: dict[str, Callable[[str | None], Awaitable[None]]] = {}
+        self._task: asyncio.Task | None = None
+
+    def register(self, channel: str, handler: Callable[[str | None], Awaitable[None]]) -> None:
+        """
+        Register channel handler, must be called before start
+
+        :param channel:
+        :param handler:
         :return:
         """
-        keys = []
-        async for key in self.scan_iter(match=f'{prefix}*'):
-            if isinstance(exclude, str):
-                if key != exclude:
-                    keys.append(key)
-            elif isinstance(exclude, list):
-                if key not in exclude:
-                    keys.append(key)
-            else:
-                keys.append(key)
-        for key in keys:
-            await self.delete(key)
+        self._handlers[channel] = handler
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self._client.pubsub()
+            try:
+                await pubsub.subscribe(*self._handlers)
+                async for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        await self._handlers[message['channel']](message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error('❌ Redis subscription exception {}', e)
+                for handler in self._handlers.values():
+                    await handler(None)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+
+    async def start(self) -> None:
+        """
+        Start subscription of the current worker
+
+        :return:
+        """
+        if self._task is None and self._handlers:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """
+        Stop subscription of the current worker
+
+        :return:
+        """
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
 
 
 # CreateredisConnect object
 redis_client = RedisCli()
+
+# Create redis pub/sub object
+redis_subscriber = RedisSubscriber(redis_client)
@@ -7,6 +7,7 @@ from pydantic import BaseModel, ConfigDict
 
 from backend.app.common.response.response_code import CustomResponse, CustomResponseCode
 from backend.app.core.conf import settings
+from backend.app.utils.serializers import MsgSpecJSONResponse
 
 _ExcludeData = set[int | str] | dict[int | str, Any]
 
@@ -83,5 +84,21 @@ class ResponseBase:
     ) -> ResponseModel:
         return await self.__response(res=res, data=data)
 
+    @staticmethod
+    async def fast_success(
+        *,
+        res: CustomResponseCode | CustomResponse = CustomResponseCode.HTTP_200,
+        data: Any | None = None,
+    ) -> MsgSpecJSONResponse:
+        """
+        Return the response encoded by msgspec directly, skipping the response model validation and serialization,
+        data must be encodable by msgspec, e.g. msgspec structs
+
+        :param res: Return information
+        :param data: Return data
+        :return:
+        """
+        return MsgSpecJSONResponse({'code': res.code, 'msg': res.msg, 'data': data})
+
 
 response_base = ResponseBase()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+
+from typing import Any, Awaitable, Callable
+
+import msgspec
+
+from backend.app.common.redis import redis_client, redis_subscriber
+from backend.app.core.conf import settings
+
+TreeLoader = Callable[[], Awaitable[list[dict[str, Any]]]]
+
+
+class TreeCache:
+    """
+    Versioned full tree cache, the tree is serialized to JSON once and kept in redis and the current worker
+
+    Writes bump the version, which invalidates the tree, other workers are notified by redis pub/sub
+    """
+
+    def __init__(self, name: str):
+        self._version_key = f'{settings.TREE_REDIS_PREFIX}:{name}:version'
+        self._key_prefix = f'{settings.TREE_REDIS_PREFIX}:{name}'
+        self._channel = f'{settings.TREE_REDIS_PREFIX}:{name}:channel'
+        self._version: int | None = None
+        self._local: tuple[int, list[dict[str, Any]]] | None = None
+        self._lock = asyncio.Lock()
+        redis_subscriber.register(self._channel, self._on_invalidate)
+
+    async def _get_version(self) -> int:
+        if self._version is None:
+            self._version = int(await redis_client.get(self._version_key) or 0)
+        return self._version
+
+    async def get(self, loader: TreeLoader) -> list[dict[str, Any]]:
+        """
+        Get the full tree, local cache -> redis -> loader, the returned tree is shared and must not be modified
+
+        :param loader: Build the full tree from the database
+        :return:
+        """
+        version = await self._get_version()
+        local = self._local
+        if local is not None and local[0] == version:
+            return local[1]
+        async with self._lock:
+            # Built by another request while waiting
+            local = self._local
+            if local is not None and local[0] == version:
+                return local[1]
+            key = f'{self._key_prefix}:{version}'
+            data = await redis_client.get(key)
+            if data is None:
+                data = msgspec.json.encode(await loader())
+                await redis_client.setex(key, settings.TREE_REDIS_EXPIRE_SECONDS, data)
+            tree = msgspec.json.decode(data)
+            # The version may have been bumped while loading
+            if version == self._version:
+                self._local = (version, tree)
+        return tree
+
+    async def invalidate(self) -> None:
+        """
+        Invalidate the tree, must be called after the transaction is committed
+
+        :return:
+        """
+        self._version = await redis_client.incr(self._version_key)
+        self._local = None
+        await redis_client.publish(self._channel, str(self._version))
+
+    async def _on_invalidate(self, data: str | None) -> None:
+        """Apply the invalidation of other workers"""
+        if data is None:
+            self._version = None
+            self._local = None
+        elif self._version is None or int(data) > self._version:
+            self._version = int(data)
+            self._local = None
+
+
+menu_tree_cache = TreeCache('menu')
+
+dept_tree_cache = TreeCache('dept')
@@ -92,6 +92,17 @@ class Settings(BaseSettings):
     DB_ECHO: bool = False
     DB_DATABASE: str = 'fba'
     DB_CHARSET: str = 'utf8mb4'
+    DB_BULK_BATCH_SIZE: int = 1000  # Max rows of one bulk statement
+    DB_POOL_SIZE: int = 10  # Persistent connections of each engine
+    DB_POOL_MAX_OVERFLOW: int = 20  # Extra connections under load
+    DB_POOL_RECYCLE: int = 60 * 60  # Connection max age, below the MySQL wait_timeout,unit: second
+    DB_POOL_TIMEOUT: int = 30  # Wait for a free connection,unit: second
+    DB_CONNECT_TIMEOUT: int = 10  # unit: second
+    DB_COMPILED_CACHE_SIZE: int = 1000  # Compiled statements cache of each engine
+    DB_POOL_PRE_PING: bool = False  # Ping on every checkout, the background health check pings the idle connections
+    DB_POOL_HEALTH_INTERVAL: int = 30  # Idle connections check interval, below the wait_timeout,unit: second
+    DB_REPLICA_HOSTS: list[str] = []  # Read replicas host:port, same user and database as the primary
+    DB_REPLICA_EJECT_SECONDS: int = 30  # Skip a failed replica for,unit: second
 
     # Redis
     REDIS_TIMEOUT: int = 5
@@ -103,10 +114,31 @@ class Settings(BaseSettings):
     TOKEN_URL_SWAGGER: str = f'{API_V1_STR}/auth/swagger_login'
     TOKEN_REDIS_PREFIX: str = 'fba_token'
     TOKEN_REFRESH_REDIS_PREFIX: str = 'fba_refresh_token'
+    TOKEN_LOCAL_EXPIRE_SECONDS: int = 30  # Worker local validated token expiration time, also revocation delay bound
+    TOKEN_LOCAL_MAXSIZE: int = 10000  # Worker local validated token max count
     TOKEN_EXCLUDE: list[str] = [  # JWT / RBAC White list
         f'{API_V1_STR}/auth/login',
     ]
 
+    # User Principal
+    USER_PRINCIPAL_REDIS_PREFIX: str = 'fba_user_principal'
+    USER_PRINCIPAL_REDIS_EXPIRE_SECONDS: int = 60 * 5  # expiration time,unit: second
+    USER_PRINCIPAL_LOCAL_EXPIRE_SECONDS: int = 10  # Worker local cache expiration time,unit: second
+    USER_PRINCIPAL_LOCAL_MAXSIZE: int = 1000  # Worker local cache max users
+
+    # Pagination
+    PAGINATION_COUNT_REDIS_PREFIX: str = 'fba_page_count'
+    PAGINATION_COUNT_EXPIRE_SECONDS: int = 60  # Cached total count expiration time,unit: second
+    # Append-only tables written on every request, their cached counts are not invalidated by writes, only expire
+    PAGINATION_COUNT_EXPIRE_ONLY_TABLES: list[str] = ['sys_opera_log', 'sys_login_log']
+
+    # Serializer
+    SERIALIZE_INLINE_MAXSIZE: int = 1000  # Max rows serialized inline, larger lists are serialized in the executor
+
+    # Tree
+    TREE_REDIS_PREFIX: str = 'fba_tree'
+    TREE_REDIS_EXPIRE_SECONDS: int = 60 * 60 * 24  # expiration time,unit: second
+
     # Captcha
     CAPTCHA_LOGIN_REDIS_PREFIX: str = 'fba_login_captcha'
     CAPTCHA_LOGIN_EXPIRE_SECONDS: int = 60 * 5  # expiration time,unit: second
@@ -125,6 +157,7 @@ class Settings(BaseSettings):
     PERMISSION_REDIS_PREFIX: str = 'fba_permission'
 
     # Casbin Auth
+    CASBIN_POLICY_REDIS_PREFIX: str = 'fba_casbin_policy'
     CASBIN_EXCLUDE: set[tuple[str, str]] = {
         ('POST', f'{API_V1_STR}/auth/swagger_login'),
         ('POST', f'{API_V1_STR}/auth/login'),
@@ -154,10 +187,26 @@ class Settings(BaseSettings):
         'new_password',
         'confirm_password',
     ]
+    OPERA_LOG_MAX_BODY_SIZE: int = 1024 * 64  # Max captured request body,unit: byte
+    OPERA_LOG_QUEUE_MAXSIZE: int = 10000  # Worker write buffer max logs
+    OPERA_LOG_QUEUE_FULL_POLICY: Literal['block', 'drop', 'spill'] = 'spill'  # block: wait; spill: write to file
+    OPERA_LOG_BATCH_SIZE: int = 200  # Max logs of one insert
+    OPERA_LOG_FLUSH_INTERVAL: float = 1.0  # Max wait of one batch,unit: second
+    OPERA_LOG_SPILL_FILENAME: str = 'fba_opera_log_spill.jsonl'
+
+    # Log retention
+    LOG_RETENTION_DAYS: int = 180  # Operation and login logs kept for,unit: day
+    LOG_RETENTION_ARCHIVE: bool = False  # Exchange old partitions into {table}_{partition} tables instead of dropping
+    LOG_PARTITION_PREMAKE_MONTHS: int = 3  # Monthly partitions created ahead
+    LOG_RETENTION_DELETE_BATCH_SIZE: int = 5000  # Max rows of one delete on unpartitioned tables
 
     # Ip location
     IP_LOCATION_REDIS_PREFIX: str = 'fba_ip_location'
     IP_LOCATION_EXPIRE_SECONDS: int = 60 * 60 * 24 * 1  # expiration time,unit: second
+    IP_LOCATION_LOCAL_MAXSIZE: int = 10000  # Worker local cache max ips
+
+    # User agent
+    USER_AGENT_PARSE_MAXSIZE: int = 2048  # Worker local cache max user agents
 
     # Celery
     CELERY_BROKER: Literal['rabbitmq', 'redis'] = 'redis'
@@ -170,6 +219,10 @@ class Settings(BaseSettings):
             'task': 'tasks.task_demo_async',
             'schedule': 5.0,
         },
+        'task_log_retention': {
+            'task': 'tasks.task_log_retention',
+            'schedule': 60 * 60 * 24,
+        },
     }
 
     @model_validator(mode='before')
@@ -9,11 +9,15 @@ from starlette.middleware.authentication import AuthenticationMiddleware
 
 from backend.app.api.routers import v1
 from backend.app.common.exception.exception_handler import register_exception
-from backend.app.common.redis import redis_client
+from backend.app.common.jwt import backfill_token_index
+from backend.app.common.redis import redis_client, redis_subscriber
 from backend.app.core.conf import settings
 from backend.app.database.db_mysql import create_table
+from backend.app.database.pool_health import pool_health_checker
+from backend.app.middleware.db_session_middleware import DBSessionMiddleware
 from backend.app.middleware.jwt_auth_middleware import JwtAuthMiddleware
 from backend.app.middleware.opera_log_middleware import OperaLogMiddleware
+from backend.app.services.opera_log_service import opera_log_buffer
 from backend.app.utils.demo_site import demo_site
 from backend.app.utils.health_check import ensure_unique_route_names, http_limit_callback
 from backend.app.utils.openapi import simplify_operation_ids
@@ -29,13 +33,28 @@ async def register_init(app: FastAPI):
     """
     # Create database table.
     await create_table()
+    # Start database pool health check
+    await pool_health_checker.start()
     # Connection redis
     await redis_client.open()
+    # Index the tokens stored before the token index was introduced
+    for prefix in [settings.TOKEN_REDIS_PREFIX, settings.TOKEN_REFRESH_REDIS_PREFIX]:
+        await backfill_token_index(prefix)
     # Initialize limiter
     await FastAPILimiter.init(redis_client, prefix=settings.LIMITER_REDIS_PREFIX, http_callback=http_limit_callback)
+    # Subscribe cache invalidation of other workers
+    await redis_subscriber.start()
+    # Start operation log writer
+    await opera_log_buffer.start()
 
     yield
 
+    # Flush operation logs
+    await opera_log_buffer.stop()
+    # Stop redis subscription
+    await redis_subscriber.stop()
+    # Stop database pool health check
+    await pool_health_checker.stop()
     # Close redis Connection
     await redis_client.close()
     # Close limiter
@@ -108,6 +127,8 @@ def register_middleware(app: FastAPI):
     app.add_middleware(
         AuthenticationMiddleware, backend=JwtAuthMiddleware(), on_error=JwtAuthMiddleware.auth_exception_handler
     )
+    # Request database session, wraps all middlewares using the database
+    app.add_middleware(DBSessionMiddleware)
     # Access log
     if settings.MIDDLEWARE_ACCESS:
         from backend.app.middleware.access_middleware import AccessMiddleware
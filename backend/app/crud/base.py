@@ -1,21 +1,106 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from typing import Any, Dict, Generic, Type, TypeVar
+from dataclasses import fields, is_dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, Generic, Hashable, Sequence, Type, TypeVar
 
 from pydantic import BaseModel
-from sqlalchemy import and_, delete, select, update
+from sqlalchemy import (
+    Executable,
+    Select,
+    and_,
+    bindparam,
+    case,
+    delete,
+    func,
+    insert,
+    inspect,
+    not_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
+from backend.app.core.conf import settings
 from backend.app.models.base import MappedBase
 
 ModelType = TypeVar('ModelType', bound=MappedBase)
 CreateSchemaType = TypeVar('CreateSchemaType', bound=BaseModel)
 UpdateSchemaType = TypeVar('UpdateSchemaType', bound=BaseModel)
 
+# Rebuild the tree_path of all rows of a hierarchy table from parent_id, also used by the tree_path migration
+TREE_PATH_BACKFILL_SQL = """
+UPDATE {table} AS t JOIN (
+    WITH RECURSIVE tree (id, tree_path) AS (
+        SELECT id, CAST(CONCAT('/', id, '/') AS CHAR(500)) FROM {table} WHERE parent_id IS NULL
+        UNION ALL
+        SELECT c.id, CONCAT(tree.tree_path, c.id, '/') FROM {table} AS c JOIN tree ON c.parent_id = tree.id
+    )
+    SELECT id, tree_path FROM tree
+) AS p ON t.id = p.id
+SET t.tree_path = p.tree_path
+"""
+
+
+@lru_cache
+def _get_bulk_plan(model: Type[MappedBase]) -> tuple[tuple[str, ...], frozenset[str] | None]:
+    """
+    Get the column keys of the model, and the init fields of the dataclass models
+
+    :param model:
+    :return:
+    """
+    column_keys = tuple(column.key for column in inspect(model).columns)
+    init_keys = frozenset(field.name for field in fields(model) if field.init) if is_dataclass(model) else None
+    return column_keys, init_keys
+
+
+_stmt_cache_metrics = {'templates': 0, 'hits': 0, 'misses': 0}
+
+
+def get_stmt_cache_stats() -> dict:
+    """
+    Statement template cache metrics of the current worker
+
+    :return:
+    """
+    metrics = _stmt_cache_metrics
+    lookups = metrics['hits'] + metrics['misses']
+    return {**metrics, 'hit_rate': round(metrics['hits'] / lookups, 4) if lookups else 0.0}
+
+
+def _chunks(rows: list, batch_size: int | None) -> list[list]:
+    batch_size = batch_size or settings.DB_BULK_BATCH_SIZE
+    return [rows[i : i + batch_size] for i in range(0, len(rows), batch_size)]
+
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         self.model = model
+        self._stmt_cache: dict[Hashable, Executable] = {}
+
+    def _cached_stmt(self, key: Hashable, build: Callable[[], Executable]) -> Executable:
+        """
+        Get the statement template of the filter shape, built once
+
+        The filter values are bound parameters passed on execution, so the calls of one shape execute the same
+        statement object, whose cache key is memoized and which always hits the compiled cache of the engine
+
+        :param key: Statement name and filter shape
+        :param build: Build the template with bindparam() for the filter values
+        :return:
+        """
+        stmt = self._stmt_cache.get(key)
+        if stmt is None:
+            stmt = self._stmt_cache[key] = build()
+            _stmt_cache_metrics['templates'] += 1
+            _stmt_cache_metrics['misses'] += 1
+        else:
+            _stmt_cache_metrics['hits'] += 1
+        return stmt
 
     async def get_(
         self,
@@ -38,17 +123,44 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         """
         assert pk is not None or name is not None, 'Query error, pk and name Parameters cannot be empty at the same time.'
         assert pk is None or name is None, 'Query error, pk and name parameters cannot exist simultaneously'
-        where_list = [self.model.id == pk] if pk is not None else [self.model.name == name]
         if status is not None:
             assert status in (0, 1), 'Query error, status parameter 0 or 1'
-            where_list.append(self.model.status == status)
         if del_flag is not None:
             assert del_flag in (0, 1), 'Query error, del_flag parameter 0 or 1'
-            where_list.append(self.model.del_flag == del_flag)
 
-        result = await db.execute(select(self.model).where(and_(*where_list)))
+        def build() -> Select:
+            if pk is not None:
+                where_list = [self.model.id == bindparam('pk')]
+            else:
+                where_list = [self.model.name == bindparam('name')]
+            if status is not None:
+                where_list.append(self.model.status == bindparam('status'))
+            if del_flag is not None:
+                where_list.append(self.model.del_flag == bindparam('del_flag'))
+            return select(self.model).where(and_(*where_list))
+
+        params = {'pk': pk, 'name': name, 'status': status, 'del_flag': del_flag}
+        stmt = self._cached_stmt(('get_', pk is not None, status is not None, del_flag is not None), build)
+        result = await db.execute(stmt, {key: value for key, value in params.items() if value is not None})
         return result.scalars().first()
 
+    async def get_ids_(self, db: AsyncSession, pks: Sequence[int], *, del_flag: int | None = None) -> set[int]:
+        """
+        Get the existing ids of the primary key ids in one query
+
+        :param db:
+        :param pks:
+        :param del_flag:
+        :return:
+        """
+        if not pks:
+            return set()
+        where_list = [self.model.id.in_(set(pks))]
+        if del_flag is not None:
+            where_list.append(self.model.del_flag == del_flag)
+        result = await db.execute(select(self.model.id).where(*where_list))
+        return set(result.scalars().all())
+
     async def create_(self, db: AsyncSession, obj_in: CreateSchemaType, user_id: int | None = None) -> None:
         """
         Add a piece of data.
@@ -64,6 +176,145 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             create_data = self.model(**obj_in.model_dump())
         db.add(create_data)
 
+    def _bulk_rows(
+        self, objs_in: Sequence[CreateSchemaType | Dict[str, Any]], user_id: int | None = None
+    ) -> list[Dict[str, Any]]:
+        """
+        Build the insert rows, with the defaults of the model applied, all rows have the same keys
+
+        :param objs_in:
+        :param user_id:
+        :return:
+        """
+        column_keys, init_keys = _get_bulk_plan(self.model)
+        rows = []
+        for obj_in in objs_in:
+            data = obj_in if isinstance(obj_in, dict) else obj_in.model_dump()
+            data = {key: value for key, value in data.items() if key in column_keys}
+            if user_id:
+                data['create_user'] = user_id
+            if init_keys is None:
+                rows.append(data)
+                continue
+            instance = self.model(**{key: value for key, value in data.items() if key in init_keys})
+            row = {key: getattr(instance, key) for key in column_keys}
+            # e.g. id of upsert, which is not an init field
+            row.update({key: value for key, value in data.items() if key not in init_keys})
+            rows.append(row)
+        if init_keys is None and rows:
+            columns = inspect(self.model).columns
+            defaults = {}
+            for key in {key for row in rows for key in row}:
+                default = columns[key].default
+                defaults[key] = default.arg if default is not None and default.is_scalar else None
+            rows = [{**defaults, **row} for row in rows]
+        return rows
+
+    async def bulk_create_(
+        self,
+        db: AsyncSession,
+        objs_in: Sequence[CreateSchemaType | Dict[str, Any]],
+        user_id: int | None = None,
+        *,
+        batch_size: int | None = None,
+    ) -> int:
+        """
+        Add multiple rows, one multi-row INSERT per batch
+
+        :param db:
+        :param objs_in: Pydantic Model classes or Corresponding database field dictionaries
+        :param user_id:
+        :param batch_size: Max rows of one statement, default DB_BULK_BATCH_SIZE
+        :return: Inserted count
+        """
+        count = 0
+        for chunk in _chunks(self._bulk_rows(objs_in, user_id), batch_size):
+            result = await db.execute(insert(self.model).values(chunk))
+            count += result.rowcount
+        return count
+
+    async def bulk_update_(
+        self,
+        db: AsyncSession,
+        objs_in: Sequence[Dict[str, Any]],
+        user_id: int | None = None,
+        *,
+        batch_size: int | None = None,
+    ) -> int:
+        """
+        Through the primary key id update multiple rows, one UPDATE ... CASE id per batch
+
+        :param db:
+        :param objs_in: Database field dictionaries, with the id, each row can update different fields
+        :param user_id:
+        :param batch_size: Max rows of one statement, default DB_BULK_BATCH_SIZE
+        :return: Matched count
+        """
+        count = 0
+        for chunk in _chunks(list(objs_in), batch_size):
+            values = {}
+            for obj_in in chunk:
+                for key, value in obj_in.items():
+                    if key != 'id':
+                        values.setdefault(key, {})[obj_in['id']] = value
+            if user_id:
+                values['update_user'] = {obj_in['id']: user_id for obj_in in chunk}
+            if not values:
+                continue
+            result = await db.execute(
+                update(self.model)
+                .where(self.model.id.in_([obj_in['id'] for obj_in in chunk]))
+                .values(
+                    {
+                        key: case(whens, value=self.model.id, else_=getattr(self.model, key))
+                        for key, whens in values.items()
+                    }
+                )
+                .execution_options(synchronize_session=False)
+            )
+            count += result.rowcount
+        return count
+
+    async def bulk_upsert_(
+        self,
+        db: AsyncSession,
+        objs_in: Sequence[CreateSchemaType | Dict[str, Any]],
+        user_id: int | None = None,
+        *,
+        update_columns: Sequence[str] | None = None,
+        batch_size: int | None = None,
+    ) -> int:
+        """
+        Add or update multiple rows, one INSERT ... ON DUPLICATE KEY UPDATE per batch,
+        rows conflicting with the primary key or any unique key are updated
+
+        :param db:
+        :param objs_in: Pydantic Model classes or Corresponding database field dictionaries
+        :param user_id: create_user of the inserted rows and update_user of the updated rows
+        :param update_columns: Columns updated on conflict, default all given columns except the keys and creation
+        :param batch_size: Max rows of one statement, default DB_BULK_BATCH_SIZE
+        :return: Affected count reported by MySQL, 1 per inserted row and 2 per updated row
+        """
+        rows = self._bulk_rows(objs_in, user_id)
+        if not rows:
+            return 0
+        columns = inspect(self.model).columns
+        # ON DUPLICATE KEY UPDATE skips the onupdate of the columns, e.g. updated_time
+        onupdate = {column.key: column.onupdate.arg for column in columns if column.onupdate is not None}
+        if update_columns is None:
+            skip_columns = {'created_time', 'create_user', *onupdate}
+            update_columns = [key for key in rows[0] if not columns[key].primary_key and key not in skip_columns]
+        extra_values = {key: arg(None) if callable(arg) else arg for key, arg in onupdate.items()}
+        if user_id and 'update_user' in columns:
+            extra_values['update_user'] = user_id
+        count = 0
+        for chunk in _chunks(rows, batch_size):
+            stmt = mysql_insert(self.model).values(chunk)
+            stmt = stmt.on_duplicate_key_update({**{key: stmt.inserted[key] for key in update_columns}, **extra_values})
+            result = await db.execute(stmt)
+            count += result.rowcount
+        return count
+
     async def update_(
         self, db: AsyncSession, pk: int, obj_in: UpdateSchemaType | Dict[str, Any], user_id: int | None = None
     ) -> int:
@@ -85,6 +336,50 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         result = await db.execute(update(self.model).where(self.model.id == pk).values(**update_data))
         return result.rowcount
 
+    async def bulk_delete_(
+        self, db: AsyncSession, pks: Sequence[int], *, del_flag: int | None = None, batch_size: int | None = None
+    ) -> int:
+        """
+        Through the primary key ids Delete, one statement per batch
+
+        :param db:
+        :param pks:
+        :param del_flag:
+        :param batch_size: Max ids of one statement, default DB_BULK_BATCH_SIZE
+        :return:
+        """
+        count = 0
+        for chunk in _chunks(list(pks), batch_size):
+            if del_flag is None:
+                result = await db.execute(delete(self.model).where(self.model.id.in_(chunk)))
+            else:
+                assert del_flag == 1, 'Delete, del_flag parameter 1'
+                result = await db.execute(update(self.model).where(self.model.id.in_(chunk)).values(del_flag=del_flag))
+            count += result.rowcount
+        return count
+
+    async def toggle_(self, db: AsyncSession, pk: int, column: str) -> bool | None:
+        """
+        Through the primary key id flip a boolean column in one statement, free of read-modify-write races
+
+        Databases without UPDATE ... RETURNING (MySQL) read the new value back in the same transaction,
+        where the row is still locked by the update
+
+        :param db:
+        :param pk:
+        :param column: Boolean or 0/1 column name
+        :return: The new value, None if the row does not exist
+        """
+        col = getattr(self.model, column)
+        stmt = update(self.model).where(self.model.id == pk).values({col: not_(col)})
+        if db.bind.dialect.update_returning:
+            result = await db.execute(stmt.returning(col))
+            return result.scalar_one_or_none()
+        result = await db.execute(stmt)
+        if not result.rowcount:
+            return None
+        return await db.scalar(select(col).where(self.model.id == pk))
+
     async def delete_(self, db: AsyncSession, pk: int, *, del_flag: int | None = None) -> int:
         """
         Through the primary key id Delete
@@ -100,3 +395,115 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             assert del_flag == 1, 'Delete, del_flag parameter 1'
             result = await db.execute(update(self.model).where(self.model.id == pk).values(del_flag=del_flag))
         return result.rowcount
+
+
+class CRUDTreeBase(CRUDBase[ModelType, CreateSchemaType, UpdateSchemaType]):
+    """
+    CRUD of the hierarchy models, which maintain the materialized tree_path column, e.g. /1/5/12/
+
+    The descendants of a node are the rows whose tree_path starts with the tree_path of the node,
+    which is a range scan of the tree_path index
+    """
+
+    async def create_node_(self, db: AsyncSession, obj_in: CreateSchemaType, user_id: int | None = None) -> None:
+        """
+        Add a node, and set its tree_path
+
+        :param db:
+        :param obj_in: Pydantic Model class
+        :param user_id:
+        :return:
+        """
+        if user_id:
+            create_data = self.model(**obj_in.model_dump(), create_user=user_id)
+        else:
+            create_data = self.model(**obj_in.model_dump())
+        db.add(create_data)
+        await db.flush()
+        parent_path = await self._get_tree_path(db, create_data.parent_id) if create_data.parent_id else None
+        create_data.tree_path = f'{parent_path or "/"}{create_data.id}/'
+
+    async def move_node_(self, db: AsyncSession, pk: int, parent_id: int | None) -> int:
+        """
+        Update the tree_path of the node and its descendants after the parent is changed
+
+        :param db:
+        :param pk:
+        :param parent_id: New parent id
+        :return: Updated count
+        """
+        old_path = await self._get_tree_path(db, pk)
+        parent_path = await self._get_tree_path(db, parent_id) if parent_id else None
+        new_path = f'{parent_path or "/"}{pk}/'
+        if old_path == new_path:
+            return 0
+        if old_path is None:
+            # Not backfilled yet
+            result = await db.execute(update(self.model).where(self.model.id == pk).values(tree_path=new_path))
+            return result.rowcount
+        result = await db.execute(
+            update(self.model)
+            .where(self.model.tree_path.startswith(old_path))
+            .values(tree_path=func.concat(new_path, func.substring(self.model.tree_path, len(old_path) + 1)))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+
+    async def _get_tree_path(self, db: AsyncSession, pk: int) -> str | None:
+        return await db.scalar(select(self.model.tree_path).where(self.model.id == pk))
+
+    def descendant_ids_select(self, pk: int, *, include_self: bool = True) -> Select:
+        """
+        Select of the ids of the node subtree, can be used as subquery
+
+        :param pk:
+        :param include_self:
+        :return:
+        """
+        node = aliased(self.model)
+        se = select(self.model.id).join(node, self.model.tree_path.startswith(node.tree_path)).where(node.id == pk)
+        if not include_self:
+            se = se.where(self.model.id != pk)
+        return se
+
+    async def get_descendants_(self, db: AsyncSession, pk: int, *, include_self: bool = False) -> Sequence[ModelType]:
+        """
+        Get all descendants of the node
+
+        :param db:
+        :param pk:
+        :param include_self:
+        :return:
+        """
+        node = aliased(self.model)
+        se = select(self.model).join(node, self.model.tree_path.startswith(node.tree_path)).where(node.id == pk)
+        if not include_self:
+            se = se.where(self.model.id != pk)
+        result = await db.execute(se.order_by(self.model.tree_path))
+        return result.scalars().all()
+
+    async def get_ancestors_(self, db: AsyncSession, pk: int, *, include_self: bool = False) -> Sequence[ModelType]:
+        """
+        Get all ancestors of the node, from the root
+
+        :param db:
+        :param pk:
+        :param include_self:
+        :return:
+        """
+        node = aliased(self.model)
+        se = select(self.model).join(node, node.tree_path.startswith(self.model.tree_path)).where(node.id == pk)
+        if not include_self:
+            se = se.where(self.model.id != pk)
+        result = await db.execute(se.order_by(func.length(self.model.tree_path)))
+        return result.scalars().all()
+
+    async def rebuild_tree_path_(self, db: AsyncSession) -> int:
+        """
+        Rebuild the tree_path of all nodes from parent_id, used to backfill
+
+        :param db:
+        :return: Updated count
+        """
+        result = await db.execute(text(TREE_PATH_BACKFILL_SQL.format(table=self.model.__tablename__)))
+        return result.rowcount
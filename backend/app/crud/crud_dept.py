@@ -6,12 +6,12 @@ from sqlalchemy import and_, asc, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from backend.app.crud.base import CRUDBase
+from backend.app.crud.base import CRUDTreeBase
 from backend.app.models import Dept, User
 from backend.app.schemas.dept import CreateDeptParam, UpdateDeptParam
 
 
-class CRUDDept(CRUDBase[Dept, CreateDeptParam, UpdateDeptParam]):
+class CRUDDept(CRUDTreeBase[Dept, CreateDeptParam, UpdateDeptParam]):
     async def get(self, db: AsyncSession, dept_id: int) -> Dept | None:
         return await self.get_(db, pk=dept_id, del_flag=0)
 
@@ -45,10 +45,13 @@ class CRUDDept(CRUDBase[Dept, CreateDeptParam, UpdateDeptParam]):
         return dept.scalars().all()
 
     async def create(self, db: AsyncSession, obj_in: CreateDeptParam) -> None:
-        await self.create_(db, obj_in)
+        await self.create_node_(db, obj_in)
 
     async def update(self, db: AsyncSession, dept_id: int, obj_in: UpdateDeptParam) -> int:
-        return await self.update_(db, dept_id, obj_in)
+        count = await self.update_(db, dept_id, obj_in)
+        if 'parent_id' in obj_in.model_fields_set:
+            await self.move_node_(db, dept_id, obj_in.parent_id)
+        return count
 
     async def delete(self, db: AsyncSession, dept_id: int) -> int:
         return await self.delete_(db, dept_id, del_flag=1)
@@ -1,12 +1,14 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from sqlalchemy import Select, and_, delete, desc, select
+from typing import Sequence
+
+from sqlalchemy import Select, and_, desc, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from backend.app.crud.base import CRUDBase
 from backend.app.models.sys_dict_data import DictData
-from backend.app.schemas.dict_data import CreateDictDataParam, UpdateDictDataParam
+from backend.app.schemas.dict_data import BulkUpdateDictDataParam, CreateDictDataParam, UpdateDictDataParam
 
 
 class CRUDDictData(CRUDBase[DictData, CreateDictDataParam, UpdateDictDataParam]):
@@ -30,15 +32,31 @@ class CRUDDictData(CRUDBase[DictData, CreateDictDataParam, UpdateDictDataParam])
         api = await db.execute(select(self.model).where(self.model.label == label))
         return api.scalars().first()
 
+    async def get_by_labels(self, db: AsyncSession, labels: list[str]) -> Sequence[DictData]:
+        dict_datas = await db.execute(select(self.model).where(self.model.label.in_(labels)))
+        return dict_datas.scalars().all()
+
+    async def get_by_values(self, db: AsyncSession, values: list[str]) -> Sequence[DictData]:
+        dict_datas = await db.execute(select(self.model).where(self.model.value.in_(values)))
+        return dict_datas.scalars().all()
+
     async def create(self, db: AsyncSession, obj_in: CreateDictDataParam) -> None:
         await self.create_(db, obj_in)
 
+    async def bulk_create(self, db: AsyncSession, obj_in: list[CreateDictDataParam]) -> int:
+        return await self.bulk_create_(db, obj_in)
+
+    async def bulk_update(self, db: AsyncSession, obj_in: list[BulkUpdateDictDataParam]) -> int:
+        return await self.bulk_update_(db, [obj.model_dump() for obj in obj_in])
+
+    async def bulk_upsert(self, db: AsyncSession, obj_in: list[CreateDictDataParam]) -> int:
+        return await self.bulk_upsert_(db, obj_in)
+
     async def update(self, db: AsyncSession, pk: int, obj_in: UpdateDictDataParam) -> int:
         return await self.update_(db, pk, obj_in)
 
     async def delete(self, db: AsyncSession, pk: list[int]) -> int:
-        apis = await db.execute(delete(self.model).where(self.model.id.in_(pk)))
-        return apis.rowcount
+        return await self.bulk_delete_(db, pk)
 
     async def get_with_relation(self, db: AsyncSession, pk: int) -> DictData | None:
         where = [self.model.id == pk]
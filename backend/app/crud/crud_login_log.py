@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from sqlalchemy import Select, and_, delete, desc, select
+from datetime import datetime
+
+from sqlalchemy import Select, and_, desc, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.app.crud.base import CRUDBase
@@ -9,7 +11,14 @@ from backend.app.schemas.login_log import CreateLoginLogParam, UpdateLoginLogPar
 
 
 class CRUDLoginLog(CRUDBase[LoginLog, CreateLoginLogParam, UpdateLoginLogParam]):
-    async def get_all(self, username: str | None = None, status: int | None = None, ip: str | None = None) -> Select:
+    async def get_all(
+        self,
+        username: str | None = None,
+        status: int | None = None,
+        ip: str | None = None,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> Select:
         se = select(self.model).order_by(desc(self.model.created_time))
         where_list = []
         if username:
@@ -18,6 +27,11 @@ class CRUDLoginLog(CRUDBase[LoginLog, CreateLoginLogParam, UpdateLoginLogParam])
             where_list.append(self.model.status == status)
         if ip:
             where_list.append(self.model.ip.like(f'%{ip}%'))
+        # The range on the partitioning column prunes the partitions
+        if start_time:
+            where_list.append(self.model.created_time >= start_time)
+        if end_time:
+            where_list.append(self.model.created_time < end_time)
         if where_list:
             se = se.where(and_(*where_list))
         return se
@@ -27,12 +41,7 @@ class CRUDLoginLog(CRUDBase[LoginLog, CreateLoginLogParam, UpdateLoginLogParam])
         await db.commit()
 
     async def delete(self, db: AsyncSession, pk: list[int]) -> int:
-        logs = await db.execute(delete(self.model).where(self.model.id.in_(pk)))
-        return logs.rowcount
-
-    async def delete_all(self, db: AsyncSession) -> int:
-        logs = await db.execute(delete(self.model))
-        return logs.rowcount
+        return await self.bulk_delete_(db, pk)
 
 
 login_log_dao: CRUDLoginLog = CRUDLoginLog(LoginLog)
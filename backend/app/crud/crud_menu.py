@@ -2,15 +2,15 @@
 # -*- coding: utf-8 -*-
 from typing import Sequence
 
-from sqlalchemy import and_, asc, select
+from sqlalchemy import Select, and_, asc, bindparam, select
 from sqlalchemy.orm import selectinload
 
-from backend.app.crud.base import CRUDBase
+from backend.app.crud.base import CRUDTreeBase
 from backend.app.models import Menu
 from backend.app.schemas.menu import CreateMenuParam, UpdateMenuParam
 
 
-class CRUDMenu(CRUDBase[Menu, CreateMenuParam, UpdateMenuParam]):
+class CRUDMenu(CRUDTreeBase[Menu, CreateMenuParam, UpdateMenuParam]):
     async def get(self, db, menu_id: int) -> Menu | None:
         return await self.get_(db, pk=menu_id)
 
@@ -31,19 +31,24 @@ class CRUDMenu(CRUDBase[Menu, CreateMenuParam, UpdateMenuParam]):
         return menu.scalars().all()
 
     async def get_role_menus(self, db, superuser: bool, menu_ids: list[int]) -> Sequence[Menu]:
-        se = select(self.model).order_by(asc(self.model.sort))
-        where_list = [self.model.menu_type.in_([0, 1])]
-        if not superuser:
-            where_list.append(self.model.id.in_(menu_ids))
-        se = se.where(and_(*where_list))
-        menu = await db.execute(se)
+        def build() -> Select:
+            se = select(self.model).order_by(asc(self.model.sort))
+            where_list = [self.model.menu_type.in_([0, 1])]
+            if not superuser:
+                where_list.append(self.model.id.in_(bindparam('menu_ids', expanding=True)))
+            return se.where(and_(*where_list))
+
+        stmt = self._cached_stmt(('get_role_menus', superuser), build)
+        menu = await db.execute(stmt, {} if superuser else {'menu_ids': menu_ids})
         return menu.scalars().all()
 
     async def create(self, db, obj_in: CreateMenuParam) -> None:
-        await self.create_(db, obj_in)
+        await self.create_node_(db, obj_in)
 
     async def update(self, db, menu_id: int, obj_in: UpdateMenuParam) -> int:
         count = await self.update_(db, menu_id, obj_in)
+        if 'parent_id' in obj_in.model_fields_set:
+            await self.move_node_(db, menu_id, obj_in.parent_id)
         return count
 
     async def delete(self, db, menu_id: int) -> int:
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from sqlalchemy import Select, and_, delete, desc, select
+from datetime import datetime
+
+from sqlalchemy import Select, and_, desc, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.app.crud.base import CRUDBase
@@ -9,7 +11,14 @@ from backend.app.schemas.opera_log import CreateOperaLogParam, UpdateOperaLogPar
 
 
 class CRUDOperaLogDao(CRUDBase[OperaLog, CreateOperaLogParam, UpdateOperaLogParam]):
-    async def get_all(self, username: str | None = None, status: int | None = None, ip: str | None = None) -> Select:
+    async def get_all(
+        self,
+        username: str | None = None,
+        status: int | None = None,
+        ip: str | None = None,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> Select:
         se = select(self.model).order_by(desc(self.model.created_time))
         where_list = []
         if username:
@@ -18,6 +27,11 @@ class CRUDOperaLogDao(CRUDBase[OperaLog, CreateOperaLogParam, UpdateOperaLogPara
             where_list.append(self.model.status == status)
         if ip:
             where_list.append(self.model.ip.like(f'%{ip}%'))
+        # The range on the partitioning column prunes the partitions
+        if start_time:
+            where_list.append(self.model.created_time >= start_time)
+        if end_time:
+            where_list.append(self.model.created_time < end_time)
         if where_list:
             se = se.where(and_(*where_list))
         return se
@@ -25,13 +39,12 @@ class CRUDOperaLogDao(CRUDBase[OperaLog, CreateOperaLogParam, UpdateOperaLogPara
     async def create(self, db: AsyncSession, obj_in: CreateOperaLogParam) -> None:
         await self.create_(db, obj_in)
 
-    async def delete(self, db: AsyncSession, pk: list[int]) -> int:
-        logs = await db.execute(delete(self.model).where(self.model.id.in_(pk)))
-        return logs.rowcount
+    async def bulk_create(self, db: AsyncSession, obj_in: list[CreateOperaLogParam]) -> None:
+        # Buffered and spilled logs are written later, the creation time is the time of the request
+        await db.execute(insert(self.model), [{**obj.model_dump(), 'created_time': obj.opera_time} for obj in obj_in])
 
-    async def delete_all(self, db: AsyncSession) -> int:
-        logs = await db.execute(delete(self.model))
-        return logs.rowcount
+    async def delete(self, db: AsyncSession, pk: list[int]) -> int:
+        return await self.bulk_delete_(db, pk)
 
 
 opera_log_dao: CRUDOperaLogDao = CRUDOperaLogDao(OperaLog)
@@ -3,6 +3,7 @@
 from typing import Sequence
 
 from sqlalchemy import Select, delete, desc, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from backend.app.crud.base import CRUDBase
@@ -28,6 +29,23 @@ class CRUDRole(CRUDBase[Role, CreateRoleParam, UpdateRoleParam]):
         roles = await db.execute(select(self.model).join(self.model.users).where(User.id == user_id))
         return roles.scalars().all()
 
+    async def resolve_ids(self, db: AsyncSession, role_ids: list[int]) -> tuple[list[int], list[int]]:
+        """
+        Resolve the role ids in one query
+
+        :param db:
+        :param role_ids:
+        :return: The found and missing ids, deduplicated in the given order
+        """
+        role_ids = list(dict.fromkeys(role_ids))
+        if not role_ids:
+            return [], []
+        result = await db.execute(select(self.model.id).where(self.model.id.in_(role_ids)))
+        exist_ids = set(result.scalars().all())
+        found = [role_id for role_id in role_ids if role_id in exist_ids]
+        missing = [role_id for role_id in role_ids if role_id not in exist_ids]
+        return found, missing
+
     async def get_list(self, name: str = None, data_scope: int = None, status: int = None) -> Select:
         se = select(self.model).options(selectinload(self.model.menus)).order_by(desc(self.model.created_time))
         where_list = []
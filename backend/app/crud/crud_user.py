@@ -1,17 +1,23 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
+
 from datetime import datetime
+from typing import Sequence
 
+from asgiref.sync import sync_to_async
 from fast_captcha import text_captcha
-from sqlalchemy import and_, desc, select, update
+from sqlalchemy import Row, and_, bindparam, delete, desc, insert, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from sqlalchemy.sql import Select
 
 from backend.app.common import jwt
 from backend.app.crud.base import CRUDBase
+from backend.app.crud.crud_dept import dept_dao
 from backend.app.models import Role, User
-from backend.app.schemas.user import AddUserParam, AvatarParam, RegisterUserParam, UpdateUserParam, UpdateUserRoleParam
+from backend.app.models.sys_user_role import sys_user_role
+from backend.app.schemas.user import AddUserParam, AvatarParam, RegisterUserParam, UpdateUserParam
 
 
 class CRUDUser(CRUDBase[User, RegisterUserParam, UpdateUserParam]):
@@ -19,7 +25,10 @@ class CRUDUser(CRUDBase[User, RegisterUserParam, UpdateUserParam]):
         return await self.get_(db, pk=user_id)
 
     async def get_by_username(self, db: AsyncSession, username: str) -> User | None:
-        user = await db.execute(select(self.model).where(self.model.username == username))
+        stmt = self._cached_stmt(
+            'get_by_username', lambda: select(self.model).where(self.model.username == bindparam('username'))
+        )
+        user = await db.execute(stmt, {'username': username})
         return user.scalars().first()
 
     async def get_by_nickname(self, db: AsyncSession, nickname: str) -> User | None:
@@ -41,32 +50,103 @@ class CRUDUser(CRUDBase[User, RegisterUserParam, UpdateUserParam]):
         new_user = self.model(**dict_obj)
         db.add(new_user)
 
-    async def add(self, db: AsyncSession, obj: AddUserParam) -> None:
+    async def add(self, db: AsyncSession, obj: AddUserParam, role_ids: list[int]) -> None:
         salt = text_captcha(5)
         obj.password = await jwt.get_hash_password(obj.password + salt)
         dict_obj = obj.model_dump(exclude={'roles'})
         dict_obj.update({'salt': salt})
         new_user = self.model(**dict_obj)
-        role_list = []
-        for role_id in obj.roles:
-            role_list.append(await db.get(Role, role_id))
-        new_user.roles.extend(role_list)
         db.add(new_user)
+        await db.flush()
+        await self.add_roles(db, new_user.id, role_ids)
+
+    async def bulk_add(self, db: AsyncSession, objs: list[AddUserParam]) -> int:
+        """
+        Add multiple users with one multi-row INSERT, and their roles with another
+
+        :param db:
+        :param objs: Users with validated roles
+        :return:
+        """
+        salts = [text_captcha(5) for _ in objs]
+        # get_hash_password runs in the single thread sensitive thread, one hash at a time, bcrypt releases the GIL
+        # so the hashes in the default executor run in parallel
+        hash_password = sync_to_async(jwt.pwd_context.hash, thread_sensitive=False)
+        passwords = await asyncio.gather(*[hash_password(obj.password + salt) for obj, salt in zip(objs, salts)])
+        count = await self.bulk_create_(
+            db,
+            [
+                {**obj.model_dump(exclude={'roles'}), 'password': password, 'salt': salt}
+                for obj, password, salt in zip(objs, passwords, salts)
+            ],
+        )
+        users = await db.execute(
+            select(self.model.username, self.model.id).where(self.model.username.in_([obj.username for obj in objs]))
+        )
+        user_ids = dict(users.tuples().all())
+        role_rows = [
+            {'user_id': user_ids[obj.username], 'role_id': role_id}
+            for obj in objs
+            for role_id in dict.fromkeys(obj.roles)
+        ]
+        if role_rows:
+            await db.execute(insert(sys_user_role).values(role_rows))
+        return count
+
+    async def get_by_unique_keys(
+        self, db: AsyncSession, *, usernames: list[str], nicknames: list[str], emails: list[str]
+    ) -> Sequence[Row[tuple[str, str, str]]]:
+        """
+        Get the existing usernames, nicknames and emails in one query
+
+        :param db:
+        :param usernames:
+        :param nicknames:
+        :param emails:
+        :return:
+        """
+        users = await db.execute(
+            select(self.model.username, self.model.nickname, self.model.email).where(
+                or_(
+                    self.model.username.in_(usernames),
+                    self.model.nickname.in_(nicknames),
+                    self.model.email.in_(emails),
+                )
+            )
+        )
+        return users.all()
 
     async def update_userinfo(self, db: AsyncSession, input_user: User, obj: UpdateUserParam) -> int:
         user = await db.execute(update(self.model).where(self.model.id == input_user.id).values(**obj.model_dump()))
         return user.rowcount
 
     @staticmethod
-    async def update_role(db: AsyncSession, input_user: User, obj: UpdateUserRoleParam) -> None:
-        # Remove all user roles
-        for i in list(input_user.roles):
-            input_user.roles.remove(i)
-        # Add user role
-        role_list = []
-        for role_id in obj.roles:
-            role_list.append(await db.get(Role, role_id))
-        input_user.roles.extend(role_list)
+    async def add_roles(db: AsyncSession, user_id: int, role_ids: list[int]) -> None:
+        if role_ids:
+            await db.execute(
+                insert(sys_user_role).values([{'user_id': user_id, 'role_id': role_id} for role_id in role_ids])
+            )
+
+    async def update_role(self, db: AsyncSession, input_user: User, role_ids: list[int]) -> None:
+        """
+        Apply the difference between the current and the given roles to the association table
+
+        :param db:
+        :param input_user: User with the roles loaded
+        :param role_ids: Existing role ids
+        :return:
+        """
+        current_ids = {role.id for role in input_user.roles}
+        remove_ids = current_ids - set(role_ids)
+        if remove_ids:
+            await db.execute(
+                delete(sys_user_role).where(
+                    sys_user_role.c.user_id == input_user.id, sys_user_role.c.role_id.in_(remove_ids)
+                )
+            )
+        await self.add_roles(db, input_user.id, [role_id for role_id in role_ids if role_id not in current_ids])
+        # The association table is written directly
+        db.expire(input_user, ['roles'])
 
     async def update_avatar(self, db: AsyncSession, current_user: User, avatar: AvatarParam) -> int:
         user = await db.execute(update(self.model).where(self.model.id == current_user.id).values(avatar=avatar.url))
@@ -85,7 +165,9 @@ class CRUDUser(CRUDBase[User, RegisterUserParam, UpdateUserParam]):
         )
         return user.rowcount
 
-    async def get_all(self, dept: int = None, username: str = None, phone: str = None, status: int = None) -> Select:
+    async def get_all(
+        self, dept: int = None, username: str = None, phone: str = None, status: int = None, dept_subtree: bool = False
+    ) -> Select:
         se = (
             select(self.model)
             .options(selectinload(self.model.dept))
@@ -94,7 +176,13 @@ class CRUDUser(CRUDBase[User, RegisterUserParam, UpdateUserParam]):
         )
         where_list = []
         if dept:
-            where_list.append(self.model.dept_id == dept)
+            if dept_subtree:
+                # The dept itself also matches by id, in case its tree_path has not been backfilled
+                where_list.append(
+                    or_(self.model.dept_id == dept, self.model.dept_id.in_(dept_dao.descendant_ids_select(dept)))
+                )
+            else:
+                where_list.append(self.model.dept_id == dept)
         if username:
             where_list.append(self.model.username.like(f'%{username}%'))
         if phone:
@@ -105,62 +193,35 @@ class CRUDUser(CRUDBase[User, RegisterUserParam, UpdateUserParam]):
             se = se.where(and_(*where_list))
         return se
 
-    async def get_super(self, db: AsyncSession, user_id: int) -> bool:
-        user = await self.get(db, user_id)
-        return user.is_superuser
-
-    async def get_staff(self, db: AsyncSession, user_id: int) -> bool:
-        user = await self.get(db, user_id)
-        return user.is_staff
-
-    async def get_status(self, db: AsyncSession, user_id: int) -> bool:
-        user = await self.get(db, user_id)
-        return user.status
+    async def set_super(self, db: AsyncSession, user_id: int) -> bool | None:
+        return await self.toggle_(db, user_id, 'is_superuser')
 
-    async def get_multi_login(self, db: AsyncSession, user_id: int) -> bool:
-        user = await self.get(db, user_id)
-        return user.is_multi_login
-
-    async def set_super(self, db: AsyncSession, user_id: int) -> int:
-        super_status = await self.get_super(db, user_id)
-        user = await db.execute(
-            update(self.model).where(self.model.id == user_id).values(is_superuser=False if super_status else True)
-        )
-        return user.rowcount
-
-    async def set_staff(self, db: AsyncSession, user_id: int) -> int:
-        staff_status = await self.get_staff(db, user_id)
-        user = await db.execute(
-            update(self.model).where(self.model.id == user_id).values(is_staff=False if staff_status else True)
-        )
-        return user.rowcount
+    async def set_staff(self, db: AsyncSession, user_id: int) -> bool | None:
+        return await self.toggle_(db, user_id, 'is_staff')
 
-    async def set_status(self, db: AsyncSession, user_id: int) -> int:
-        status = await self.get_status(db, user_id)
-        user = await db.execute(
-            update(self.model).where(self.model.id == user_id).values(status=False if status else True)
-        )
-        return user.rowcount
+    async def set_status(self, db: AsyncSession, user_id: int) -> bool | None:
+        return await self.toggle_(db, user_id, 'status')
 
-    async def set_multi_login(self, db: AsyncSession, user_id: int) -> int:
-        multi_login = await self.get_multi_login(db, user_id)
-        user = await db.execute(
-            update(self.model).where(self.model.id == user_id).values(is_multi_login=False if multi_login else True)
-        )
-        return user.rowcount
+    async def set_multi_login(self, db: AsyncSession, user_id: int) -> bool | None:
+        return await self.toggle_(db, user_id, 'is_multi_login')
 
     async def get_with_relation(self, db: AsyncSession, *, user_id: int = None, username: str = None) -> User | None:
-        where = []
-        if user_id:
-            where.append(self.model.id == user_id)
-        if username:
-            where.append(self.model.username == username)
-        user = await db.execute(
-            select(self.model)
-            .options(selectinload(self.model.dept))
-            .options(selectinload(self.model.roles).joinedload(Role.menus))
-            .where(*where)
-        )
+        def build() -> Select:
+            where = []
+            if user_id:
+                where.append(self.model.id == bindparam('user_id'))
+            if username:
+                where.append(self.model.username == bindparam('username'))
+            return (
+                select(self.model)
+                .options(selectinload(self.model.dept))
+                .options(selectinload(self.model.roles).joinedload(Role.menus))
+                .where(*where)
+            )
+
+        stmt = self._cached_stmt(('get_with_relation', bool(user_id), bool(username)), build)
+        params = {'user_id': user_id, 'username': username}
+        user = await db.execute(stmt, {key: value for key, value in params.items() if value})
         return user.scalars().first()
 
 
@@ -1,42 +1,304 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import sys
+import time
 
-from typing import Annotated
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Annotated, Any, AsyncIterator
 from uuid import uuid4
 
 from fastapi import Depends
-from sqlalchemy import URL
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import URL, Select, event
+from sqlalchemy.engine.interfaces import CacheStats, ExceptionContext
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
 
 from backend.app.common.log import log
 from backend.app.core.conf import settings
 from backend.app.models.base import MappedBase
 
 
+def create_engine(url: str | URL) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        echo=settings.DB_ECHO,
+        future=True,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_POOL_MAX_OVERFLOW,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        connect_args={'connect_timeout': settings.DB_CONNECT_TIMEOUT},
+        query_cache_size=settings.DB_COMPILED_CACHE_SIZE,
+    )
+
+
+class ReplicaRouter:
+    """
+    Read replica selection, least checked out connections first,
+    replicas failing to connect or disconnecting are ejected for DB_REPLICA_EJECT_SECONDS
+    """
+
+    def __init__(self, urls: list[str | URL]):
+        self.engines = [create_engine(url) for url in urls]
+        self._ejected: dict[AsyncEngine, float] = {}
+        for engine in self.engines:
+            event.listen(engine.sync_engine, 'handle_error', self._on_error(engine))
+
+    def _on_error(self, engine: AsyncEngine):
+        def handle_error(context: ExceptionContext) -> None:
+            # No connection: the connect failed
+            if context.is_disconnect or context.connection is None:
+                self._ejected[engine] = time.monotonic() + settings.DB_REPLICA_EJECT_SECONDS
+                log.warning('Read replica {} ejected: {}', engine.url.host, context.original_exception)
+
+        return handle_error
+
+    def choose(self) -> AsyncEngine | None:
+        """
+        Choose a healthy replica, None if there is not any
+
+        :return:
+        """
+        now = time.monotonic()
+        healthy = [engine for engine in self.engines if self._ejected.get(engine, 0) <= now]
+        if not healthy:
+            return None
+        return min(healthy, key=lambda engine: engine.pool.checkedout())
+
+
+class RoutingSession(Session):
+    """
+    Route the reads of the plain sessions to a read replica
+
+    The writes, the flushes, the locking reads and everything after the first write of the session go to the primary,
+    as well as all statements of the sessions from async_db_session.begin() and async_db_session.primary()
+    """
+
+    def get_bind(self, mapper: Any = None, *, clause: Any = None, **kw: Any) -> Any:
+        if replica_router.engines and not self.info.get('use_primary'):
+            if clause is None and not self._flushing:
+                # Not a statement, e.g. get_bind() for the dialect
+                return super().get_bind(mapper, clause=clause, **kw)
+            if isinstance(clause, Select) and clause._for_update_arg is None and not self._flushing:
+                # Keep one replica per session, for consistent reads
+                replica = self.info.get('replica')
+                if replica is None:
+                    replica = replica_router.choose()
+                    self.info['replica'] = replica
+                if replica is not None:
+                    return replica.sync_engine
+            else:
+                # Read your writes, text() statements may be writes too
+                self.info['use_primary'] = True
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+class RoutingSessionMaker(async_sessionmaker[AsyncSession]):
+    def begin(self):
+        """Transaction on the primary, which commits"""
+        return self.primary()._maker_context_manager()
+
+    def primary(self) -> AsyncSession:
+        """Session on the primary, for the reads which must see the latest writes, e.g. cache fills"""
+        return self(info={'use_primary': True})
+
+
 def create_engine_and_session(url: str | URL):
     try:
         # Database engine
-        engine = create_async_engine(url, echo=settings.DB_ECHO, future=True, pool_pre_ping=True)
+        engine = create_engine(url)
         # log.success('Database connection successful')
     except Exception as e:
         log.error('❌ Database connection failed {}', e)
         sys.exit()
     else:
-        db_session = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+        db_session = RoutingSessionMaker(
+            bind=engine, autoflush=False, expire_on_commit=False, sync_session_class=RoutingSession
+        )
         return engine, db_session
 
 
-SQLALCHEMY_DATABASE_URL = (
-    f'mysql+asyncmy://{settings.DB_USER}:{settings.DB_PASSWORD}@{settings.DB_HOST}:'
-    f'{settings.DB_PORT}/{settings.DB_DATABASE}?charset={settings.DB_CHARSET}'
-)
+def _database_url(host: str, port: int) -> str:
+    return (
+        f'mysql+asyncmy://{settings.DB_USER}:{settings.DB_PASSWORD}@{host}:'
+        f'{port}/{settings.DB_DATABASE}?charset={settings.DB_CHARSET}'
+    )
+
+
+def _replica_url(host: str) -> str:
+    host, _, port = host.partition(':')
+    return _database_url(host, int(port or settings.DB_PORT))
+
+
+SQLALCHEMY_DATABASE_URL = _database_url(settings.DB_HOST, settings.DB_PORT)
+
+replica_router = ReplicaRouter([_replica_url(host) for host in settings.DB_REPLICA_HOSTS])
 
 async_engine, async_db_session = create_engine_and_session(SQLALCHEMY_DATABASE_URL)
 
 
-async def get_db() -> AsyncSession:
-    """session Generator"""
+class RequestSessionScope:
+    """
+    One database session shared by the middlewares, dependencies and services of a request, created on first use
+
+    The session must not be used concurrently, e.g. by asyncio.gather of queries
+    """
+
+    def __init__(self):
+        self.session: AsyncSession | None = None
+        self.transaction_depth = 0
+        self.checkouts = 0
+
+    def get_session(self) -> AsyncSession:
+        if self.session is None:
+            self.session = async_db_session()
+            _request_session_metrics['sessions'] += 1
+        return self.session
+
+    async def close(self) -> None:
+        _request_session_metrics['requests'] += 1
+        _request_session_metrics['checkouts'] += self.checkouts
+        _request_session_metrics['checkouts_max'] = max(_request_session_metrics['checkouts_max'], self.checkouts)
+        if self.session is not None:
+            await self.session.close()
+
+
+_request_scope: ContextVar[RequestSessionScope | None] = ContextVar('request_session_scope', default=None)
+
+_request_session_metrics = {'requests': 0, 'sessions': 0, 'checkouts': 0, 'checkouts_max': 0}
+
+
+def _count_checkout(*args) -> None:
+    scope = _request_scope.get()
+    if scope is not None:
+        scope.checkouts += 1
+
+
+_compiled_cache_metrics = {'hit': 0, 'miss': 0, 'disabled': 0, 'no_key': 0}
+
+_CACHE_HIT_NAMES = {
+    CacheStats.CACHE_HIT: 'hit',
+    CacheStats.CACHE_MISS: 'miss',
+    CacheStats.CACHING_DISABLED: 'disabled',
+    CacheStats.NO_CACHE_KEY: 'no_key',
+    CacheStats.NO_DIALECT_SUPPORT: 'no_key',
+}
+
+
+def _count_compiled_cache(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        _compiled_cache_metrics[_CACHE_HIT_NAMES.get(context.cache_hit, 'no_key')] += 1
+
+
+for _engine in [async_engine, *replica_router.engines]:
+    event.listen(_engine.sync_engine, 'checkout', _count_checkout)
+    event.listen(_engine.sync_engine, 'after_cursor_execute', _count_compiled_cache)
+
+
+def get_compiled_cache_stats() -> dict:
+    """
+    Compiled statement cache metrics of the current worker, a hot path should never miss once warmed up
+
+    :return:
+    """
+    metrics = _compiled_cache_metrics
+    lookups = metrics['hit'] + metrics['miss']
+    compiled_cache = async_engine.sync_engine._compiled_cache
+    return {
+        **metrics,
+        'hit_rate': round(metrics['hit'] / lookups, 4) if lookups else 0.0,
+        'size': len(compiled_cache) if compiled_cache is not None else 0,
+        'capacity': compiled_cache.capacity if compiled_cache is not None else 0,
+    }
+
+
+@asynccontextmanager
+async def request_session_scope() -> AsyncIterator[RequestSessionScope]:
+    """Request scope of the shared session, the session is closed at the end"""
+    scope = RequestSessionScope()
+    token = _request_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _request_scope.reset(token)
+        await scope.close()
+
+
+@asynccontextmanager
+async def request_db_session(*, primary: bool = False) -> AsyncIterator[AsyncSession]:
+    """
+    Session for reads, the shared session of the request, or a new session outside of a request
+
+    :param primary: Read from the primary, e.g. cache fills, the rest of the request stays on the primary
+    :return:
+    """
+    scope = _request_scope.get()
+    if scope is None:
+        async with async_db_session.primary() if primary else async_db_session() as db:
+            yield db
+        return
+    db = scope.get_session()
+    if primary:
+        db.info['use_primary'] = True
+    yield db
+
+
+@asynccontextmanager
+async def request_db_transaction() -> AsyncIterator[AsyncSession]:
+    """
+    Transaction on the primary, which commits, on the shared session of the request or a new session outside of a
+    request. Nested transactions join the outermost one
+
+    :return:
+    """
+    scope = _request_scope.get()
+    if scope is None:
+        async with async_db_session.begin() as db:
+            yield db
+        return
+    db = scope.get_session()
+    if scope.transaction_depth:
+        scope.transaction_depth += 1
+        try:
+            yield db
+        finally:
+            scope.transaction_depth -= 1
+        return
+    if db.in_transaction():
+        # End the implicit transaction of the previous reads
+        await db.commit()
+    db.info['use_primary'] = True
+    scope.transaction_depth = 1
+    try:
+        async with db.begin():
+            yield db
+    finally:
+        scope.transaction_depth = 0
+        # The later reads load fresh rows instead of the identity map, the detached rows keep their loaded state
+        db.expunge_all()
+
+
+def get_request_session_stats() -> dict:
+    """
+    Request session metrics of the current worker
+
+    :return:
+    """
+    metrics = _request_session_metrics
+    return {
+        **metrics,
+        'checkouts_avg': round(metrics['checkouts'] / metrics['requests'], 3) if metrics['requests'] else 0.0,
+    }
+
+
+async def get_db() -> AsyncIterator[AsyncSession]:
+    """session Generator, the shared session inside a request"""
+    scope = _request_scope.get()
+    if scope is not None:
+        yield scope.get_session()
+        return
     session = async_db_session()
     try:
         yield session
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine.interfaces import ExceptionContext
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from backend.app.common.log import log
+from backend.app.core.conf import settings
+from backend.app.database.db_mysql import async_engine, replica_router
+
+
+class _EngineStats:
+    def __init__(self):
+        self.connects = 0
+        self.closes = 0
+        self.invalidations = 0
+        self.disconnects = 0
+        self.checked = 0
+        self.check_failures = 0
+        self.last_check_time: float | None = None
+        self.last_check_ms = 0.0
+
+
+class PoolHealthChecker:
+    """
+    Background health check of the connection pools, instead of pinging on every checkout (pool_pre_ping)
+
+    Every DB_POOL_HEALTH_INTERVAL the idle connections are checked out one by one and pinged, the pool is FIFO, so each
+    idle connection is visited once. The checkout also recycles the connections older than DB_POOL_RECYCLE, so the
+    reconnects happen here instead of on the request path. A disconnect error invalidates the pool and the broken
+    connections are replaced on their next checkout
+    """
+
+    def __init__(self):
+        self._engines: dict[str, AsyncEngine] = {}
+        self._stats: dict[str, _EngineStats] = {}
+        self._task: asyncio.Task | None = None
+
+    def register(self, name: str, engine: AsyncEngine) -> None:
+        """
+        Register the engine to check, and collect its pool events
+
+        :param name:
+        :param engine:
+        :return:
+        """
+        stats = self._stats[name] = _EngineStats()
+        self._engines[name] = engine
+
+        def on_connect(*args) -> None:
+            stats.connects += 1
+
+        def on_close(*args) -> None:
+            stats.closes += 1
+
+        def on_invalidate(*args) -> None:
+            stats.invalidations += 1
+
+        def on_error(context: ExceptionContext) -> None:
+            if context.is_disconnect:
+                stats.disconnects += 1
+
+        event.listen(engine.sync_engine, 'connect', on_connect)
+        event.listen(engine.sync_engine, 'close', on_close)
+        event.listen(engine.sync_engine, 'invalidate', on_invalidate)
+        event.listen(engine.sync_engine, 'handle_error', on_error)
+
+    async def _check(self, name: str, engine: AsyncEngine) -> None:
+        stats = self._stats[name]
+        start_time = time.perf_counter()
+        for _ in range(engine.pool.checkedin()):
+            try:
+                async with engine.connect() as conn:
+                    await conn.exec_driver_sql('SELECT 1')
+            except Exception as e:
+                stats.check_failures += 1
+                log.warning('Database pool {} health check failed: {}', name, e)
+                # The pool has been invalidated by the disconnect
+                break
+            stats.checked += 1
+        stats.last_check_time = time.time()
+        stats.last_check_ms = round((time.perf_counter() - start_time) * 1000, 3)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(settings.DB_POOL_HEALTH_INTERVAL)
+            for name, engine in self._engines.items():
+                await self._check(name, engine)
+
+    async def start(self) -> None:
+        """
+        Start the health check of the current worker
+
+        :return:
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the health check of the current worker
+
+        :return:
+        """
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    def stats(self) -> dict:
+        """
+        Pool metrics of the current worker
+
+        :return:
+        """
+        data = {}
+        for name, engine in self._engines.items():
+            pool = engine.pool
+            stats = self._stats[name]
+            data[name] = {
+                'size': pool.size(),
+                'checked_in': pool.checkedin(),
+                'checked_out': pool.checkedout(),
+                'overflow': pool.overflow(),
+                'connects': stats.connects,
+                'closes': stats.closes,
+                'invalidations': stats.invalidations,
+                'disconnects': stats.disconnects,
+                'checked': stats.checked,
+                'check_failures': stats.check_failures,
+                'last_check_time': stats.last_check_time,
+                'last_check_ms': stats.last_check_ms,
+            }
+        return data
+
+
+pool_health_checker = PoolHealthChecker()
+
+pool_health_checker.register('primary', async_engine)
+for replica in replica_router.engines:
+    pool_health_checker.register(f'replica:{replica.url.host}:{replica.url.port}', replica)
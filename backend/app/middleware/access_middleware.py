@@ -1,18 +1,33 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from backend.app.common.log import log
 from backend.app.utils.timezone import timezone
 
 
-class AccessMiddleware(BaseHTTPMiddleware):
+class AccessMiddleware:
     """record"""
 
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = None
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
         start_time = timezone.now()
-        response = await call_next(request)
+        await self.app(scope, receive, send_wrapper)
         end_time = timezone.now()
-        log.info(f'{response.status_code} {request.client.host} {request.method} {request.url} {end_time - start_time}')
-        return response
+        request = Request(scope)
+        log.info(f'{status_code} {request.client.host} {request.method} {request.url} {end_time - start_time}')
@@ -0,0 +1,20 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from backend.app.database.db_mysql import request_session_scope
+
+
+class DBSessionMiddleware:
+    """Request scoped database session, shared by the middlewares, dependencies and services"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async with request_session_scope():
+            await self.app(scope, receive, send)
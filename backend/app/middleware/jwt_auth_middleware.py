@@ -10,7 +10,6 @@ from backend.app.common import jwt
 from backend.app.common.exception.errors import TokenError
 from backend.app.common.log import log
 from backend.app.core.conf import settings
-from backend.app.database.db_mysql import async_db_session
 from backend.app.utils.serializers import MsgSpecJSONResponse
 
 
@@ -45,8 +44,7 @@ class JwtAuthMiddleware(AuthenticationBackend):
 
         try:
             sub = await jwt.jwt_authentication(token)
-            async with async_db_session() as db:
-                user = await jwt.get_current_user(db, data=sub)
+            user = await jwt.get_current_user(data=sub)
         except TokenError as exc:
             raise _AuthenticationError(code=exc.code, msg=exc.detail, headers=exc.headers)
         except Exception as e:
@@ -1,32 +1,41 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import json
+
 from asgiref.sync import sync_to_async
-from fastapi import Response
-from starlette.background import BackgroundTask
 from starlette.datastructures import UploadFile
-from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from backend.app.common.enums import OperaLogCipherType
 from backend.app.common.log import log
 from backend.app.core.conf import settings
 from backend.app.schemas.opera_log import CreateOperaLogParam
-from backend.app.services.opera_log_service import OperaLogService
+from backend.app.services.opera_log_service import opera_log_buffer
 from backend.app.utils.encrypt import AESCipher, ItsDCipher, Md5Cipher
 from backend.app.utils.request_parse import parse_ip_info, parse_user_agent_info
 from backend.app.utils.timezone import timezone
 
 
-class OperaLogMiddleware(BaseHTTPMiddleware):
+class OperaLogMiddleware:
     """operation log middleware"""
 
-    async def dispatch(self, request: Request, call_next) -> Response:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
         # Exclude record whitelist
-        path = request.url.path
+        path = scope['path']
         if path in settings.OPERA_LOG_EXCLUDE or not path.startswith(f'{settings.API_V1_STR}'):
-            return await call_next(request)
+            await self.app(scope, receive, send)
+            return
 
         # Request parsing
+        request = Request(scope)
         user_agent, device, os, browser = await parse_user_agent_info(request)
         ip, country, region, city = await parse_ip_info(request)
         try:
@@ -35,10 +44,6 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
         except AttributeError:
             username = None
         method = request.method
-        router = request.scope.get('route')
-        summary = getattr(router, 'summary', None) or ''
-        args = await self.get_request_args(request)
-        args = await self.desensitization(args)
 
         # Setting additional request information
         request.state.ip = ip
@@ -50,12 +55,34 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
         request.state.browser = browser
         request.state.device = device
 
+        # Tee the request body read by the app, up to the max captured size
+        body = bytearray()
+        body_truncated = False
+
+        async def receive_wrapper() -> Message:
+            nonlocal body_truncated
+            message = await receive()
+            if message['type'] == 'http.request' and not body_truncated:
+                chunk = message.get('body', b'')
+                if len(body) + len(chunk) > settings.OPERA_LOG_MAX_BODY_SIZE:
+                    body_truncated = True
+                    body.clear()
+                else:
+                    body.extend(chunk)
+            return message
+
         # execute
         start_time = timezone.now()
-        code, msg, status, err, response = await self.execute_request(request, call_next)
+        code, msg, status, err = await self.execute_request(request, receive_wrapper, send)
         end_time = timezone.now()
         cost_time = (end_time - start_time).total_seconds() * 1000.0
 
+        # The route is resolved by the app
+        router = scope.get('route')
+        summary = getattr(router, 'summary', None) or ''
+        args = await self.get_request_args(request, None if body_truncated else bytes(body))
+        args = await self.desensitization(args)
+
         # log creation
         opera_log_in = CreateOperaLogParam(
             username=username,
@@ -77,21 +104,17 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
             cost_time=cost_time,
             opera_time=start_time,
         )
-        back = BackgroundTask(OperaLogService.create, obj_in=opera_log_in)
-        await back()
+        await opera_log_buffer.put(opera_log_in)
 
         # Error thrown
         if err:
             raise err from None
 
-        return response
-
-    async def execute_request(self, request: Request, call_next) -> tuple:
+    async def execute_request(self, request: Request, receive: Receive, send: Send) -> tuple:
         """execute"""
         err = None
-        response = None
         try:
-            response = await call_next(request)
+            await self.app(request.scope, receive, send)
             code, msg, status = await self.request_exception_handler(request)
         except Exception as e:
             log.exception(e)
@@ -101,7 +124,7 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
             status = 0
             err = e
 
-        return str(code), msg, status, err, response
+        return str(code), msg, status, err
 
     @staticmethod
     @sync_to_async
@@ -129,25 +152,34 @@ class OperaLogMiddleware(BaseHTTPMiddleware):
         return code, msg, status
 
     @staticmethod
-    async def get_request_args(request: Request) -> dict:
-        """Get request parameters"""
+    async def get_request_args(request: Request, body: bytes | None) -> dict:
+        """
+        Get request parameters
+
+        :param request:
+        :param body: Request body read by the app, None if it exceeds the max captured size
+        :return:
+        """
         args = dict(request.query_params)
         args.update(request.path_params)
-        # Tip: .body() must at .form() before getting
-        # https://github.com/encode/starlette/discussions/1933
-        body_data = await request.body()
-        form_data = await request.form()
-        if len(form_data) > 0:
-            args.update({k: v.filename if isinstance(v, UploadFile) else v for k, v in form_data.items()})
-        else:
-            if body_data:
-                json_data = await request.json()
+        if body is None:
+            args['body_truncated'] = True
+        elif body:
+            content_type = request.headers.get('Content-Type', '')
+            if content_type.startswith(('multipart/form-data', 'application/x-www-form-urlencoded')):
+
+                async def receive() -> Message:
+                    return {'type': 'http.request', 'body': body, 'more_body': False}
+
+                async with Request(request.scope, receive).form() as form_data:
+                    args.update({k: v.filename if isinstance(v, UploadFile) else v for k, v in form_data.items()})
+            else:
+                try:
+                    json_data = json.loads(body)
+                except ValueError:
+                    return args
                 if not isinstance(json_data, dict):
-                    json_data = {
-                        f'{type(json_data)}_to_dict_data': json_data.decode('utf-8')
-                        if isinstance(json_data, bytes)
-                        else json_data
-                    }
+                    json_data = {f'{type(json_data)}_to_dict_data': json_data}
                 args.update(json_data)
         return args
 
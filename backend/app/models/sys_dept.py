@@ -26,6 +26,9 @@ class Dept(Base):
     parent_id: Mapped[int | None] = mapped_column(
         ForeignKey('sys_dept.id', ondelete='SET NULL'), default=None, index=True, comment='father departmentID'
     )
+    tree_path: Mapped[str | None] = mapped_column(
+        String(500), init=False, default=None, index=True, comment='Hierarchy path of the ids, e.g. /1/5/12/'
+    )
     parent: Mapped[Union['Dept', None]] = relationship(init=False, back_populates='children', remote_side=[id])
     children: Mapped[list['Dept'] | None] = relationship(init=False, back_populates='parent')
     # Department users one-to-many.
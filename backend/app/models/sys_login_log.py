@@ -14,6 +14,8 @@ class LoginLog(DataClassBase):
     """Login log table"""
 
     __tablename__ = 'sys_login_log'
+    # Monthly partitions of created_time, which must be part of the primary key, see log_retention_service.py
+    __table_args__ = {'mysql_partition_by': 'RANGE COLUMNS(created_time) (PARTITION pmax VALUES LESS THAN (MAXVALUE))'}
 
     id: Mapped[id_key] = mapped_column(init=False)
     user_uuid: Mapped[str] = mapped_column(String(50), comment='userUUID')
@@ -29,4 +31,6 @@ class LoginLog(DataClassBase):
     device: Mapped[str | None] = mapped_column(String(50), comment='Equipment')
     msg: Mapped[str] = mapped_column(LONGTEXT, comment='Prompt message')
     login_time: Mapped[datetime] = mapped_column(comment='logintime')
-    created_time: Mapped[datetime] = mapped_column(init=False, default_factory=timezone.now, comment='Creation time')
+    created_time: Mapped[datetime] = mapped_column(
+        init=False, default_factory=timezone.now, primary_key=True, index=True, comment='Creation time'
+    )
@@ -33,6 +33,9 @@ class Menu(Base):
     parent_id: Mapped[int | None] = mapped_column(
         ForeignKey('sys_menu.id', ondelete='SET NULL'), default=None, index=True, comment='FatherMenuID'
     )
+    tree_path: Mapped[str | None] = mapped_column(
+        String(500), init=False, default=None, index=True, comment='Hierarchy path of the ids, e.g. /1/5/12/'
+    )
     parent: Mapped[Union['Menu', None]] = relationship(init=False, back_populates='children', remote_side=[id])
     children: Mapped[list['Menu'] | None] = relationship(init=False, back_populates='parent')
     # MenuMany-to-many
@@ -14,6 +14,8 @@ class OperaLog(DataClassBase):
     """Operation log table"""
 
     __tablename__ = 'sys_opera_log'
+    # Monthly partitions of created_time, which must be part of the primary key, see log_retention_service.py
+    __table_args__ = {'mysql_partition_by': 'RANGE COLUMNS(created_time) (PARTITION pmax VALUES LESS THAN (MAXVALUE))'}
 
     id: Mapped[id_key] = mapped_column(init=False)
     username: Mapped[str | None] = mapped_column(String(20), comment='Username')
@@ -34,4 +36,6 @@ class OperaLog(DataClassBase):
     msg: Mapped[str | None] = mapped_column(LONGTEXT, comment='Prompt message')
     cost_time: Mapped[float] = mapped_column(insert_default=0.0, comment='Request Durationms')
     opera_time: Mapped[datetime] = mapped_column(comment='operation time')
-    created_time: Mapped[datetime] = mapped_column(init=False, default_factory=timezone.now, comment='Creation time')
+    created_time: Mapped[datetime] = mapped_column(
+        init=False, default_factory=timezone.now, primary_key=True, index=True, comment='Creation time'
+    )
@@ -30,7 +30,9 @@ class User(Base):
     is_multi_login: Mapped[bool] = mapped_column(default=False, comment='isNo.Repeated login.(0No. 1is)')
     avatar: Mapped[str | None] = mapped_column(String(255), default=None, comment='Profile picture')
     phone: Mapped[str | None] = mapped_column(String(11), default=None, comment='Mobile number')
-    join_time: Mapped[datetime] = mapped_column(init=False, default_factory=timezone.now, comment='Registration time')
+    join_time: Mapped[datetime] = mapped_column(
+        init=False, default_factory=timezone.now, index=True, comment='Registration time'
+    )
     last_login_time: Mapped[datetime | None] = mapped_column(init=False, onupdate=timezone.now, comment='Last login.')
     # Department users one-to-many.
     dept_id: Mapped[int | None] = mapped_column(
@@ -26,6 +26,10 @@ class UpdateDictDataParam(DictDataSchemaBase):
     pass
 
 
+class BulkUpdateDictDataParam(DictDataSchemaBase):
+    id: int
+
+
 class GetDictDataListDetails(DictDataSchemaBase):
     model_config = ConfigDict(from_attributes=True)
 
@@ -29,3 +29,9 @@ class GetNewToken(AccessTokenBase):
     refresh_token: str
     refresh_token_type: str = 'Bearer'
     refresh_token_expire_time: datetime
+
+
+class GetLoginSession(SchemaBase):
+    session_id: str
+    expire_time: datetime
+    current: bool
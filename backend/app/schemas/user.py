@@ -83,11 +83,11 @@ class GetCurrentUserInfoDetail(GetUserInfoListDetails):
     def handel(self, values):
         """Department and role"""
         dept = self.dept
-        if dept:
+        if dept and not isinstance(dept, str):
             self.dept = dept.name  # type: ignore
         roles = self.roles
         if roles:
-            self.roles = [role.name for role in roles]  # type: ignore
+            self.roles = [role if isinstance(role, str) else role.name for role in roles]  # type: ignore
         return values
 
 
@@ -6,7 +6,7 @@ from sqlalchemy import Select
 
 from backend.app.common.exception import errors
 from backend.app.crud.crud_api import api_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_session, request_db_transaction
 from backend.app.models import Api
 from backend.app.schemas.api import CreateApiParam, UpdateApiParam
 
@@ -14,7 +14,7 @@ from backend.app.schemas.api import CreateApiParam, UpdateApiParam
 class ApiService:
     @staticmethod
     async def get(*, pk: int) -> Api:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             api = await api_dao.get(db, pk)
             if not api:
                 raise errors.NotFoundError(msg='Interface does not exist')
@@ -26,13 +26,13 @@ class ApiService:
 
     @staticmethod
     async def get_api_list() -> Sequence[Api]:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             apis = await api_dao.get_all(db)
             return apis
 
     @staticmethod
     async def create(*, obj: CreateApiParam) -> None:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             api = await api_dao.get_by_name(db, obj.name)
             if api:
                 raise errors.ForbiddenError(msg='Interface already exists')
@@ -40,13 +40,13 @@ class ApiService:
 
     @staticmethod
     async def update(*, pk: int, obj: UpdateApiParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             count = await api_dao.update(db, pk, obj)
             return count
 
     @staticmethod
     async def delete(*, pk: list[int]) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             count = await api_dao.delete(db, pk)
             return count
 
@@ -1,5 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import hashlib
+
 from datetime import datetime
 
 from fastapi import Request
@@ -10,12 +12,14 @@ from backend.app.common import jwt
 from backend.app.common.enums import LoginLogStatusType
 from backend.app.common.exception import errors
 from backend.app.common.jwt import get_token
+from backend.app.common.principal import user_principal_cache
 from backend.app.common.redis import redis_client
 from backend.app.common.response.response_code import CustomErrorCode
 from backend.app.core.conf import settings
 from backend.app.crud.crud_user import user_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_session
 from backend.app.models import User
+from backend.app.schemas.token import GetLoginSession
 from backend.app.schemas.user import AuthLoginParam
 from backend.app.services.login_log_service import LoginLogService
 from backend.app.utils.timezone import timezone
@@ -25,7 +29,7 @@ class AuthService:
     login_time = timezone.now()
 
     async def swagger_login(self, *, form_data: OAuth2PasswordRequestForm) -> tuple[str, User]:
-        async with async_db_session() as db:
+        async with request_db_session(primary=True) as db:
             current_user = await user_dao.get_by_username(db, form_data.username)
             if not current_user:
                 raise errors.NotFoundError(msg='User does not exist.')
@@ -35,6 +39,9 @@ class AuthService:
                 raise errors.AuthorizationError(msg='User has locked., Login failed')
             # Update login time.
             await user_dao.update_login_time(db, form_data.username, self.login_time)
+            # Commit before invalidating, otherwise the principal may be refilled from the previous login time
+            await db.commit()
+            await user_principal_cache.invalidate(current_user.id)
             # Get the latest user information.
             user = await user_dao.get(db, current_user.id)
             # Createtoken
@@ -44,7 +51,7 @@ class AuthService:
     async def login(
         self, *, request: Request, obj: AuthLoginParam, background_tasks: BackgroundTasks
     ) -> tuple[str, str, datetime, datetime, User]:
-        async with async_db_session() as db:
+        async with request_db_session(primary=True) as db:
             try:
                 current_user = await user_dao.get_by_username(db, obj.username)
                 if not current_user:
@@ -59,6 +66,8 @@ class AuthService:
                 if captcha_code.lower() != obj.captcha.lower():
                     raise errors.CustomError(error=CustomErrorCode.CAPTCHA_ERROR)
                 await user_dao.update_login_time(db, obj.username, self.login_time)
+                await db.commit()
+                await user_principal_cache.invalidate(current_user.id)
                 user = await user_dao.get(db, current_user.id)
                 access_token, access_token_expire_time = await jwt.create_access_token(
                     str(user.id), multi_login=user.is_multi_login
@@ -99,7 +108,7 @@ class AuthService:
         user_id = await jwt.jwt_decode(refresh_token)
         if request.user.id != user_id:
             raise errors.TokenError(msg='Refresh token Invalid')
-        async with async_db_session() as db:
+        async with request_db_session(primary=True) as db:
             current_user = await user_dao.get(db, user_id)
             if not current_user:
                 raise errors.NotFoundError(msg='User does not exist.')
@@ -116,15 +125,29 @@ class AuthService:
             )
             return new_access_token, new_refresh_token, new_access_token_expire_time, new_refresh_token_expire_time
 
+    @staticmethod
+    async def get_sessions(*, request: Request) -> list[GetLoginSession]:
+        current_token = await get_token(request)
+        tokens = await jwt.get_user_tokens(settings.TOKEN_REDIS_PREFIX, request.user.id)
+        return [
+            GetLoginSession(
+                # The token itself is not exposed
+                session_id=hashlib.sha256(token.encode()).hexdigest()[:16],
+                expire_time=datetime.fromtimestamp(expire_time, timezone.tz_info),
+                current=token == current_token,
+            )
+            for token, expire_time in tokens
+        ]
+
     @staticmethod
     async def logout(*, request: Request) -> None:
         token = await get_token(request)
         if request.user.is_multi_login:
-            key = f'{settings.TOKEN_REDIS_PREFIX}:{request.user.id}:{token}'
-            await redis_client.delete(key)
+            await jwt.delete_token(settings.TOKEN_REDIS_PREFIX, request.user.id, token)
+            await jwt.token_verify_cache.revoke(request.user.id, token)
         else:
-            prefix = f'{settings.TOKEN_REDIS_PREFIX}:{request.user.id}:'
-            await redis_client.delete_prefix(prefix)
+            await jwt.revoke_user_tokens(settings.TOKEN_REDIS_PREFIX, request.user.id)
+            await jwt.token_verify_cache.revoke(request.user.id)
 
 
 auth_service: AuthService = AuthService()
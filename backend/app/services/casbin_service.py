@@ -7,7 +7,7 @@ from sqlalchemy import Select
 from backend.app.common.exception import errors
 from backend.app.common.rbac import rbac
 from backend.app.crud.crud_casbin import casbin_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_transaction
 from backend.app.schemas.casbin_rule import (
     CreatePolicyParam,
     CreateUserRoleParam,
@@ -44,6 +44,7 @@ class CasbinService:
         data = await enforcer.add_policy(p.sub, p.path, p.method)
         if not data:
             raise errors.ForbiddenError(msg='Authorization already exists')
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
@@ -52,6 +53,7 @@ class CasbinService:
         data = await enforcer.add_policies([list(p.model_dump().values()) for p in ps])
         if not data:
             raise errors.ForbiddenError(msg='Authorization already exists')
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
@@ -61,6 +63,7 @@ class CasbinService:
         if not _p:
             raise errors.NotFoundError(msg='Permission does not exist.')
         data = await enforcer.update_policy([old.sub, old.path, old.method], [new.sub, new.path, new.method])
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
@@ -69,6 +72,7 @@ class CasbinService:
         data = await enforcer.update_policies(
             [list(o.model_dump().values()) for o in old], [list(n.model_dump().values()) for n in new]
         )
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
@@ -78,6 +82,7 @@ class CasbinService:
         if not _p:
             raise errors.NotFoundError(msg='Permission does not exist.')
         data = await enforcer.remove_policy(p.sub, p.path, p.method)
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
@@ -86,12 +91,15 @@ class CasbinService:
         data = await enforcer.remove_policies([list(p.model_dump().values()) for p in ps])
         if not data:
             raise errors.NotFoundError(msg='Permission does not exist.')
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
     async def delete_all_policies(*, sub: DeleteAllPoliciesParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             count = await casbin_dao.delete_policies_by_sub(db, sub)
+        await rbac.remove_subject_policies(*[v for v in (sub.uuid, sub.role) if v])
+        await rbac.notify_policy_changed()
         return count
 
     @staticmethod
@@ -106,6 +114,7 @@ class CasbinService:
         data = await enforcer.add_grouping_policy(g.uuid, g.role)
         if not data:
             raise errors.ForbiddenError(msg='Authorization already exists')
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
@@ -114,6 +123,7 @@ class CasbinService:
         data = await enforcer.add_grouping_policies([list(g.model_dump().values()) for g in gs])
         if not data:
             raise errors.ForbiddenError(msg='Authorization already exists')
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
@@ -123,6 +133,7 @@ class CasbinService:
         if not _g:
             raise errors.NotFoundError(msg='Permission does not exist.')
         data = await enforcer.remove_grouping_policy(g.uuid, g.role)
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
@@ -131,12 +142,15 @@ class CasbinService:
         data = await enforcer.remove_grouping_policies([list(g.model_dump().values()) for g in gs])
         if not data:
             raise errors.NotFoundError(msg='Permission does not exist.')
+        await rbac.notify_policy_changed()
         return data
 
     @staticmethod
     async def delete_all_groups(*, uuid: UUID) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             count = await casbin_dao.delete_groups_by_uuid(db, uuid)
+        await rbac.remove_subject_policies(str(uuid))
+        await rbac.notify_policy_changed()
         return count
 
 
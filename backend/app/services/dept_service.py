@@ -3,8 +3,10 @@
 from typing import Any
 
 from backend.app.common.exception import errors
+from backend.app.common.principal import user_principal_cache
+from backend.app.common.tree_cache import dept_tree_cache
 from backend.app.crud.crud_dept import dept_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_session, request_db_transaction
 from backend.app.models import Dept
 from backend.app.schemas.dept import CreateDeptParam, UpdateDeptParam
 from backend.app.utils.build_tree import get_tree_data
@@ -13,24 +15,34 @@ from backend.app.utils.build_tree import get_tree_data
 class DeptService:
     @staticmethod
     async def get(*, pk: int) -> Dept:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             dept = await dept_dao.get(db, pk)
             if not dept:
                 raise errors.NotFoundError(msg='Department does not exist')
             return dept
 
+    @staticmethod
+    async def _load_dept_tree() -> list[dict[str, Any]]:
+        # Cache fill, must see the latest writes
+        async with request_db_session(primary=True) as db:
+            dept_select = await dept_dao.get_all(db=db)
+            tree_data = await get_tree_data(dept_select)
+            return tree_data
+
     @staticmethod
     async def get_dept_tree(
         *, name: str | None = None, leader: str | None = None, phone: str | None = None, status: int | None = None
     ) -> list[dict[str, Any]]:
-        async with async_db_session() as db:
+        if name is None and leader is None and phone is None and status is None:
+            return await dept_tree_cache.get(DeptService._load_dept_tree)
+        async with request_db_session() as db:
             dept_select = await dept_dao.get_all(db=db, name=name, leader=leader, phone=phone, status=status)
             tree_data = await get_tree_data(dept_select)
             return tree_data
 
     @staticmethod
     async def create(*, obj: CreateDeptParam) -> None:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             dept = await dept_dao.get_by_name(db, obj.name)
             if dept:
                 raise errors.ForbiddenError(msg='Department name already exists.')
@@ -39,10 +51,11 @@ class DeptService:
                 if not parent_dept:
                     raise errors.NotFoundError(msg='fatherDepartment does not exist')
             await dept_dao.create(db, obj)
+        await dept_tree_cache.invalidate()
 
     @staticmethod
     async def update(*, pk: int, obj: UpdateDeptParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             dept = await dept_dao.get(db, pk)
             if not dept:
                 raise errors.NotFoundError(msg='Department does not exist')
@@ -55,12 +68,16 @@ class DeptService:
                     raise errors.NotFoundError(msg='fatherDepartment does not exist')
             if obj.parent_id == dept.id:
                 raise errors.ForbiddenError(msg='Prohibited to associate itself as a parent level.')
+            if obj.parent_id and f'/{dept.id}/' in (parent_dept.tree_path or ''):
+                raise errors.ForbiddenError(msg='Prohibited to associate its descendant as a parent level.')
             count = await dept_dao.update(db, pk, obj)
-            return count
+        await user_principal_cache.invalidate()
+        await dept_tree_cache.invalidate()
+        return count
 
     @staticmethod
     async def delete(*, pk: int) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             dept_user = await dept_dao.get_user_relation(db, pk)
             if dept_user:
                 raise errors.ForbiddenError(msg='Department has users.,Unable to delete')
@@ -68,7 +85,9 @@ class DeptService:
             if children:
                 raise errors.ForbiddenError(msg='Department exists sub-department,Unable to delete')
             count = await dept_dao.delete(db, pk)
-            return count
+        await user_principal_cache.invalidate()
+        await dept_tree_cache.invalidate()
+        return count
 
 
 dept_service: DeptService = DeptService()
@@ -1,19 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from sqlalchemy import Select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.app.common.exception import errors
 from backend.app.crud.crud_dict_data import dict_data_dao
 from backend.app.crud.crud_dict_type import dict_type_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_session, request_db_transaction
 from backend.app.models.sys_dict_data import DictData
-from backend.app.schemas.dict_data import CreateDictDataParam, UpdateDictDataParam
+from backend.app.schemas.dict_data import BulkUpdateDictDataParam, CreateDictDataParam, UpdateDictDataParam
 
 
 class DictDataService:
     @staticmethod
     async def get(*, pk: int) -> DictData:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             dict_data = await dict_data_dao.get_with_relation(db, pk)
             if not dict_data:
                 raise errors.NotFoundError(msg='Dictionary data does not exist.')
@@ -25,7 +26,7 @@ class DictDataService:
 
     @staticmethod
     async def create(*, obj: CreateDictDataParam) -> None:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             dict_data = await dict_data_dao.get_by_label(db, obj.label)
             if dict_data:
                 raise errors.ForbiddenError(msg='dictionary data already exists.')
@@ -36,7 +37,7 @@ class DictDataService:
 
     @staticmethod
     async def update(*, pk: int, obj: UpdateDictDataParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             dict_data = await dict_data_dao.get(db, pk)
             if not dict_data:
                 raise errors.NotFoundError(msg='Dictionary data does not exist.')
@@ -49,9 +50,78 @@ class DictDataService:
             count = await dict_data_dao.update(db, pk, obj)
             return count
 
+    @staticmethod
+    async def _verify_types(db: AsyncSession, objs: list[CreateDictDataParam] | list[BulkUpdateDictDataParam]) -> None:
+        type_ids = {obj.type_id for obj in objs}
+        missing_type_ids = type_ids - await dict_type_dao.get_ids_(db, list(type_ids))
+        if missing_type_ids:
+            raise errors.ForbiddenError(
+                msg='Dictionary type does not exist.', data={'type_ids': list(missing_type_ids)}
+            )
+
+    @staticmethod
+    def _verify_unique(objs: list[CreateDictDataParam] | list[BulkUpdateDictDataParam]) -> None:
+        labels = [obj.label for obj in objs]
+        if len(set(labels)) != len(labels):
+            raise errors.ForbiddenError(msg='Duplicate dictionary data labels.')
+        values = [obj.value for obj in objs]
+        if len(set(values)) != len(values):
+            raise errors.ForbiddenError(msg='Duplicate dictionary data values.')
+
+    async def bulk_create(self, *, obj: list[CreateDictDataParam]) -> int:
+        async with request_db_transaction() as db:
+            self._verify_unique(obj)
+            dict_datas = await dict_data_dao.get_by_labels(db, [o.label for o in obj])
+            if dict_datas:
+                raise errors.ForbiddenError(
+                    msg='Dictionary data already exists.', data={'labels': [d.label for d in dict_datas]}
+                )
+            dict_datas = await dict_data_dao.get_by_values(db, [o.value for o in obj])
+            if dict_datas:
+                raise errors.ForbiddenError(
+                    msg='Dictionary data already exists.', data={'values': [d.value for d in dict_datas]}
+                )
+            await self._verify_types(db, obj)
+            count = await dict_data_dao.bulk_create(db, obj)
+            return count
+
+    async def bulk_update(self, *, obj: list[BulkUpdateDictDataParam]) -> int:
+        async with request_db_transaction() as db:
+            self._verify_unique(obj)
+            ids = {o.id for o in obj}
+            missing_ids = ids - await dict_data_dao.get_ids_(db, list(ids))
+            if missing_ids:
+                raise errors.NotFoundError(msg='Dictionary data does not exist.', data={'ids': list(missing_ids)})
+            label_ids = {o.label: o.id for o in obj}
+            dict_datas = await dict_data_dao.get_by_labels(db, list(label_ids))
+            conflicts = [d.label for d in dict_datas if d.id != label_ids[d.label]]
+            if conflicts:
+                raise errors.ForbiddenError(msg='Dictionary data already exists.', data={'labels': conflicts})
+            value_ids = {o.value: o.id for o in obj}
+            dict_datas = await dict_data_dao.get_by_values(db, list(value_ids))
+            conflicts = [d.value for d in dict_datas if d.id != value_ids[d.value]]
+            if conflicts:
+                raise errors.ForbiddenError(msg='Dictionary data already exists.', data={'values': conflicts})
+            await self._verify_types(db, obj)
+            count = await dict_data_dao.bulk_update(db, obj)
+            return count
+
+    async def bulk_import(self, *, obj: list[CreateDictDataParam]) -> int:
+        async with request_db_transaction() as db:
+            self._verify_unique(obj)
+            # The rows are matched by label, a value of another row would overwrite it through its unique key
+            value_labels = {o.value: o.label for o in obj}
+            dict_datas = await dict_data_dao.get_by_values(db, list(value_labels))
+            conflicts = [d.value for d in dict_datas if d.label != value_labels[d.value]]
+            if conflicts:
+                raise errors.ForbiddenError(msg='Dictionary data already exists.', data={'values': conflicts})
+            await self._verify_types(db, obj)
+            count = await dict_data_dao.bulk_upsert(db, obj)
+            return count
+
     @staticmethod
     async def delete(*, pk: list[int]) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             count = await dict_data_dao.delete(db, pk)
             return count
 
@@ -4,7 +4,7 @@ from sqlalchemy import Select
 
 from backend.app.common.exception import errors
 from backend.app.crud.crud_dict_type import dict_type_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_transaction
 from backend.app.schemas.dict_type import CreateDictTypeParam, UpdateDictTypeParam
 
 
@@ -15,7 +15,7 @@ class DictTypeService:
 
     @staticmethod
     async def create(*, obj: CreateDictTypeParam) -> None:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             dict_type = await dict_type_dao.get_by_code(db, obj.code)
             if dict_type:
                 raise errors.ForbiddenError(msg='Dictionary type already exists.')
@@ -23,7 +23,7 @@ class DictTypeService:
 
     @staticmethod
     async def update(*, pk: int, obj: UpdateDictTypeParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             dict_type = await dict_type_dao.get(db, pk)
             if not dict_type:
                 raise errors.NotFoundError(msg='Dictionary type does not exist.')
@@ -35,7 +35,7 @@ class DictTypeService:
 
     @staticmethod
     async def delete(*, pk: list[int]) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             count = await dict_type_dao.delete(db, pk)
             return count
 
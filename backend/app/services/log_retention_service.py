@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import re
+
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from backend.app.common.log import log
+from backend.app.common.pagination import page_count_cache
+from backend.app.core.conf import settings
+from backend.app.database.db_mysql import async_db_session, async_engine
+from backend.app.models import LoginLog, OperaLog
+from backend.app.utils.timezone import timezone
+
+# Monthly partitions p202610 hold the rows created before the first day of the next month
+_PARTITION_NAME = re.compile(r'^p(\d{4})(\d{2})$')
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def _partition_clause(month: date) -> str:
+    return f"PARTITION p{month:%Y%m} VALUES LESS THAN ('{_add_months(month, 1):%Y-%m-%d}')"
+
+
+class LogRetentionService:
+    """
+    Retention of the log tables
+
+    Tables partitioned by RANGE COLUMNS(created_time) (see the alembic migration) drop or archive the whole monthly
+    partitions older than LOG_RETENTION_DAYS, which is a metadata operation, and get the partitions of the next months
+    created ahead. Unpartitioned tables fall back to DELETE ... LIMIT loops, each chunk is a short transaction
+    """
+
+    tables = (OperaLog.__tablename__, LoginLog.__tablename__)
+
+    @staticmethod
+    async def _get_partitions(conn: AsyncConnection, table: str) -> list[str]:
+        result = await conn.execute(
+            text(
+                'SELECT PARTITION_NAME FROM information_schema.PARTITIONS '
+                'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL '
+                'ORDER BY PARTITION_ORDINAL_POSITION'
+            ),
+            {'table': table},
+        )
+        return list(result.scalars())
+
+    @staticmethod
+    async def _table_exists(conn: AsyncConnection, table: str) -> bool:
+        result = await conn.execute(
+            text('SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table'),
+            {'table': table},
+        )
+        return result.scalar() is not None
+
+    @staticmethod
+    async def _create_partitions(conn: AsyncConnection, table: str, partitions: list[str], today: date) -> list[str]:
+        months = [date(int(m[1]), int(m[2]), 1) for m in map(_PARTITION_NAME.match, partitions) if m]
+        month = _add_months(max(months), 1) if months else today.replace(day=1)
+        until = _add_months(today, settings.LOG_PARTITION_PREMAKE_MONTHS)
+        new_months = []
+        while month <= until:
+            new_months.append(month)
+            month = _add_months(month, 1)
+        if not new_months or 'pmax' not in partitions:
+            return []
+        clauses = ', '.join([*map(_partition_clause, new_months), 'PARTITION pmax VALUES LESS THAN (MAXVALUE)'])
+        await conn.execute(text(f'ALTER TABLE {table} REORGANIZE PARTITION pmax INTO ({clauses})'))
+        return [f'p{month:%Y%m}' for month in new_months]
+
+    async def _archive_partition(self, conn: AsyncConnection, table: str, partition: str) -> bool:
+        archive_table = f'{table}_{partition}'
+        if await self._table_exists(conn, archive_table):
+            # Left by an interrupted run, the partition is only dropped when it has been exchanged
+            result = await conn.execute(text(f'SELECT 1 FROM {table} PARTITION ({partition}) LIMIT 1'))
+            if result.scalar() is not None:
+                log.warning('Log archive table {} already exists, partition {} is kept', archive_table, partition)
+                return False
+        else:
+            await conn.execute(text(f'CREATE TABLE {archive_table} LIKE {table}'))
+            await conn.execute(text(f'ALTER TABLE {archive_table} REMOVE PARTITIONING'))
+            await conn.execute(text(f'ALTER TABLE {table} EXCHANGE PARTITION {partition} WITH TABLE {archive_table}'))
+        return True
+
+    async def _drop_partitions(
+        self, conn: AsyncConnection, table: str, partitions: list[str], cutoff: date
+    ) -> list[str]:
+        dropped = []
+        for partition in partitions:
+            match = _PARTITION_NAME.match(partition)
+            # Only the partitions whose rows are all older than the cutoff
+            if not match or _add_months(date(int(match[1]), int(match[2]), 1), 1) > cutoff:
+                continue
+            if settings.LOG_RETENTION_ARCHIVE and not await self._archive_partition(conn, table, partition):
+                continue
+            await conn.execute(text(f'ALTER TABLE {table} DROP PARTITION {partition}'))
+            dropped.append(partition)
+        return dropped
+
+    @staticmethod
+    async def _delete_chunks(table: str, cutoff: datetime | None = None) -> int:
+        where = 'WHERE created_time < :cutoff ' if cutoff else ''
+        stmt = text(f'DELETE FROM {table} {where}ORDER BY created_time LIMIT :limit')
+        batch_size = settings.LOG_RETENTION_DELETE_BATCH_SIZE
+        count = 0
+        while True:
+            async with async_db_session.begin() as db:
+                result = await db.execute(stmt, {'cutoff': cutoff, 'limit': batch_size})
+            count += result.rowcount
+            if result.rowcount < batch_size:
+                return count
+
+    async def purge_table(self, table: str) -> dict:
+        """
+        Remove the logs older than LOG_RETENTION_DAYS of the table
+
+        :param table:
+        :return:
+        """
+        now = timezone.now()
+        cutoff = now - timedelta(days=settings.LOG_RETENTION_DAYS)
+        async with async_engine.connect() as conn:
+            partitions = await self._get_partitions(conn, table)
+            if partitions:
+                # DDL statements are committed implicitly
+                created = await self._create_partitions(conn, table, partitions, now.date())
+                dropped = await self._drop_partitions(conn, table, partitions, cutoff.date())
+                return {'partitioned': True, 'created': created, 'dropped': dropped, 'deleted': 0}
+        deleted = await self._delete_chunks(table, cutoff)
+        return {'partitioned': False, 'created': [], 'dropped': [], 'deleted': deleted}
+
+    async def clear_table(self, table: str) -> int:
+        """
+        Remove all the logs of the table, partitions are truncated and unpartitioned tables are deleted in chunks
+
+        :param table:
+        :return: Removed count
+        """
+        count = None
+        async with async_engine.connect() as conn:
+            if await self._get_partitions(conn, table):
+                count = (await conn.execute(text(f'SELECT COUNT(*) FROM {table}'))).scalar()
+                await conn.execute(text(f'ALTER TABLE {table} TRUNCATE PARTITION ALL'))
+        if count is None:
+            count = await self._delete_chunks(table)
+        # The counts of the log tables are not invalidated by writes
+        await page_count_cache.invalidate(table)
+        return count
+
+    async def purge(self) -> dict[str, dict]:
+        """
+        Remove the logs older than LOG_RETENTION_DAYS of all the log tables
+
+        :return:
+        """
+        data = {}
+        for table in self.tables:
+            data[table] = await self.purge_table(table)
+            log.info('Log retention of {}: {}', table, data[table])
+        return data
+
+
+log_retention_service: LogRetentionService = LogRetentionService()
@@ -8,15 +8,20 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.app.common.log import log
 from backend.app.crud.crud_login_log import login_log_dao
-from backend.app.database.db_mysql import async_db_session
-from backend.app.models import User
+from backend.app.database.db_mysql import request_db_transaction
+from backend.app.models import LoginLog, User
 from backend.app.schemas.login_log import CreateLoginLogParam
+from backend.app.services.log_retention_service import log_retention_service
 
 
 class LoginLogService:
     @staticmethod
-    async def get_select(*, username: str, status: int, ip: str) -> Select:
-        return await login_log_dao.get_all(username=username, status=status, ip=ip)
+    async def get_select(
+        *, username: str, status: int, ip: str, start_time: datetime | None = None, end_time: datetime | None = None
+    ) -> Select:
+        return await login_log_dao.get_all(
+            username=username, status=status, ip=ip, start_time=start_time, end_time=end_time
+        )
 
     @staticmethod
     async def create(
@@ -45,15 +50,13 @@ class LoginLogService:
 
     @staticmethod
     async def delete(*, pk: list[int]) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             count = await login_log_dao.delete(db, pk)
             return count
 
     @staticmethod
     async def delete_all() -> int:
-        async with async_db_session.begin() as db:
-            count = await login_log_dao.delete_all(db)
-            return count
+        return await log_retention_service.clear_table(LoginLog.__tablename__)
 
 
 login_log_service: LoginLogService = LoginLogService()
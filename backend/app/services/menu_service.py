@@ -5,59 +5,73 @@ from typing import Any
 from fastapi import Request
 
 from backend.app.common.exception import errors
+from backend.app.common.principal import user_principal_cache
 from backend.app.common.redis import redis_client
+from backend.app.common.tree_cache import menu_tree_cache
 from backend.app.core.conf import settings
 from backend.app.crud.crud_menu import menu_dao
 from backend.app.crud.crud_role import role_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_session, request_db_transaction
 from backend.app.models import Menu
 from backend.app.schemas.menu import CreateMenuParam, UpdateMenuParam
-from backend.app.utils.build_tree import get_tree_data
+from backend.app.utils.build_tree import get_tree_data, prune_tree
 
 
 class MenuService:
     @staticmethod
     async def get(*, pk: int) -> Menu:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             menu = await menu_dao.get(db, menu_id=pk)
             if not menu:
                 raise errors.NotFoundError(msg='Menu does not exist.')
             return menu
 
+    @staticmethod
+    async def _load_menu_tree() -> list[dict[str, Any]]:
+        # Cache fill, must see the latest writes
+        async with request_db_session(primary=True) as db:
+            menu_select = await menu_dao.get_all(db)
+            menu_tree = await get_tree_data(menu_select)
+            return menu_tree
+
     @staticmethod
     async def get_menu_tree(*, title: str | None = None, status: int | None = None) -> list[dict[str, Any]]:
-        async with async_db_session() as db:
+        if title is None and status is None:
+            return await menu_tree_cache.get(MenuService._load_menu_tree)
+        async with request_db_session() as db:
             menu_select = await menu_dao.get_all(db, title=title, status=status)
             menu_tree = await get_tree_data(menu_select)
             return menu_tree
 
+    @staticmethod
+    def _prune_role_menu_tree(
+        menu_tree: list[dict[str, Any]], superuser: bool, menu_ids: set[int]
+    ) -> list[dict[str, Any]]:
+        """Same as the tree of menu_dao.get_role_menus, pruned from the full tree"""
+        return prune_tree(menu_tree, lambda menu: menu['menu_type'] in (0, 1) and (superuser or menu['id'] in menu_ids))
+
     @staticmethod
     async def get_role_menu_tree(*, pk: int) -> list[dict[str, Any]]:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             role = await role_dao.get_with_relation(db, pk)
             if not role:
                 raise errors.NotFoundError(msg='Role does not exist.')
-            menu_ids = [menu.id for menu in role.menus]
-            menu_select = await menu_dao.get_role_menus(db, False, menu_ids)
-            menu_tree = await get_tree_data(menu_select)
-            return menu_tree
+            menu_ids = {menu.id for menu in role.menus}
+        menu_tree = await menu_tree_cache.get(MenuService._load_menu_tree)
+        return MenuService._prune_role_menu_tree(menu_tree, False, menu_ids)
 
     @staticmethod
     async def get_user_menu_tree(*, request: Request) -> list[dict[str, Any]]:
-        async with async_db_session() as db:
-            roles = request.user.roles
-            menu_ids = []
-            menu_tree = []
-            if roles:
-                for role in roles:
-                    menu_ids.extend([menu.id for menu in role.menus])
-                menu_select = await menu_dao.get_role_menus(db, request.user.is_superuser, menu_ids)
-                menu_tree = await get_tree_data(menu_select)
-            return menu_tree
+        roles = request.user.roles
+        if not roles:
+            return []
+        menu_ids = {menu.id for role in roles for menu in role.menus}
+        menu_tree = await menu_tree_cache.get(MenuService._load_menu_tree)
+        return MenuService._prune_role_menu_tree(menu_tree, request.user.is_superuser, menu_ids)
 
     @staticmethod
     async def create(*, obj: CreateMenuParam) -> None:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             title = await menu_dao.get_by_title(db, obj.title)
             if title:
                 raise errors.ForbiddenError(msg='Menu title already exists.')
@@ -66,10 +80,11 @@ class MenuService:
                 if not parent_menu:
                     raise errors.NotFoundError(msg='Menu does not exist.')
             await menu_dao.create(db, obj)
+        await menu_tree_cache.invalidate()
 
     @staticmethod
     async def update(*, pk: int, obj: UpdateMenuParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             menu = await menu_dao.get(db, pk)
             if not menu:
                 raise errors.NotFoundError(msg='Menu does not exist.')
@@ -82,18 +97,24 @@ class MenuService:
                     raise errors.NotFoundError(msg='Menu does not exist.')
             if obj.parent_id == menu.id:
                 raise errors.ForbiddenError(msg='Prohibited to associate itself as a parent level.')
+            if obj.parent_id and f'/{menu.id}/' in (parent_menu.tree_path or ''):
+                raise errors.ForbiddenError(msg='Prohibited to associate its descendant as a parent level.')
             count = await menu_dao.update(db, pk, obj)
             await redis_client.delete_prefix(settings.PERMISSION_REDIS_PREFIX)
-            return count
+        await user_principal_cache.invalidate()
+        await menu_tree_cache.invalidate()
+        return count
 
     @staticmethod
     async def delete(*, pk: int) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             children = await menu_dao.get_children(db, pk)
             if children:
                 raise errors.ForbiddenError(msg='Menu submenu exists,Unable to delete')
             count = await menu_dao.delete(db, pk)
-            return count
+        await user_principal_cache.invalidate()
+        await menu_tree_cache.invalidate()
+        return count
 
 
 menu_service: MenuService = MenuService()
@@ -1,33 +1,243 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
+import fcntl
+import os
+import time
+import uuid
+
+from contextlib import contextmanager
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
 from sqlalchemy import Select
 
+from backend.app.common.log import log
+from backend.app.core.conf import settings
+from backend.app.core.path_conf import LogPath
 from backend.app.crud.crud_opera_log import opera_log_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_transaction
+from backend.app.models import OperaLog
 from backend.app.schemas.opera_log import CreateOperaLogParam
+from backend.app.services.log_retention_service import log_retention_service
 
 
 class OperaLogService:
     @staticmethod
-    async def get_select(*, username: str | None = None, status: int | None = None, ip: str | None = None) -> Select:
-        return await opera_log_dao.get_all(username=username, status=status, ip=ip)
+    async def get_select(
+        *,
+        username: str | None = None,
+        status: int | None = None,
+        ip: str | None = None,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> Select:
+        return await opera_log_dao.get_all(
+            username=username, status=status, ip=ip, start_time=start_time, end_time=end_time
+        )
 
     @staticmethod
     async def create(*, obj_in: CreateOperaLogParam):
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             await opera_log_dao.create(db, obj_in)
 
+    @staticmethod
+    async def bulk_create(*, obj_in: list[CreateOperaLogParam]):
+        async with request_db_transaction() as db:
+            await opera_log_dao.bulk_create(db, obj_in)
+
     @staticmethod
     async def delete(*, pk: list[int]) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             count = await opera_log_dao.delete(db, pk)
             return count
 
     @staticmethod
     async def delete_all() -> int:
-        async with async_db_session.begin() as db:
-            count = await opera_log_dao.delete_all(db)
-            return count
+        return await log_retention_service.clear_table(OperaLog.__tablename__)
+
+
+class OperaLogBuffer:
+    """
+    Operation log write buffer of the current worker
+
+    The logs are queued and written by a background consumer with multi-row inserts, a batch is flushed when it
+    reaches OPERA_LOG_BATCH_SIZE or after OPERA_LOG_FLUSH_INTERVAL. When the queue is full, OPERA_LOG_QUEUE_FULL_POLICY
+    decides whether the request waits, the log is dropped or spilled to a file, spilled logs and logs of failed
+    batches are written again once the database is available
+    """
+
+    def __init__(self):
+        self._queue: asyncio.Queue[CreateOperaLogParam | None] = asyncio.Queue(settings.OPERA_LOG_QUEUE_MAXSIZE)
+        self._task: asyncio.Task | None = None
+        self._spill_file = os.path.join(LogPath, settings.OPERA_LOG_SPILL_FILENAME)
+        self._spill_lock = asyncio.Lock()
+        self._flushed = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._flush_count = 0
+        self._flush_time = 0.0
+        self._flush_time_max = 0.0
+
+    async def put(self, obj_in: CreateOperaLogParam) -> None:
+        """
+        Add operation log
+
+        :param obj_in:
+        :return:
+        """
+        if self._task is None:
+            # Not started, e.g. outside of the application lifespan
+            await OperaLogService.create(obj_in=obj_in)
+            return
+        if settings.OPERA_LOG_QUEUE_FULL_POLICY == 'block':
+            await self._queue.put(obj_in)
+            return
+        try:
+            self._queue.put_nowait(obj_in)
+        except asyncio.QueueFull:
+            await self._discard([obj_in])
+
+    async def _discard(self, batch: list[CreateOperaLogParam]) -> None:
+        if settings.OPERA_LOG_QUEUE_FULL_POLICY == 'drop':
+            self._dropped += len(batch)
+            return
+        try:
+            async with self._spill_lock:
+                await self._write_spill(batch)
+            self._spilled += len(batch)
+        except Exception as e:
+            log.error('❌ Operation log spill failed {}', e)
+            self._dropped += len(batch)
+
+    @contextmanager
+    def _spill_file_lock(self):
+        # The spill file is shared by all the workers, asyncio.Lock only serializes the current one
+        with open(f'{self._spill_file}.lock', 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @sync_to_async
+    def _write_spill(self, batch: list[CreateOperaLogParam]) -> None:
+        with self._spill_file_lock(), open(self._spill_file, 'a', encoding='utf-8') as f:
+            f.writelines(obj.model_dump_json() + '\n' for obj in batch)
+
+    @sync_to_async
+    def _take_spill(self) -> list[CreateOperaLogParam]:
+        # A unique replay file, so that it can only be read and removed by the current worker
+        replay_file = f'{self._spill_file}.{uuid.uuid4().hex}.replay'
+        with self._spill_file_lock():
+            if not os.path.exists(self._spill_file):
+                return []
+            os.replace(self._spill_file, replay_file)
+        with open(replay_file, encoding='utf-8') as f:
+            batch = [CreateOperaLogParam.model_validate_json(line) for line in f if line.strip()]
+        os.remove(replay_file)
+        return batch
+
+    async def _flush(self, batch: list[CreateOperaLogParam]) -> bool:
+        start_time = time.perf_counter()
+        try:
+            await OperaLogService.bulk_create(obj_in=batch)
+        except Exception as e:
+            log.error('❌ Operation log batch write failed {}', e)
+            await self._discard(batch)
+            return False
+        flush_time = time.perf_counter() - start_time
+        self._flushed += len(batch)
+        self._flush_count += 1
+        self._flush_time += flush_time
+        self._flush_time_max = max(self._flush_time_max, flush_time)
+        return True
+
+    async def _replay_spill(self) -> None:
+        try:
+            async with self._spill_lock:
+                batch = await self._take_spill()
+        except Exception as e:
+            log.error('❌ Operation log spill replay failed {}', e)
+            return
+        if batch:
+            self._spilled -= min(self._spilled, len(batch))
+        for i in range(0, len(batch), settings.OPERA_LOG_BATCH_SIZE):
+            await self._flush(batch[i : i + settings.OPERA_LOG_BATCH_SIZE])
+
+    async def _consume(self) -> None:
+        loop = asyncio.get_running_loop()
+        await self._replay_spill()
+        while True:
+            obj_in = await self._queue.get()
+            if obj_in is None:
+                return
+            batch = [obj_in]
+            deadline = loop.time() + settings.OPERA_LOG_FLUSH_INTERVAL
+            stop = False
+            while len(batch) < settings.OPERA_LOG_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    obj_in = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if obj_in is None:
+                    stop = True
+                    break
+                batch.append(obj_in)
+            if await self._flush(batch) and self._queue.empty() and self._spilled:
+                await self._replay_spill()
+            if stop:
+                return
+
+    async def start(self) -> None:
+        """
+        Start the consumer of the current worker
+
+        :return:
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._consume())
+
+    async def stop(self) -> None:
+        """
+        Stop the consumer of the current worker and flush the queued logs
+
+        :return:
+        """
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        await self._queue.put(None)
+        await task
+        batch = []
+        while not self._queue.empty():
+            obj_in = self._queue.get_nowait()
+            if obj_in is not None:
+                batch.append(obj_in)
+        for i in range(0, len(batch), settings.OPERA_LOG_BATCH_SIZE):
+            await self._flush(batch[i : i + settings.OPERA_LOG_BATCH_SIZE])
+
+    def stats(self) -> dict:
+        """
+        Buffer metrics of the current worker
+
+        :return:
+        """
+        return {
+            'queue_size': self._queue.qsize(),
+            'queue_maxsize': self._queue.maxsize,
+            'flushed': self._flushed,
+            'dropped': self._dropped,
+            'spilled': self._spilled,
+            'flush_count': self._flush_count,
+            'flush_time_avg_ms': round(self._flush_time / self._flush_count * 1000, 3) if self._flush_count else 0.0,
+            'flush_time_max_ms': round(self._flush_time_max * 1000, 3),
+        }
 
 
 opera_log_service: OperaLogService = OperaLogService()
+
+opera_log_buffer: OperaLogBuffer = OperaLogBuffer()
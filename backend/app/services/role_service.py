@@ -6,11 +6,12 @@ from fastapi import Request
 from sqlalchemy import Select
 
 from backend.app.common.exception import errors
+from backend.app.common.principal import user_principal_cache
 from backend.app.common.redis import redis_client
 from backend.app.core.conf import settings
 from backend.app.crud.crud_menu import menu_dao
 from backend.app.crud.crud_role import role_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_session, request_db_transaction
 from backend.app.models import Role
 from backend.app.schemas.role import CreateRoleParam, UpdateRoleMenuParam, UpdateRoleParam
 
@@ -18,7 +19,7 @@ from backend.app.schemas.role import CreateRoleParam, UpdateRoleMenuParam, Updat
 class RoleService:
     @staticmethod
     async def get(*, pk: int) -> Role:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             role = await role_dao.get_with_relation(db, pk)
             if not role:
                 raise errors.NotFoundError(msg='Role does not exist.')
@@ -26,13 +27,13 @@ class RoleService:
 
     @staticmethod
     async def get_all() -> Sequence[Role]:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             roles = await role_dao.get_all(db)
             return roles
 
     @staticmethod
     async def get_user_roles(*, pk: int) -> Sequence[Role]:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             roles = await role_dao.get_user_all(db, user_id=pk)
             return roles
 
@@ -42,7 +43,7 @@ class RoleService:
 
     @staticmethod
     async def create(*, obj: CreateRoleParam) -> None:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             role = await role_dao.get_by_name(db, obj.name)
             if role:
                 raise errors.ForbiddenError(msg='Role already exists.')
@@ -50,7 +51,7 @@ class RoleService:
 
     @staticmethod
     async def update(*, pk: int, obj: UpdateRoleParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             role = await role_dao.get(db, pk)
             if not role:
                 raise errors.NotFoundError(msg='Role does not exist.')
@@ -59,11 +60,12 @@ class RoleService:
                 if role:
                     raise errors.ForbiddenError(msg='Role already exists.')
             count = await role_dao.update(db, pk, obj)
-            return count
+        await user_principal_cache.invalidate()
+        return count
 
     @staticmethod
     async def update_role_menu(*, request: Request, pk: int, menu_ids: UpdateRoleMenuParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             role = await role_dao.get(db, pk)
             if not role:
                 raise errors.NotFoundError(msg='Role does not exist.')
@@ -73,13 +75,15 @@ class RoleService:
                     raise errors.NotFoundError(msg='Menu does not exist.')
             count = await role_dao.update_menus(db, pk, menu_ids)
             await redis_client.delete_prefix(f'{settings.PERMISSION_REDIS_PREFIX}:{request.user.uuid}')
-            return count
+        await user_principal_cache.invalidate()
+        return count
 
     @staticmethod
     async def delete(*, pk: list[int]) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             count = await role_dao.delete(db, pk)
-            return count
+        await user_principal_cache.invalidate()
+        return count
 
 
 role_service: RoleService = RoleService()
@@ -6,13 +6,20 @@ from fastapi import Request
 from sqlalchemy import Select
 
 from backend.app.common.exception import errors
-from backend.app.common.jwt import get_token, password_verify, superuser_verify
+from backend.app.common.jwt import (
+    get_token,
+    password_verify,
+    revoke_user_tokens,
+    superuser_verify,
+    token_verify_cache,
+)
+from backend.app.common.principal import user_principal_cache
 from backend.app.common.redis import redis_client
 from backend.app.core.conf import settings
 from backend.app.crud.crud_dept import dept_dao
 from backend.app.crud.crud_role import role_dao
 from backend.app.crud.crud_user import user_dao
-from backend.app.database.db_mysql import async_db_session
+from backend.app.database.db_mysql import request_db_session, request_db_transaction
 from backend.app.models import User
 from backend.app.schemas.user import (
     AddUserParam,
@@ -27,7 +34,7 @@ from backend.app.schemas.user import (
 class UserService:
     @staticmethod
     async def register(*, obj: RegisterUserParam) -> None:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             username = await user_dao.get_by_username(db, obj.username)
             if username:
                 raise errors.ForbiddenError(msg='The username has already been registered.')
@@ -42,7 +49,7 @@ class UserService:
 
     @staticmethod
     async def add(*, request: Request, obj: AddUserParam) -> None:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             await superuser_verify(request)
             username = await user_dao.get_by_username(db, obj.username)
             if username:
@@ -54,37 +61,69 @@ class UserService:
             dept = await dept_dao.get(db, obj.dept_id)
             if not dept:
                 raise errors.NotFoundError(msg='Department does not exist')
-            for role_id in obj.roles:
-                role = await role_dao.get(db, role_id)
-                if not role:
-                    raise errors.NotFoundError(msg='Role does not exist.')
+            role_ids, missing_ids = await role_dao.resolve_ids(db, obj.roles)
+            if missing_ids:
+                raise errors.NotFoundError(msg='Role does not exist.', data={'missing': missing_ids})
             email = await user_dao.check_email(db, obj.email)
             if email:
                 raise errors.ForbiddenError(msg='The email has been registered.')
-            await user_dao.add(db, obj)
+            await user_dao.add(db, obj, role_ids)
+
+    @staticmethod
+    async def bulk_add(*, request: Request, obj: list[AddUserParam]) -> int:
+        async with request_db_transaction() as db:
+            await superuser_verify(request)
+            for o in obj:
+                o.nickname = o.nickname if o.nickname else f'user{random.randrange(10000, 99999)}'
+            usernames = [o.username for o in obj]
+            nicknames = [o.nickname for o in obj]
+            emails = [o.email for o in obj]
+            if len(set(usernames)) != len(obj) or len(set(nicknames)) != len(obj) or len(set(emails)) != len(obj):
+                raise errors.ForbiddenError(msg='Duplicate username, nickname or email in the users.')
+            exists = await user_dao.get_by_unique_keys(db, usernames=usernames, nicknames=nicknames, emails=emails)
+            if exists:
+                raise errors.ForbiddenError(
+                    msg='The username, nickname or email has been registered.',
+                    data={
+                        'usernames': [u.username for u in exists if u.username in usernames],
+                        'nicknames': [u.nickname for u in exists if u.nickname in nicknames],
+                        'emails': [u.email for u in exists if u.email in emails],
+                    },
+                )
+            dept_ids = {o.dept_id for o in obj}
+            missing_dept_ids = dept_ids - await dept_dao.get_ids_(db, list(dept_ids), del_flag=0)
+            if missing_dept_ids:
+                raise errors.NotFoundError(msg='Department does not exist', data={'missing': list(missing_dept_ids)})
+            _, missing_role_ids = await role_dao.resolve_ids(db, [role_id for o in obj for role_id in o.roles])
+            if missing_role_ids:
+                raise errors.NotFoundError(msg='Role does not exist.', data={'missing': missing_role_ids})
+            count = await user_dao.bulk_add(db, obj)
+            return count
 
     @staticmethod
     async def pwd_reset(*, request: Request, obj: ResetPasswordParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
+            # The password hash is not kept in the cached user principal
+            user = await user_dao.get(db, request.user.id)
+            if not user:
+                raise errors.NotFoundError(msg='User does not exist.')
             op = obj.old_password
-            if not await password_verify(op + request.user.salt, request.user.password):
+            if not await password_verify(op + user.salt, user.password):
                 raise errors.ForbiddenError(msg='Incorrect old password.')
             np1 = obj.new_password
             np2 = obj.confirm_password
             if np1 != np2:
                 raise errors.ForbiddenError(msg='Passwords entered twice do not match.')
-            count = await user_dao.reset_password(db, request.user.id, obj.new_password, request.user.salt)
-            prefix = [
-                f'{settings.TOKEN_REDIS_PREFIX}:{request.user.id}:',
-                f'{settings.TOKEN_REFRESH_REDIS_PREFIX}:{request.user.id}:',
-            ]
-            for i in prefix:
-                await redis_client.delete_prefix(i)
-            return count
+            count = await user_dao.reset_password(db, user.id, obj.new_password, user.salt)
+            for prefix in [settings.TOKEN_REDIS_PREFIX, settings.TOKEN_REFRESH_REDIS_PREFIX]:
+                await revoke_user_tokens(prefix, request.user.id)
+            await token_verify_cache.revoke(request.user.id)
+        await user_principal_cache.invalidate(request.user.id)
+        return count
 
     @staticmethod
     async def get_userinfo(*, username: str) -> User:
-        async with async_db_session() as db:
+        async with request_db_session() as db:
             user = await user_dao.get_with_relation(db, username=username)
             if not user:
                 raise errors.NotFoundError(msg='userdo not exist')
@@ -92,7 +131,7 @@ class UserService:
 
     @staticmethod
     async def update(*, request: Request, username: str, obj: UpdateUserParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             if not request.user.is_superuser:
                 if request.user.username != username:
                     raise errors.ForbiddenError(msg='You can only modify your own information.')
@@ -112,27 +151,28 @@ class UserService:
                 if email:
                     raise errors.ForbiddenError(msg='The email has been registered.')
             count = await user_dao.update_userinfo(db, input_user, obj)
-            return count
+        await user_principal_cache.invalidate(input_user.id)
+        return count
 
     @staticmethod
     async def update_roles(*, request: Request, username: str, obj: UpdateUserRoleParam) -> None:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             if not request.user.is_superuser:
                 if request.user.username != username:
                     raise errors.ForbiddenError(msg='You can only modify your own role.')
             input_user = await user_dao.get_with_relation(db, username=username)
             if not input_user:
                 raise errors.NotFoundError(msg='userdo not exist')
-            for role_id in obj.roles:
-                role = await role_dao.get(db, role_id)
-                if not role:
-                    raise errors.NotFoundError(msg='Role does not exist.')
-            await user_dao.update_role(db, input_user, obj)
+            role_ids, missing_ids = await role_dao.resolve_ids(db, obj.roles)
+            if missing_ids:
+                raise errors.NotFoundError(msg='Role does not exist.', data={'missing': missing_ids})
+            await user_dao.update_role(db, input_user, role_ids)
             await redis_client.delete_prefix(f'{settings.PERMISSION_REDIS_PREFIX}:{request.user.uuid}')
+        await user_principal_cache.invalidate(input_user.id)
 
     @staticmethod
     async def update_avatar(*, request: Request, username: str, avatar: AvatarParam) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             if not request.user.is_superuser:
                 if request.user.username != username:
                     raise errors.ForbiddenError(msg='You can only edit your own profile picture.')
@@ -140,86 +180,90 @@ class UserService:
             if not input_user:
                 raise errors.NotFoundError(msg='userdo not exist')
             count = await user_dao.update_avatar(db, input_user, avatar)
-            return count
+        await user_principal_cache.invalidate(input_user.id)
+        return count
 
     @staticmethod
-    async def get_select(*, dept: int, username: str = None, phone: str = None, status: int = None) -> Select:
-        return await user_dao.get_all(dept=dept, username=username, phone=phone, status=status)
+    async def get_select(
+        *, dept: int, username: str = None, phone: str = None, status: int = None, dept_subtree: bool = False
+    ) -> Select:
+        return await user_dao.get_all(
+            dept=dept, username=username, phone=phone, status=status, dept_subtree=dept_subtree
+        )
 
     @staticmethod
     async def update_permission(*, request: Request, pk: int) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             await superuser_verify(request)
-            if not await user_dao.get(db, pk):
+            if pk == request.user.id:
+                raise errors.ForbiddenError(msg='Prohibit modifying own administrator privileges.')
+            if await user_dao.set_super(db, pk) is None:
                 raise errors.NotFoundError(msg='userdo not exist')
-            else:
-                if pk == request.user.id:
-                    raise errors.ForbiddenError(msg='Prohibit modifying own administrator privileges.')
-                count = await user_dao.set_super(db, pk)
-                return count
+            count = 1
+        await user_principal_cache.invalidate(pk)
+        return count
 
     @staticmethod
     async def update_staff(*, request: Request, pk: int) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             await superuser_verify(request)
-            if not await user_dao.get(db, pk):
+            if pk == request.user.id:
+                raise errors.ForbiddenError(msg='Prohibit modifying self-backend management login permissions.')
+            if await user_dao.set_staff(db, pk) is None:
                 raise errors.NotFoundError(msg='userdo not exist')
-            else:
-                if pk == request.user.id:
-                    raise errors.ForbiddenError(msg='Prohibit modifying self-backend management login permissions.')
-                count = await user_dao.set_staff(db, pk)
-                return count
+            count = 1
+        await user_principal_cache.invalidate(pk)
+        return count
 
     @staticmethod
     async def update_status(*, request: Request, pk: int) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             await superuser_verify(request)
-            if not await user_dao.get(db, pk):
+            if pk == request.user.id:
+                raise errors.ForbiddenError(msg='Prohibited modifying own state')
+            if await user_dao.set_status(db, pk) is None:
                 raise errors.NotFoundError(msg='userdo not exist')
-            else:
-                if pk == request.user.id:
-                    raise errors.ForbiddenError(msg='Prohibited modifying own state')
-                count = await user_dao.set_status(db, pk)
-                return count
+            count = 1
+        await user_principal_cache.invalidate(pk)
+        return count
 
     @staticmethod
     async def update_multi_login(*, request: Request, pk: int) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             await superuser_verify(request)
-            if not await user_dao.get(db, pk):
+            latest_multi_login = await user_dao.set_multi_login(db, pk)
+            if latest_multi_login is None:
                 raise errors.NotFoundError(msg='userdo not exist')
             else:
-                count = await user_dao.set_multi_login(db, pk)
+                count = 1
                 token = await get_token(request)
                 user_id = request.user.id
-                latest_multi_login = await user_dao.get_multi_login(db, pk)
                 # TODO: Removeuser refresh token, This operation requires passing arguments.,Not considering implementation for now.
                 # currentusermodify oneself(ordinary/super) ,Except the currenttokenOutside,othertokenFailure
                 if pk == user_id:
                     if not latest_multi_login:
-                        prefix = f'{settings.TOKEN_REDIS_PREFIX}:{pk}:'
-                        await redis_client.delete_prefix(prefix, exclude=prefix + token)
+                        await revoke_user_tokens(settings.TOKEN_REDIS_PREFIX, pk, exclude=token)
+                        await token_verify_cache.revoke(pk)
                 # superusermodifyOtherstime,Otherstokenwill (all)Failure
                 else:
                     if not latest_multi_login:
-                        prefix = f'{settings.TOKEN_REDIS_PREFIX}:{pk}:'
-                        await redis_client.delete_prefix(prefix)
-                return count
+                        await revoke_user_tokens(settings.TOKEN_REDIS_PREFIX, pk)
+                        await token_verify_cache.revoke(pk)
+        await user_principal_cache.invalidate(pk)
+        return count
 
     @staticmethod
     async def delete(*, username: str) -> int:
-        async with async_db_session.begin() as db:
+        async with request_db_transaction() as db:
             input_user = await user_dao.get_by_username(db, username)
             if not input_user:
                 raise errors.NotFoundError(msg='userdo not exist')
             count = await user_dao.delete(db, input_user.id)
-            prefix = [
-                f'{settings.TOKEN_REDIS_PREFIX}:{input_user.id}:',
-                f'{settings.TOKEN_REFRESH_REDIS_PREFIX}:{input_user.id}:',
-            ]
-            for i in prefix:
-                await redis_client.delete_prefix(i)
-            return count
+            for prefix in [settings.TOKEN_REDIS_PREFIX, settings.TOKEN_REFRESH_REDIS_PREFIX]:
+                await revoke_user_tokens(prefix, input_user.id)
+            await token_verify_cache.revoke(input_user.id)
+        await user_principal_cache.invalidate(input_user.id)
+        return count
 
 
 user_service: UserService = UserService()
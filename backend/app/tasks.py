@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import asyncio
 import sys
 import uuid
 
 sys.path.append('../../')
 
 from backend.app.common.celery import celery_app  # noqa: E402
+from backend.app.crud.crud_dept import dept_dao  # noqa: E402
+from backend.app.crud.crud_menu import menu_dao  # noqa: E402
+from backend.app.database.db_mysql import async_db_session, async_engine  # noqa: E402
+from backend.app.services.log_retention_service import log_retention_service  # noqa: E402
 
 
 @celery_app.task
@@ -13,3 +18,41 @@ def task_demo_async() -> str:
     uid = uuid.uuid4().hex
     print(f'Asynchronous task {uid} Execution successful')
     return uid
+
+
+async def _rebuild_tree_path() -> dict[str, int]:
+    try:
+        async with async_db_session.begin() as db:
+            dept_count = await dept_dao.rebuild_tree_path_(db)
+            menu_count = await menu_dao.rebuild_tree_path_(db)
+    finally:
+        # The connections are bound to the event loop of this run
+        await async_engine.dispose()
+    return {'dept': dept_count, 'menu': menu_count}
+
+
+@celery_app.task
+def task_rebuild_tree_path() -> dict[str, int]:
+    """
+    Backfill the tree_path of departments and menus from parent_id
+
+    celery -A tasks call tasks.task_rebuild_tree_path
+    """
+    return asyncio.run(_rebuild_tree_path())
+
+
+async def _log_retention() -> dict[str, dict]:
+    try:
+        return await log_retention_service.purge()
+    finally:
+        await async_engine.dispose()
+
+
+@celery_app.task
+def task_log_retention() -> dict[str, dict]:
+    """
+    Drop or archive the operation and login logs older than LOG_RETENTION_DAYS, and create the next partitions
+
+    celery -A tasks call tasks.task_log_retention
+    """
+    return asyncio.run(_log_retention())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tree building microbenchmark, the previous O(n²) recursive algorithm vs build_tree and iter_tree_json
+
+Run in backend/app: python -m backend.app.tests.utils.bench_build_tree
+"""
+import asyncio
+import copy
+import random
+import time
+
+from typing import Any
+
+import msgspec
+
+from backend.app.utils.build_tree import build_tree, iter_tree_json
+
+
+def build_nodes(count: int, seed: int = 0) -> list[dict[str, Any]]:
+    """
+    Random menu like nodes, sorted by sort
+
+    :param count:
+    :param seed:
+    :return:
+    """
+    rnd = random.Random(seed)
+    nodes = []
+    for i in range(1, count + 1):
+        parent_id = rnd.choice([None, *range(max(1, i - 50), i)]) if i > 1 else None
+        nodes.append({'id': i, 'name': f'node{i}', 'sort': rnd.randint(0, 10), 'parent_id': parent_id})
+    nodes.sort(key=lambda x: x['sort'])
+    return nodes
+
+
+async def legacy_recursive_to_tree(nodes: list[dict[str, Any]], *, parent_id: int | None = None) -> list:
+    tree = []
+    for node in nodes:
+        if node['parent_id'] == parent_id:
+            child_node = await legacy_recursive_to_tree(nodes, parent_id=node['id'])
+            if child_node:
+                node['children'] = child_node
+            tree.append(node)
+    return tree
+
+
+def bench(func, nodes: list[dict[str, Any]]) -> tuple[float, bytes]:
+    nodes = copy.deepcopy(nodes)
+    start = time.perf_counter()
+    data = func(nodes)
+    return (time.perf_counter() - start) * 1e3, data
+
+
+if __name__ == '__main__':
+    for count in (10_000, 100_000):
+        nodes = build_nodes(count)
+        results = {
+            'build_tree + encode': bench(lambda x: msgspec.json.encode(build_tree(x)), nodes),
+            'iter_tree_json': bench(lambda x: b''.join(iter_tree_json(x)), nodes),
+        }
+        if count <= 10_000:
+            results['legacy recursive + encode'] = bench(
+                lambda x: msgspec.json.encode(asyncio.run(legacy_recursive_to_tree(x))), nodes
+            )
+        expected = results['build_tree + encode'][1]
+        for name, (elapsed, data) in results.items():
+            assert data == expected, name
+            print(f'{count:>7} nodes {name:>26}: {elapsed:10.2f} ms')
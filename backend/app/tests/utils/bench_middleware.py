@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Middleware load benchmark, the previous BaseHTTPMiddleware access and operation log middlewares vs the pure ASGI ones
+
+Sequential POSTs with a 2 KB JSON body through httpx ASGITransport, ip / user agent parsing and the operation log
+write are stubbed, so only the middleware overhead is measured
+
+Run in backend/app: python -m backend.app.tests.utils.bench_middleware
+"""
+import asyncio
+import time
+import tracemalloc
+
+import httpx
+
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from backend.app.common.log import log
+from backend.app.middleware import opera_log_middleware
+from backend.app.middleware.access_middleware import AccessMiddleware
+from backend.app.middleware.opera_log_middleware import OperaLogMiddleware
+from backend.app.schemas.opera_log import CreateOperaLogParam
+from backend.app.utils.timezone import timezone
+
+BODY = {'nickname': 'x' * 2000, 'password': '123456'}
+
+
+class PreviousAccessMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        start_time = timezone.now()
+        response = await call_next(request)
+        end_time = timezone.now()
+        log.info(f'{response.status_code} {request.client.host} {request.method} {request.url} {end_time - start_time}')
+        return response
+
+
+class PreviousOperaLogMiddleware(BaseHTTPMiddleware):
+    """Hot path of the previous operation log middleware, the body and form are read before the app"""
+
+    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint) -> Response:
+        user_agent, device, os, browser = await opera_log_middleware.parse_user_agent_info(request)
+        ip, country, region, city = await opera_log_middleware.parse_ip_info(request)
+        args = dict(request.query_params)
+        args.update(request.path_params)
+        body_data = await request.body()
+        form_data = await request.form()
+        if len(form_data) > 0:
+            args.update(form_data)
+        elif body_data:
+            args.update(await request.json())
+        args = await OperaLogMiddleware.desensitization(args)
+        start_time = timezone.now()
+        response = await call_next(request)
+        cost_time = (timezone.now() - start_time).total_seconds() * 1000.0
+        opera_log_in = CreateOperaLogParam(
+            username=request.user.username,
+            method=request.method,
+            title='',
+            path=request.url.path,
+            ip=ip,
+            country=country,
+            region=region,
+            city=city,
+            user_agent=user_agent,
+            os=os,
+            browser=browser,
+            device=device,
+            args=args,
+            status=1,
+            code='200',
+            msg='Success',
+            cost_time=cost_time,
+            opera_time=start_time,
+        )
+        await opera_log_middleware.opera_log_buffer.put(opera_log_in)
+        return response
+
+
+class StubUser:
+    username = 'admin'
+
+
+class StubAuthMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        scope['user'] = StubUser()
+        await self.app(scope, receive, send)
+
+
+async def parse_user_agent_info(request: Request) -> tuple:
+    return 'python-httpx', 'Other', 'Other', 'Other'
+
+
+async def parse_ip_info(request: Request) -> tuple:
+    return '127.0.0.1', None, None, None
+
+
+async def put(obj_in: CreateOperaLogParam) -> None:
+    pass
+
+
+def build_app(middleware: type) -> FastAPI:
+    app = FastAPI()
+
+    @app.post('/api/v1/users/{pk}', summary='Update user')
+    async def update_user(pk: int, body: dict) -> dict:
+        return {'pk': pk, 'size': len(body)}
+
+    app.add_middleware(middleware)
+    app.add_middleware(StubAuthMiddleware)
+    return app
+
+
+async def bench(app: FastAPI, count: int, warmup: int = 200) -> tuple[float, float, float]:
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+        for _ in range(warmup):
+            await client.post('/api/v1/users/1', json=BODY)
+        tracemalloc.start()
+        for _ in range(count):
+            start_time = time.perf_counter()
+            await client.post('/api/v1/users/1', json=BODY)
+            latencies.append(time.perf_counter() - start_time)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    latencies.sort()
+    return latencies[count // 2] * 1000, latencies[int(count * 0.99)] * 1000, peak / 1024
+
+
+async def main(count: int = 3000) -> None:
+    log.remove()
+    opera_log_middleware.parse_user_agent_info = parse_user_agent_info
+    opera_log_middleware.parse_ip_info = parse_ip_info
+    opera_log_middleware.opera_log_buffer.put = put
+    for name, middleware in (
+        ('access    previous', PreviousAccessMiddleware),
+        ('access    asgi', AccessMiddleware),
+        ('opera log previous', PreviousOperaLogMiddleware),
+        ('opera log asgi', OperaLogMiddleware),
+    ):
+        p50, p99, peak = await bench(build_app(middleware), count)
+        print(f'{name:>18}: p50 {p50:6.3f} ms, p99 {p99:6.3f} ms, peak {peak:8.1f} KiB')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Paginated response serialization microbenchmark, pydantic page validation and response model serialization
+vs msgspec structs of the schema
+
+Run in backend/app: python -m backend.app.tests.utils.bench_paging_serialize
+"""
+import time
+import tracemalloc
+
+from datetime import datetime, timedelta
+
+from pydantic import TypeAdapter
+
+from backend.app.common.pagination import _Page, _PageData
+from backend.app.common.response.response_code import CustomResponseCode
+from backend.app.common.response.response_schema import ResponseModel
+from backend.app.models import OperaLog
+from backend.app.schemas.opera_log import GetOperaLogListDetails
+from backend.app.utils.serializers import MsgSpecJSONResponse, select_list_as_structs
+
+response_adapter = TypeAdapter(ResponseModel)
+
+
+def build_page(size: int) -> _Page:
+    now = datetime.now()
+    items = []
+    for i in range(size):
+        opera_log = OperaLog(
+            username='admin',
+            method='POST',
+            title='Add user',
+            path='/api/v1/users/add',
+            ip='127.0.0.1',
+            country='China',
+            region='Guangdong',
+            city='Shenzhen',
+            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0.0.0 Safari/537.36',
+            os='Windows 10',
+            browser='Chrome 120.0.0',
+            device='Other',
+            args={'username': f'user{i}', 'nickname': 'nick', 'email': f'user{i}@example.com', 'dept_id': 1},
+            status=1,
+            code='200',
+            msg='Success',
+            cost_time=12.5,
+            opera_time=now - timedelta(seconds=i),
+        )
+        opera_log.id = i + 1
+        opera_log.created_time = opera_log.opera_time
+        items.append(opera_log)
+    links = {'first': '/api/v1/logs/opera?page=1', 'last': '/api/v1/logs/opera?page=1', 'self': None}
+    return _Page(items=items, total=size, page=1, size=size, total_pages=1, links=links)
+
+
+def pydantic_path(page: _Page) -> bytes:
+    # paging_data + response_base.success + FastAPI response model serialization
+    page_data = _PageData[_Page[GetOperaLogListDetails]](page_data=page).model_dump()['page_data']
+    content = response_adapter.dump_python(response_adapter.validate_python(ResponseModel(data=page_data)), mode='json')
+    return MsgSpecJSONResponse(content).body
+
+
+def msgspec_path(page: _Page) -> bytes:
+    # fast_paging_data + response_base.fast_success
+    page_data = {name: getattr(page, name) for name in _Page.model_fields}
+    page_data['items'] = select_list_as_structs(page.items, GetOperaLogListDetails)
+    res = CustomResponseCode.HTTP_200
+    return MsgSpecJSONResponse({'code': res.code, 'msg': res.msg, 'data': page_data}).body
+
+
+def bench(func, page: _Page, rounds: int) -> tuple[float, float]:
+    func(page)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(page)
+    elapsed = (time.perf_counter() - start) / rounds * 1e3
+    tracemalloc.start()
+    func(page)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024
+
+
+if __name__ == '__main__':
+    for size in (20, 100):
+        page = build_page(size)
+        assert pydantic_path(page) == msgspec_path(page)
+        for name, func in (('pydantic', pydantic_path), ('msgspec', msgspec_path)):
+            elapsed, peak = bench(func, page, 200)
+            print(f'{size:>3} rows {name:>8}: {elapsed:7.3f} ms/page, peak {peak:8.1f} KiB/page')
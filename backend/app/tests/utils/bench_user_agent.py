@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+User agent parsing microbenchmark, uncached parse_user_agent vs the cached parse_user_agent_info, the misses of
+which are parsed in a thread
+
+Run in backend/app: python -m backend.app.tests.utils.bench_user_agent
+"""
+import asyncio
+import random
+import time
+
+from types import SimpleNamespace
+
+from backend.app.utils import request_parse
+from backend.app.utils.request_parse import parse_user_agent, parse_user_agent_info
+
+# Common browsers, clients and tools, roughly ordered by popularity
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)'
+    ' AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X)'
+    ' AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64)'
+    ' AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36 Edg/120.0.0.0',
+    'Mozilla/5.0 (Linux; Android 10; K) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)'
+    ' AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (iPad; CPU OS 17_1 like Mac OS X)'
+    ' AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.1 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'Mozilla/5.0 (Linux; Android 13; SM-S918B)'
+    ' AppleWebKit/537.36 (KHTML, like Gecko) SamsungBrowser/23.0 Chrome/115.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_1 like Mac OS X)'
+    ' AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148 MicroMessenger/8.0.44',
+    'PostmanRuntime/7.36.0',
+    'python-httpx/0.25.2',
+    'curl/8.4.0',
+    'Apifox/1.0.0 (https://apifox.com)',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+]
+
+
+def build_requests(count: int, unique_ratio: float, seed: int = 0) -> list[str]:
+    """
+    Zipf distributed user agents, with a share of unique (e.g. randomized build number) user agents
+
+    :param count:
+    :param unique_ratio:
+    :param seed:
+    :return:
+    """
+    rnd = random.Random(seed)
+    weights = [1 / (rank + 1) for rank in range(len(USER_AGENTS))]
+    requests = []
+    for i in range(count):
+        if rnd.random() < unique_ratio:
+            requests.append(f'{USER_AGENTS[0][:-14]}.{i} Safari/537.36')
+        else:
+            requests.append(rnd.choices(USER_AGENTS, weights)[0])
+    return requests
+
+
+def bench(func, requests: list[str]) -> float:
+    start = time.perf_counter()
+    for user_agent in requests:
+        func(user_agent)
+    return (time.perf_counter() - start) / len(requests) * 1e6
+
+
+async def bench_cached(requests: list[str]) -> tuple[float, int]:
+    """
+    :return: us/op, misses
+    """
+    request_parse._user_agent_cache.clear()
+    misses = 0
+    start = time.perf_counter()
+    for user_agent in requests:
+        misses += user_agent not in request_parse._user_agent_cache
+        await parse_user_agent_info(SimpleNamespace(headers={'User-Agent': user_agent}))
+    return (time.perf_counter() - start) / len(requests) * 1e6, misses
+
+
+if __name__ == '__main__':
+    for unique_ratio in (0.0, 0.01, 0.1):
+        requests = build_requests(20000, unique_ratio)
+        uncached_us = bench(parse_user_agent, requests)
+        cached_us, misses = asyncio.run(bench_cached(requests))
+        print(
+            f'unique {unique_ratio:>4.0%}: uncached {uncached_us:8.2f} us/op, cached {cached_us:8.2f} us/op, '
+            f'misses {misses}'
+        )
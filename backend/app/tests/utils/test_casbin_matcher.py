@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import random
+
+import casbin
+import pytest
+
+from backend.app.common.rbac import _CASBIN_RBAC_MODEL_CONF_TEXT
+from backend.app.utils.casbin_matcher import CasbinMatcher
+
+USERS = [f'user{i}' for i in range(6)]
+ROLES = [f'{i}' for i in range(5)]
+METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'PATCH']
+POLICY_SEGMENTS = ['api', 'v1', 'users', 'menus', '{id}', '{pk}', '*', '', 'user*', 'a.b', 'x-y', '{id}x', 'sys:user']
+REQUEST_SEGMENTS = ['api', 'v1', 'users', 'menus', '1', '42', '', 'user', 'users1', 'a.b', 'aXb', 'x-y', '{id}', '1x']
+
+
+def random_path(rnd: random.Random, segments: list[str]) -> str:
+    path = '/' + '/'.join(rnd.choice(segments) for _ in range(rnd.randint(0, 4)))
+    if rnd.random() < 0.02:
+        path += '\n'
+    return path
+
+
+def build_policies(rnd: random.Random) -> tuple[list[list[str]], list[list[str]]]:
+    policies = []
+    for _ in range(rnd.randint(1, 40)):
+        sub = rnd.choice(ROLES + USERS[:2])
+        act = rnd.choice(METHODS + ['*'])
+        policies.append([sub, random_path(rnd, POLICY_SEGMENTS).rstrip('\n'), act])
+    groupings = []
+    for _ in range(rnd.randint(0, 15)):
+        # Users inherit roles, roles may inherit (and cyclically) other roles
+        groupings.append([rnd.choice(USERS + ROLES), rnd.choice(ROLES)])
+    return policies, groupings
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_casbin_matcher_same_decisions_as_casbin(seed: int) -> None:
+    rnd = random.Random(seed)
+    policies, groupings = build_policies(rnd)
+    enforcer = casbin.Enforcer(casbin.Enforcer.new_model(text=_CASBIN_RBAC_MODEL_CONF_TEXT))
+    for policy in policies:
+        enforcer.add_policy(*policy)
+    for grouping in groupings:
+        enforcer.add_grouping_policy(*grouping)
+    matcher = CasbinMatcher(enforcer.get_policy(), enforcer.get_grouping_policy())
+
+    for _ in range(300):
+        sub = rnd.choice(USERS + ROLES)
+        path = random_path(rnd, REQUEST_SEGMENTS)
+        method = rnd.choice(METHODS)
+        assert matcher.enforce(sub, path, method) == enforcer.enforce(sub, path, method), (sub, path, method)
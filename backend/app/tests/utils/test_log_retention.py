@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import asyncio
+
+from datetime import date
+
+import pytest
+
+from backend.app.core.conf import settings
+from backend.app.models import LoginLog, OperaLog
+from backend.app.services.log_retention_service import _add_months, log_retention_service
+
+OPERA_LOG = OperaLog.__tablename__
+LOGIN_LOG = LoginLog.__tablename__
+
+
+class FakeResult:
+    def __init__(self, value: int | None):
+        self.value = value
+
+    def scalar(self) -> int | None:
+        return self.value
+
+
+class FakeConnection:
+    """Records the executed statements, the results of the queries are looked up by a part of their SQL"""
+
+    def __init__(self, results: dict[str, int | None] | None = None):
+        self.results = results or {}
+        self.statements = []
+
+    async def execute(self, statement, parameters: dict | None = None) -> FakeResult:
+        sql = str(statement)
+        self.statements.append(sql)
+        for part, value in self.results.items():
+            if part in sql:
+                return FakeResult(value)
+        return FakeResult(None)
+
+
+@pytest.mark.parametrize(
+    ['day', 'months', 'expected'],
+    (
+        [date(2026, 10, 18), 0, date(2026, 10, 1)],
+        [date(2026, 10, 18), 1, date(2026, 11, 1)],
+        [date(2026, 10, 31), 3, date(2027, 1, 1)],
+        [date(2026, 12, 1), 1, date(2027, 1, 1)],
+        [date(2026, 1, 31), -1, date(2025, 12, 1)],
+        [date(2026, 3, 15), -14, date(2025, 1, 1)],
+    ),
+)
+def test_add_months(day: date, months: int, expected: date) -> None:
+    assert _add_months(day, months) == expected
+
+
+def test_create_partitions_reorganizes_pmax(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, 'LOG_PARTITION_PREMAKE_MONTHS', 3)
+    conn = FakeConnection()
+    partitions = ['p202609', 'p202610', 'pmax']
+    created = asyncio.run(log_retention_service._create_partitions(conn, OPERA_LOG, partitions, date(2026, 10, 18)))
+    assert created == ['p202611', 'p202612', 'p202701']
+    assert conn.statements == [
+        'ALTER TABLE sys_opera_log REORGANIZE PARTITION pmax INTO ('
+        "PARTITION p202611 VALUES LESS THAN ('2026-12-01'), "
+        "PARTITION p202612 VALUES LESS THAN ('2027-01-01'), "
+        "PARTITION p202701 VALUES LESS THAN ('2027-02-01'), "
+        'PARTITION pmax VALUES LESS THAN (MAXVALUE))'
+    ]
+
+
+@pytest.mark.parametrize(
+    'partitions',
+    (
+        # Already created ahead
+        ['p202610', 'p202611', 'p202612', 'p202701', 'pmax'],
+        # Without pmax the partitions are not managed by the migration
+        ['p202610'],
+    ),
+)
+def test_create_partitions_nothing_to_do(monkeypatch: pytest.MonkeyPatch, partitions: list[str]) -> None:
+    monkeypatch.setattr(settings, 'LOG_PARTITION_PREMAKE_MONTHS', 3)
+    conn = FakeConnection()
+    created = asyncio.run(log_retention_service._create_partitions(conn, OPERA_LOG, partitions, date(2026, 10, 18)))
+    assert created == []
+    assert conn.statements == []
+
+
+def test_create_partitions_starts_from_current_month(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, 'LOG_PARTITION_PREMAKE_MONTHS', 1)
+    conn = FakeConnection()
+    created = asyncio.run(log_retention_service._create_partitions(conn, LOGIN_LOG, ['pmax'], date(2026, 10, 18)))
+    assert created == ['p202610', 'p202611']
+
+
+@pytest.mark.parametrize(
+    ['cutoff', 'expected'],
+    (
+        # p202604 holds the rows before 2026-05-01, it is dropped once the cutoff reaches that day
+        [date(2026, 4, 30), ['p202603']],
+        [date(2026, 5, 1), ['p202603', 'p202604']],
+        [date(2026, 5, 2), ['p202603', 'p202604']],
+        [date(2026, 3, 31), []],
+    ),
+)
+def test_drop_partitions_cutoff_boundary(monkeypatch: pytest.MonkeyPatch, cutoff: date, expected: list[str]) -> None:
+    monkeypatch.setattr(settings, 'LOG_RETENTION_ARCHIVE', False)
+    conn = FakeConnection()
+    partitions = ['p202603', 'p202604', 'p202605', 'pmax']
+    dropped = asyncio.run(log_retention_service._drop_partitions(conn, OPERA_LOG, partitions, cutoff))
+    assert dropped == expected
+    assert conn.statements == [f'ALTER TABLE sys_opera_log DROP PARTITION {partition}' for partition in expected]
+
+
+def test_drop_partitions_archives_before_dropping(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, 'LOG_RETENTION_ARCHIVE', True)
+    conn = FakeConnection()
+    dropped = asyncio.run(log_retention_service._drop_partitions(conn, OPERA_LOG, ['p202603'], date(2026, 5, 1)))
+    assert dropped == ['p202603']
+    assert conn.statements[1:] == [
+        'CREATE TABLE sys_opera_log_p202603 LIKE sys_opera_log',
+        'ALTER TABLE sys_opera_log_p202603 REMOVE PARTITIONING',
+        'ALTER TABLE sys_opera_log EXCHANGE PARTITION p202603 WITH TABLE sys_opera_log_p202603',
+        'ALTER TABLE sys_opera_log DROP PARTITION p202603',
+    ]
+
+
+def test_drop_partitions_reuses_exchanged_archive_table(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, 'LOG_RETENTION_ARCHIVE', True)
+    # Left by an interrupted run after the exchange, the partition is empty
+    conn = FakeConnection({'information_schema.TABLES': 1, 'PARTITION (p202603)': None})
+    dropped = asyncio.run(log_retention_service._drop_partitions(conn, OPERA_LOG, ['p202603'], date(2026, 5, 1)))
+    assert dropped == ['p202603']
+    assert not any(sql.startswith(('CREATE TABLE', 'ALTER TABLE sys_opera_log EXCHANGE')) for sql in conn.statements)
+    assert conn.statements[-1] == 'ALTER TABLE sys_opera_log DROP PARTITION p202603'
+
+
+def test_drop_partitions_keeps_partition_of_existing_archive_table(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, 'LOG_RETENTION_ARCHIVE', True)
+    conn = FakeConnection({'information_schema.TABLES': 1, 'PARTITION (p202603)': 1})
+    dropped = asyncio.run(log_retention_service._drop_partitions(conn, OPERA_LOG, ['p202603'], date(2026, 5, 1)))
+    assert dropped == []
+    assert not any('DROP PARTITION' in sql or 'EXCHANGE' in sql for sql in conn.statements)
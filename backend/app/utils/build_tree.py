@@ -1,6 +1,9 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-from typing import Any, Sequence
+from collections import defaultdict
+from typing import Any, Callable, Iterator, Sequence
+
+import msgspec
 
 from asgiref.sync import sync_to_async
 
@@ -40,22 +43,118 @@ def traversal_to_tree(nodes: list[dict[str, Any]]) -> list[dict[str, Any]]:
     return tree
 
 
+def _index_children(nodes: list[dict[str, Any]]) -> dict[int | None, list[dict[str, Any]]]:
+    """Parent id index of the nodes, the children keep the order of the nodes"""
+    index = defaultdict(list)
+    for node in nodes:
+        index[node['parent_id']].append(node)
+    return index
+
+
+def build_tree(
+    nodes: list[dict[str, Any]], *, parent_id: int | None = None, max_depth: int | None = None
+) -> list[dict[str, Any]]:
+    """
+    Construct tree structure in a single pass over the parent id index, the children are added to the nodes
+
+    Nodes in a parent cycle are not included
+
+    :param nodes: Flat nodes, sorted
+    :param parent_id: Parent id of the roots, build the subtree of the node
+    :param max_depth: Max depth of the tree, the roots are depth 1
+    :return:
+    """
+    index = _index_children(nodes)
+    tree = index.get(parent_id, [])
+    visited = {parent_id}
+    stack = [(node, 1) for node in tree]
+    visited.update(node['id'] for node in tree)
+    while stack:
+        node, depth = stack.pop()
+        if max_depth is not None and depth >= max_depth:
+            continue
+        children = [child for child in index.get(node['id'], ()) if child['id'] not in visited]
+        if children:
+            node['children'] = children
+            visited.update(child['id'] for child in children)
+            stack.extend((child, depth + 1) for child in children)
+    return tree
+
+
+def iter_tree_json(
+    nodes: list[dict[str, Any]], *, parent_id: int | None = None, max_depth: int | None = None
+) -> Iterator[bytes]:
+    """
+    Encode the tree to JSON chunks, same as encoding the result of build_tree, without adding children to the nodes
+
+    :param nodes: Flat nodes, sorted
+    :param parent_id: Parent id of the roots, build the subtree of the node
+    :param max_depth: Max depth of the tree, the roots are depth 1
+    :return:
+    """
+    encoder = msgspec.json.Encoder()
+    index = _index_children(nodes)
+    roots = index.get(parent_id, [])
+    visited = {parent_id}
+    visited.update(node['id'] for node in roots)
+    stack = [(iter(roots), 1)]
+    first = True
+    yield b'['
+    while stack:
+        siblings, depth = stack[-1]
+        node = next(siblings, None)
+        if node is None:
+            stack.pop()
+            first = False
+            yield b']}' if stack else b']'
+            continue
+        separator = b'' if first else b','
+        children = None
+        if max_depth is None or depth < max_depth:
+            children = [child for child in index.get(node['id'], ()) if child['id'] not in visited]
+        if children:
+            visited.update(child['id'] for child in children)
+            stack.append((iter(children), depth + 1))
+            first = True
+            yield separator + encoder.encode(node)[:-1] + b',"children":['
+        else:
+            first = False
+            yield separator + encoder.encode(node)
+
+
 async def recursive_to_tree(nodes: list[dict[str, Any]], *, parent_id: int | None = None) -> list[dict[str, Any]]:
     """
-    Construct tree structures through recursive algorithms.
+    Construct tree structures from the parent id, same result as the recursive algorithm, built by build_tree
 
     :param nodes:
     :param parent_id:
     :return:
     """
-    tree = []
-    for node in nodes:
-        if node['parent_id'] == parent_id:
-            child_node = await recursive_to_tree(nodes, parent_id=node['id'])
-            if child_node:
-                node['children'] = child_node
-            tree.append(node)
-    return tree
+    return build_tree(nodes, parent_id=parent_id)
+
+
+def prune_tree(tree: list[dict[str, Any]], predicate: Callable[[dict[str, Any]], bool]) -> list[dict[str, Any]]:
+    """
+    Prune the tree, the nodes which do not match the predicate are removed with their children,
+    the nodes are copied, the given tree is not modified
+
+    :param tree:
+    :param predicate:
+    :return:
+    """
+    pruned = []
+    for node in tree:
+        if not predicate(node):
+            continue
+        node = dict(node)
+        if 'children' in node:
+            children = prune_tree(node['children'], predicate)
+            if children:
+                node['children'] = children
+            else:
+                del node['children']
+        pruned.append(node)
+    return pruned
 
 
 async def get_tree_data(
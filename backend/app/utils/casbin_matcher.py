@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import re
+
+from collections import defaultdict
+from typing import Sequence
+
+from casbin.util import key_match, key_match3
+
+# Path segments which the route trie can match with the same result as keyMatch / keyMatch3,
+# policies with other patterns (regex characters, inline wildcards...) fall back to casbin key match functions
+_LITERAL_SEGMENT = re.compile(r'[\w\-]*')
+_PARAM_SEGMENT = re.compile(r'{[\w\-]+}')
+
+
+class _RouteNode:
+    """Route trie node, one per path segment"""
+
+    __slots__ = ('children', 'param', 'wildcard', 'terminal')
+
+    def __init__(self):
+        self.children: dict[str, _RouteNode] = {}
+        self.param: _RouteNode | None = None  # {param} segment
+        self.wildcard = False  # The pattern ends with /* at this node
+        self.terminal = False  # The pattern ends at this node
+
+    def insert(self, segments: list[str]) -> None:
+        node = self
+        for segment in segments:
+            if segment == '*':
+                node.wildcard = True
+                return
+            if _PARAM_SEGMENT.fullmatch(segment):
+                if node.param is None:
+                    node.param = _RouteNode()
+                node = node.param
+            else:
+                node = node.children.setdefault(segment, _RouteNode())
+        node.terminal = True
+
+    def match(self, segments: list[str], index: int = 0) -> bool:
+        if self.wildcard and index < len(segments):
+            return True
+        if index == len(segments):
+            return self.terminal
+        segment = segments[index]
+        child = self.children.get(segment)
+        if child is not None and child.match(segments, index + 1):
+            return True
+        if self.param is not None and segment and self.param.match(segments, index + 1):
+            return True
+        return False
+
+
+def _is_route_pattern(segments: list[str]) -> bool:
+    """Whether the split policy path can be compiled into the route trie"""
+    for i, segment in enumerate(segments):
+        if segment == '*':
+            if i != len(segments) - 1 or i == 0:
+                return False
+        elif not (_LITERAL_SEGMENT.fullmatch(segment) or _PARAM_SEGMENT.fullmatch(segment)):
+            return False
+    return True
+
+
+def _match_rule(obj: str, act: str, p_obj: str, p_act: str) -> bool:
+    """The casbin model matcher, excluding the role part"""
+    return (act == p_act or p_act == '*') and (key_match(obj, p_obj) or key_match3(obj, p_obj))
+
+
+class CasbinMatcher:
+    """
+    Compiled casbin policies, give the same decisions as the RBAC model matcher::
+
+        g(r.sub, p.sub) && (keyMatch(r.obj, p.obj) || keyMatch3(r.obj, p.obj)) && (r.act == p.act || p.act == "*")
+
+    The p rules are compiled into a route trie per subject and request method, the g rules are flattened into
+    a subject -> roles map, so that one check is a trie lookup per role instead of a scan of all policies
+    """
+
+    def __init__(self, policies: Sequence[Sequence[str]], groupings: Sequence[Sequence[str]], max_hierarchy_level=10):
+        """
+        :param policies: p rules, [sub, obj, act]
+        :param groupings: g rules, [user, role]
+        :param max_hierarchy_level: Same as casbin role manager
+        """
+        self._rules: dict[str, list[tuple[str, str]]] = defaultdict(list)
+        self._routes: dict[str, dict[str, _RouteNode]] = defaultdict(dict)
+        self._fallback: dict[str, list[tuple[str, str]]] = defaultdict(list)
+        for sub, obj, act in (policy[:3] for policy in policies):
+            self._rules[sub].append((obj, act))
+            segments = obj.split('/')
+            if _is_route_pattern(segments):
+                routes = self._routes[sub]
+                if act not in routes:
+                    routes[act] = _RouteNode()
+                routes[act].insert(segments)
+            else:
+                self._fallback[sub].append((obj, act))
+
+        links: dict[str, set[str]] = defaultdict(set)
+        for user, role in (grouping[:2] for grouping in groupings):
+            links[user].add(role)
+        self._roles: dict[str, tuple[str, ...]] = {}
+        for user in links:
+            # Same depth as casbin role manager has_link(), the subject itself is level 0
+            roles = {user}
+            current = {user}
+            for _ in range(max_hierarchy_level - 1):
+                current = {role for name in current for role in links.get(name, ())} - roles
+                if not current:
+                    break
+                roles |= current
+            self._roles[user] = tuple(roles)
+
+    def get_roles(self, sub: str) -> tuple[str, ...]:
+        """
+        Get all roles of the subject, including itself and inherited roles
+
+        :param sub:
+        :return:
+        """
+        return self._roles.get(sub, (sub,))
+
+    def enforce(self, sub: str, obj: str, act: str) -> bool:
+        """
+        Permission verification
+
+        :param sub: user uuid
+        :param obj: Request path
+        :param act: Request method
+        :return:
+        """
+        roles = self.get_roles(sub)
+        if '\n' in obj:
+            # keyMatch3 regex $ also matches before a trailing newline, leave it to casbin functions
+            return any(
+                _match_rule(obj, act, p_obj, p_act) for role in roles for p_obj, p_act in self._rules.get(role, ())
+            )
+        segments = obj.split('/')
+        for role in roles:
+            routes = self._routes.get(role)
+            if routes:
+                for method in (act, '*'):
+                    node = routes.get(method)
+                    if node is not None and node.match(segments):
+                        return True
+            for p_obj, p_act in self._fallback.get(role, ()):
+                if _match_rule(obj, act, p_obj, p_act):
+                    return True
+        return False
@@ -1,5 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import mmap
+
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable
+
 import httpx
 
 from asgiref.sync import sync_to_async
@@ -51,7 +57,31 @@ async def get_location_online(ip: str, user_agent: str) -> dict | None:
             return None
 
 
-@sync_to_async
+@lru_cache
+def get_xdb_searcher() -> XdbSearcher:
+    """
+    Offline ip database searcher of the current process, the xdb file is memory mapped,
+    so that its pages are loaded once and shared by all worker processes
+
+    :return:
+    """
+    with open(IP2REGION_XDB, 'rb') as f:
+        content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return XdbSearcher(contentBuff=content)
+
+
+def _parse_xdb_region(region: str) -> dict | None:
+    """Parse the xdb region, country|area|province|city|isp"""
+    data = region.split('|')
+    if len(data) < 4:
+        return None
+    return {
+        'country': data[0] if data[0] != '0' else None,
+        'regionName': data[2] if data[2] != '0' else None,
+        'city': data[3] if data[3] != '0' else None,
+    }
+
+
 def get_location_offline(ip: str) -> dict | None:
     """
     Offline access ip AddressTerritory,Unable to guarantee accuracy,100%Available
@@ -60,51 +90,94 @@ def get_location_offline(ip: str) -> dict | None:
     :return:
     """
     try:
-        cb = XdbSearcher.loadContentFromFile(dbfile=IP2REGION_XDB)
-        searcher = XdbSearcher(contentBuff=cb)
-        data = searcher.search(ip)
-        searcher.close()
-        data = data.split('|')
-        return {
-            'country': data[0] if data[0] != '0' else None,
-            'regionName': data[2] if data[2] != '0' else None,
-            'city': data[3] if data[3] != '0' else None,
-        }
+        return _parse_xdb_region(get_xdb_searcher().search(ip))
     except Exception as e:
         log.error(f'Offline access ip AddressTerritory Failure,error message: {e}')
         return None
 
 
+def get_locations_offline(ips: Iterable[str]) -> dict[str, dict | None]:
+    """
+    Offline bulk access ip AddressTerritory, e.g. for log backfill
+
+    :param ips:
+    :return: ip -> location
+    """
+    searcher = get_xdb_searcher()
+    locations = {}
+    # Search in ip order, adjacent ips hit the same index pages
+    for ip_long, ip in sorted((searcher.ip2long(ip), ip) for ip in set(ips) if searcher.isip(ip)):
+        locations[ip] = _parse_xdb_region(searcher.searchByIPLong(ip_long))
+    return locations
+
+
+_ip_location_cache: OrderedDict[str, tuple[str | None, str | None, str | None]] = OrderedDict()
+
+
 async def parse_ip_info(request: Request) -> tuple[str, str, str, str]:
     country, region, city = None, None, None
     ip = await get_request_ip(request)
-    location = await redis_client.get(f'{settings.IP_LOCATION_REDIS_PREFIX}:{ip}')
+    location = _ip_location_cache.get(ip)
     if location:
-        country, region, city = location.split(' ')
-        return ip, country, region, city
+        _ip_location_cache.move_to_end(ip)
+        return ip, *location
     if settings.LOCATION_PARSE == 'online':
+        location = await redis_client.get(f'{settings.IP_LOCATION_REDIS_PREFIX}:{ip}')
+        if location:
+            country, region, city = location.split(' ')
+            _set_ip_location_cache(ip, (country, region, city))
+            return ip, country, region, city
         location_info = await get_location_online(ip, request.headers.get('User-Agent'))
     elif settings.LOCATION_PARSE == 'offline':
-        location_info = await get_location_offline(ip)
+        # Faster than the redis cache
+        location_info = get_location_offline(ip)
     else:
         location_info = None
     if location_info:
         country = location_info.get('country')
         region = location_info.get('regionName')
         city = location_info.get('city')
-        await redis_client.set(
-            f'{settings.IP_LOCATION_REDIS_PREFIX}:{ip}',
-            f'{country} {region} {city}',
-            ex=settings.IP_LOCATION_EXPIRE_SECONDS,
-        )
+        if settings.LOCATION_PARSE == 'online':
+            await redis_client.set(
+                f'{settings.IP_LOCATION_REDIS_PREFIX}:{ip}',
+                f'{country} {region} {city}',
+                ex=settings.IP_LOCATION_EXPIRE_SECONDS,
+            )
+        _set_ip_location_cache(ip, (country, region, city))
     return ip, country, region, city
 
 
-@sync_to_async
-def parse_user_agent_info(request: Request) -> tuple[str, str, str, str]:
-    user_agent = request.headers.get('User-Agent')
+def _set_ip_location_cache(ip: str, location: tuple[str | None, str | None, str | None]) -> None:
+    _ip_location_cache[ip] = location
+    if len(_ip_location_cache) > settings.IP_LOCATION_LOCAL_MAXSIZE:
+        _ip_location_cache.popitem(last=False)
+
+
+_user_agent_cache: OrderedDict[str, tuple[str, str, str]] = OrderedDict()
+
+
+def parse_user_agent(user_agent: str) -> tuple[str, str, str]:
+    """
+    Parse user agent, runs the regex cascade of user_agents
+
+    :param user_agent:
+    :return: device, os, browser
+    """
     _user_agent = parse(user_agent)
-    device = _user_agent.get_device()
-    os = _user_agent.get_os()
-    browser = _user_agent.get_browser()
+    return _user_agent.get_device(), _user_agent.get_os(), _user_agent.get_browser()
+
+
+async def parse_user_agent_info(request: Request) -> tuple[str, str, str, str]:
+    user_agent = request.headers.get('User-Agent')
+    # A deployment sees few distinct user agents, the hits are served from the cache of the current worker
+    result = _user_agent_cache.get(user_agent)
+    if result:
+        _user_agent_cache.move_to_end(user_agent)
+    else:
+        # A miss takes milliseconds, it is parsed in a thread so that unique user agents do not block the event loop
+        result = await sync_to_async(parse_user_agent, thread_sensitive=False)(user_agent)
+        _user_agent_cache[user_agent] = result
+        if len(_user_agent_cache) > settings.USER_AGENT_PARSE_MAXSIZE:
+            _user_agent_cache.popitem(last=False)
+    device, os, browser = result
     return user_agent, device, os, browser
@@ -1,19 +1,63 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 from decimal import Decimal
-from typing import Any, Sequence, TypeVar
+from functools import lru_cache
+from operator import attrgetter
+from types import UnionType
+from typing import Any, Sequence, TypeVar, Union, get_args, get_origin
 
 import msgspec
 
 from asgiref.sync import sync_to_async
-from sqlalchemy import Row, RowMapping
+from pydantic import BaseModel
+from sqlalchemy import Numeric, Row, RowMapping
 from starlette.responses import JSONResponse
 
+from backend.app.core.conf import settings
+
 RowData = Row | RowMapping | Any
 
 R = TypeVar('R', bound=RowData)
 
 
+@lru_cache
+def _get_columns_plan(model: type) -> tuple[tuple[str, ...], tuple[int, ...]]:
+    """
+    Get the column keys of the model, and the indexes of the decimal columns, computed once per model
+
+    :param model:
+    :return:
+    """
+    columns = model.__table__.columns
+    keys = tuple(columns.keys())
+    decimal_indexes = tuple(
+        i for i, column in enumerate(columns) if isinstance(column.type, Numeric) and column.type.asdecimal
+    )
+    return keys, decimal_indexes
+
+
+def _serialize_rows(rows: Sequence[R]) -> list[dict]:
+    ret_list = []
+    plans = {}
+    for row in rows:
+        model = type(row)
+        plan = plans.get(model)
+        if plan is None:
+            keys, decimal_indexes = _get_columns_plan(model)
+            plan = plans[model] = (keys, decimal_indexes, attrgetter(*keys))
+        keys, decimal_indexes, getter = plan
+        values = getter(row)
+        if len(keys) == 1:
+            values = (values,)
+        if decimal_indexes:
+            values = list(values)
+            for i in decimal_indexes:
+                if isinstance(values[i], Decimal):
+                    values[i] = float(values[i])
+        ret_list.append(dict(zip(keys, values)))
+    return ret_list
+
+
 @sync_to_async
 def select_columns_serialize(row: R) -> dict:
     """
@@ -22,25 +66,19 @@ def select_columns_serialize(row: R) -> dict:
     :param row:
     :return:
     """
-    obj_dict = {}
-    for column in row.__table__.columns.keys():
-        val = getattr(row, column)
-        if isinstance(val, Decimal):
-            if val % 1 == 0:
-                val = int(val)
-            val = float(val)
-        obj_dict[column] = val
-    return obj_dict
+    return _serialize_rows([row])[0]
 
 
 async def select_list_serialize(row: Sequence[R]) -> list:
     """
-    Serialize SQLAlchemy select list
+    Serialize SQLAlchemy select list, small lists are serialized inline, large lists in one executor call
 
     :param row:
     :return:
     """
-    ret_list = [await select_columns_serialize(_) for _ in row]
+    if len(row) <= settings.SERIALIZE_INLINE_MAXSIZE:
+        return _serialize_rows(row)
+    ret_list = await sync_to_async(_serialize_rows)(row)
     return ret_list
 
 
@@ -59,6 +97,53 @@ def select_as_dict(row: R) -> dict:
         return obj_dict
 
 
+def _struct_type(tp: Any) -> Any:
+    """Replace the pydantic models in the annotation with their msgspec struct mirrors"""
+    if isinstance(tp, type) and issubclass(tp, BaseModel):
+        return schema_as_struct(tp)
+    origin, args = get_origin(tp), get_args(tp)
+    if origin in (Union, UnionType):
+        return Union[tuple(_struct_type(arg) for arg in args)]  # noqa: UP007
+    if origin in (list, set, tuple, dict) and args:
+        return origin[tuple(_struct_type(arg) for arg in args)]
+    if isinstance(msgspec.inspect.type_info(tp), msgspec.inspect.CustomType):
+        # Pydantic specific types, e.g. EmailStr, are not validated
+        return Any
+    return tp
+
+
+@lru_cache
+def schema_as_struct(schema: type[BaseModel]) -> type[msgspec.Struct]:
+    """
+    Create msgspec struct mirror of the pydantic read schema, the validators of the schema are not included
+
+    :param schema:
+    :return:
+    """
+    fields = []
+    for name, field in schema.model_fields.items():
+        tp = _struct_type(field.annotation)
+        if field.is_required():
+            fields.append((name, tp))
+        elif field.default_factory:
+            fields.append((name, tp, msgspec.field(default_factory=field.default_factory)))
+        else:
+            fields.append((name, tp, field.default))
+    return msgspec.defstruct(schema.__name__, fields, kw_only=True)
+
+
+def select_list_as_structs(row: Sequence[R], schema: type[BaseModel]) -> list[msgspec.Struct]:
+    """
+    Converting SQLAlchemy select list to msgspec structs of the schema, which can be encoded directly,
+    attributes are read from the select objects or rows without intermediate dict
+
+    :param row:
+    :param schema:
+    :return:
+    """
+    return msgspec.convert(row, list[schema_as_struct(schema)], from_attributes=True)
+
+
 class MsgSpecJSONResponse(JSONResponse):
     """
     JSON response using the high-performance msgspec library to serialize data to JSON.